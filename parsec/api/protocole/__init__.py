@@ -20,7 +20,7 @@ from parsec.api.protocole.organization import (
 )
 from parsec.api.protocole.events import events_subscribe_serializer, events_listen_serializer
 from parsec.api.protocole.ping import ping_serializer
-from parsec.api.protocole.beacon import beacon_read_serializer
+from parsec.api.protocole.beacon import beacon_read_serializer, beacon_get_head_serializer
 from parsec.api.protocole.message import message_send_serializer, message_get_serializer
 from parsec.api.protocole.blockstore import blockstore_create_serializer, blockstore_read_serializer
 from parsec.api.protocole.vlob import (
@@ -69,6 +69,7 @@ __all__ = (
     "ping_serializer",
     # Beacon
     "beacon_read_serializer",
+    "beacon_get_head_serializer",
     # Message
     "message_send_serializer",
     "message_get_serializer",
@@ -40,11 +40,14 @@ def serializer_factory(schema_cls):
 
 class BaseReqSchema(UnknownCheckedSchema):
     cmd = fields.String(required=True)
+    # Only provided when the request is traced, see `parsec.tracing`
+    request_id = fields.String()
 
     @post_load
     def _drop_cmd_field(self, item):
         if self.drop_cmd_field:
             item.pop("cmd")
+        item.pop("request_id", None)
         return item
 
     def __init__(self, drop_cmd_field=True, **kwargs):
@@ -64,14 +67,34 @@ class ErrorRepSchema(BaseRepSchema):
 
 
 class CmdSerializer:
+    """
+    Schemas are only instantiated on first use, given most commands are
+    never used by a given process (e.g. a CLI invocation).
+    """
+
     def __repr__(self):
         return (
             f"{self.__class__.__name__}("
-            f"{self.req_schema.__class__.__name__}, "
-            f"{self.rep_noerror_schema.__class__.__name__})"
+            f"{self._req_schema_cls.__name__}, "
+            f"{self._rep_schema_cls.__name__})"
         )
 
     def __init__(self, req_schema_cls, rep_schema_cls):
+        self._req_schema_cls = req_schema_cls
+        self._rep_schema_cls = rep_schema_cls
+        self._built = False
+
+    def __getattr__(self, name):
+        # Only called for missing attributes, i.e. before the build
+        if name.startswith("_") or self._built:
+            raise AttributeError(name)
+        self._build()
+        return getattr(self, name)
+
+    def _build(self):
+        req_schema_cls = self._req_schema_cls
+        rep_schema_cls = self._rep_schema_cls
+        self._built = True
         self.rep_noerror_schema = rep_schema_cls()
 
         class RepWithErrorSchema(OneOfSchema):
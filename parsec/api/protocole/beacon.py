@@ -2,7 +2,7 @@ from parsec.serde import UnknownCheckedSchema, fields
 from parsec.api.protocole.base import BaseReqSchema, BaseRepSchema, CmdSerializer
 
 
-__all__ = "beacon_read_serializer"
+__all__ = ("beacon_read_serializer", "beacon_get_head_serializer")
 
 
 class BeaconReadReqSchema(BaseReqSchema):
@@ -16,7 +16,21 @@ class BeaconItemSchema(UnknownCheckedSchema):
 
 
 class BeaconReadRepSchema(BaseRepSchema):
+    # Index of the beacon's last update, to be used as offset for the next read
+    index = fields.Integer(required=True)
     items = fields.List(fields.Nested(BeaconItemSchema), required=True)
 
 
 beacon_read_serializer = CmdSerializer(BeaconReadReqSchema, BeaconReadRepSchema)
+
+
+class BeaconGetHeadReqSchema(BaseReqSchema):
+    id = fields.UUID(required=True)
+
+
+class BeaconGetHeadRepSchema(BaseRepSchema):
+    # Index of the beacon's last update, 0 if it has never been updated
+    index = fields.Integer(required=True)
+
+
+beacon_get_head_serializer = CmdSerializer(BeaconGetHeadReqSchema, BeaconGetHeadRepSchema)
@@ -1,6 +1,8 @@
 from uuid import uuid4
 from trio import BrokenResourceError
 from structlog import get_logger
+
+from parsec.logging import payload_logging_enabled
 from wsproto.frame_protocol import CloseReason
 from wsproto.connection import WSConnection, ConnectionType
 from wsproto.events import (
@@ -9,6 +11,7 @@ from wsproto.events import (
     ConnectionRequested,
     BytesReceived,
     PingReceived,
+    PongReceived,
 )
 
 
@@ -63,12 +66,14 @@ class Transport:
             # need to pass None to wsproto to update its internal state.
             self.ws.receive_bytes(None)
         else:
-            self.logger.debug("Receiving", data=in_data)
+            if payload_logging_enabled():
+                self.logger.debug("Receiving", data=in_data)
             self.ws.receive_bytes(in_data)
 
     async def _net_send(self):
         out_data = self.ws.bytes_to_send()
-        self.logger.debug("Sending", data=out_data)
+        if payload_logging_enabled():
+            self.logger.debug("Sending", data=out_data)
         try:
             await self.stream.send_all(out_data)
 
@@ -128,6 +133,32 @@ class Transport:
         self.ws.send_data(msg)
         await self._net_send()
 
+    async def ping(self) -> None:
+        """
+        Send a WebSocket ping and wait for the peer's pong.
+
+        Raises:
+            TransportError
+        """
+        self.ws.ping()
+        await self._net_send()
+        while True:
+            event = await self._next_ws_event()
+
+            if isinstance(event, PongReceived):
+                return
+
+            elif isinstance(event, ConnectionClosed):
+                self.logger.debug("Connection closed", code=event.code, reason=event.reason)
+                raise TransportClosedByPeer("Peer has closed connection")
+
+            elif isinstance(event, PingReceived):
+                await self._net_send()
+
+            else:
+                self.logger.warning("Unexpected event", ws_event=event)
+                raise TransportError(f"Unexpected event: {event}")
+
     async def recv(self) -> bytes:
         """
         Raises:
@@ -153,6 +184,10 @@ class Transport:
                 self.logger.debug("Received ping and sending pong")
                 await self._net_send()
 
+            elif isinstance(event, PongReceived):
+                # Answer to a keepalive ping that timed out
+                self.logger.debug("Received late pong")
+
             else:
                 self.logger.warning("Unexpected event", ws_event=event)
                 raise TransportError(f"Unexpected event: {event}")
@@ -3,6 +3,8 @@ import attr
 from structlog import get_logger
 
 from parsec.event_bus import EventBus
+from parsec.logging import payload_logging_enabled
+from parsec.tracing import span
 from parsec.api.transport import TransportError, TransportClosedByPeer, Transport
 from parsec.api.protocole import (
     packb,
@@ -13,8 +15,10 @@ from parsec.api.protocole import (
     ServerHandshake,
 )
 from parsec.backend.events import EventsComponent
+from parsec.backend.cache import BackendCache
 from parsec.backend.utils import check_anonymous_api_allowed
 from parsec.backend.blockstore import blockstore_factory
+from parsec.backend.metrics import BackendMetrics, instrument_blockstore, serve_metrics
 from parsec.backend.drivers.memory import (
     MemoryOrganizationComponent,
     MemoryUserComponent,
@@ -105,10 +109,22 @@ class BackendApp:
         self.config = config
         self.nursery = None
         self.dbh = None
-        self.events = EventsComponent(self.event_bus)
+        self._beacon_compaction_cancel_scope = None
+        self._metrics_cancel_scope = None
+        self.metrics_listeners = None
+        # Collecting metrics is not free, so it is only done when they are exposed
+        self.metrics = BackendMetrics() if self.config.metrics_port is not None else None
+        self._handshake_limiter = trio.CapacityLimiter(self.config.handshake_max_concurrency)
+        self.events = EventsComponent(self.event_bus, metrics=self.metrics)
+        self.cache = BackendCache(
+            self.event_bus,
+            ttl=self.config.cache_ttl,
+            max_size=self.config.cache_size,
+            metrics=self.metrics,
+        )
 
         if self.config.db_url == "MOCKED":
-            self.user = MemoryUserComponent(self.event_bus)
+            self.user = MemoryUserComponent(self.event_bus, cache=self.cache)
             self.organization = MemoryOrganizationComponent(self.user)
             self.message = MemoryMessageComponent(self.event_bus)
             self.beacon = MemoryBeaconComponent(self.event_bus)
@@ -117,8 +133,8 @@ class BackendApp:
             self.blockstore = blockstore_factory(self.config.blockstore_config)
 
         else:
-            self.dbh = PGHandler(self.config.db_url, self.event_bus)
-            self.user = PGUserComponent(self.dbh, self.event_bus)
+            self.dbh = PGHandler(self.config.db_url, self.event_bus, metrics=self.metrics)
+            self.user = PGUserComponent(self.dbh, self.event_bus, cache=self.cache)
             self.organization = PGOrganizationComponent(self.dbh, self.user)
             self.message = PGMessageComponent(self.dbh)
             self.beacon = PGBeaconComponent(self.dbh)
@@ -127,12 +143,16 @@ class BackendApp:
             self.blockstore = blockstore_factory(
                 self.config.blockstore_config, postgresql_dbh=self.dbh
             )
+        if self.metrics is not None:
+            instrument_blockstore(self.blockstore, self.metrics, self.config.blockstore_config.type)
+        self.cache.bind(self.organization, self.user)
 
         self.logged_cmds = {
             "events_subscribe": self.events.api_events_subscribe,
             "events_listen": self.events.api_events_listen,
             "ping": self.ping.api_ping,
             "beacon_read": self.beacon.api_beacon_read,
+            "beacon_get_head": self.beacon.api_beacon_get_head,
             # Message
             "message_get": self.message.api_message_get,
             "message_send": self.message.api_message_send,
@@ -174,19 +194,53 @@ class BackendApp:
         self.nursery = nursery
         if self.dbh:
             await self.dbh.init(nursery)
+        if self.config.beacon_compaction_period:
+            self._beacon_compaction_cancel_scope = await nursery.start(self._run_beacon_compaction)
+        if self.metrics is not None:
+            self._metrics_cancel_scope, self.metrics_listeners = await nursery.start(
+                serve_metrics, self.metrics, self.config.metrics_port, self.config.metrics_host
+            )
 
     async def teardown(self):
+        if self._beacon_compaction_cancel_scope:
+            self._beacon_compaction_cancel_scope.cancel()
+        if self._metrics_cancel_scope:
+            self._metrics_cancel_scope.cancel()
         if self.dbh:
             await self.dbh.teardown()
 
+    async def _run_beacon_compaction(self, *, task_status=trio.TASK_STATUS_IGNORED):
+        with trio.open_cancel_scope() as cancel_scope:
+            task_status.started(cancel_scope)
+            while True:
+                await trio.sleep(self.config.beacon_compaction_period)
+                try:
+                    removed = await self.beacon.compact()
+                except Exception:
+                    # Compaction is only an optimization, try again next time
+                    logger.exception("Beacon compaction failed")
+                    continue
+                logger.info("Beacon compaction done", removed=removed)
+
     async def _do_handshake(self, transport):
-        context = None
-        try:
-            hs = ServerHandshake(self.config.handshake_challenge_size)
-            challenge_req = hs.build_challenge_req()
-            await transport.send(challenge_req)
+        hs = ServerHandshake(self.config.handshake_challenge_size)
+        challenge_req = hs.build_challenge_req()
+        await transport.send(challenge_req)
+        # Don't let silent clients keep the connection forever
+        with trio.fail_after(self.config.handshake_timeout):
             answer_req = await transport.recv()
 
+        # Only the answer's processing is limited: waiting for the answer
+        # costs nothing but the connection itself
+        async with self._handshake_limiter:
+            result_req, context = await self._process_handshake_answer(transport, hs, answer_req)
+
+        await transport.send(result_req)
+        return context
+
+    async def _process_handshake_answer(self, transport, hs, answer_req):
+        context = None
+        try:
             hs.process_answer_req(answer_req)
 
             if hs.is_anonymous():
@@ -197,7 +251,7 @@ class BackendApp:
 
                 else:
                     try:
-                        organization = await self.organization.get(hs.organization_id)
+                        organization = await self.cache.get_organization(hs.organization_id)
 
                     except OrganizationNotFoundError:
                         result_req = hs.build_bad_identity_result_req()
@@ -215,8 +269,8 @@ class BackendApp:
 
             else:
                 try:
-                    organization = await self.organization.get(hs.organization_id)
-                    user = await self.user.get_user(hs.organization_id, hs.device_id.user_id)
+                    organization = await self.cache.get_organization(hs.organization_id)
+                    user = await self.cache.get_user(hs.organization_id, hs.device_id.user_id)
                     device = user.devices[hs.device_id.device_name]
 
                 except (OrganizationNotFoundError, UserNotFoundError, KeyError):
@@ -242,8 +296,7 @@ class BackendApp:
         except ProtocoleError:
             result_req = hs.build_bad_format_result_req()
 
-        await transport.send(result_req)
-        return context
+        return result_req, context
 
     async def handle_client(self, stream):
         try:
@@ -277,6 +330,8 @@ class BackendApp:
             return
 
         transport.logger.info("Client joined")
+        if self.metrics is not None:
+            self.metrics.connections.inc()
 
         try:
             transport.logger.debug("start handshake")
@@ -294,6 +349,10 @@ class BackendApp:
             transport.logger.info("Client has left")
             return
 
+        except trio.TooSlowError:
+            transport.logger.info("Close client connection due to handshake timeout")
+            await transport.aclose()
+
         except (TransportError, MessageSerializationError):
             transport.logger.info("Close client connection due to invalid data")
             rep = {"status": "invalid_msg_format", "reason": "Invalid message format"}
@@ -303,12 +362,21 @@ class BackendApp:
                 pass
             await transport.aclose()
 
+        finally:
+            if self.metrics is not None:
+                self.metrics.connections.dec()
+
     async def _handle_client_loop(self, transport, client_ctx):
         transport.logger.info("Client handshake done")
+        metrics = self.metrics
         while True:
             raw_req = await transport.recv()
+            if metrics is not None:
+                start = trio.current_time()
             req = unpackb(raw_req)
-            client_ctx.logger.debug("req", req=_filter_binary_fields(req))
+            if payload_logging_enabled():
+                client_ctx.logger.debug("req", req=_filter_binary_fields(req))
+            cmd_func = None
             try:
                 cmd = req.get("cmd", "<missing>")
                 if not isinstance(cmd, str):
@@ -329,19 +397,32 @@ class BackendApp:
 
             else:
                 client_ctx.logger.info("Request", cmd=cmd)
-                try:
-                    rep = await cmd_func(client_ctx, req)
+                # Attached to the client's span when the client traces this request
+                with span("backend.cmd", request_id=req.get("request_id"), cmd=cmd) as cmd_span:
+                    try:
+                        rep = await cmd_func(client_ctx, req)
+
+                    except InvalidMessageError as exc:
+                        rep = {
+                            "status": "bad_message",
+                            "errors": exc.errors,
+                            "reason": "Invalid message.",
+                        }
 
-                except InvalidMessageError as exc:
-                    rep = {
-                        "status": "bad_message",
-                        "errors": exc.errors,
-                        "reason": "Invalid message.",
-                    }
+                    except ProtocoleError as exc:
+                        rep = {"status": "bad_message", "reason": str(exc)}
 
-                except ProtocoleError as exc:
-                    rep = {"status": "bad_message", "reason": str(exc)}
+                    cmd_span.set_tag("status", rep.get("status"))
 
-            client_ctx.logger.debug("rep", rep=_filter_binary_fields(rep))
+            if payload_logging_enabled():
+                client_ctx.logger.debug("rep", rep=_filter_binary_fields(rep))
             raw_rep = packb(rep)
+            if metrics is not None:
+                # Unknown commands are all accounted together
+                cmd_label = cmd if cmd_func else "<unknown>"
+                metrics.cmd_duration.observe(trio.current_time() - start, cmd=cmd_label)
+                metrics.cmd_request_size.observe(len(raw_req), cmd=cmd_label)
+                metrics.cmd_response_size.observe(len(raw_rep), cmd=cmd_label)
+                if rep.get("status") != "ok":
+                    metrics.cmd_errors.inc(cmd=cmd_label, status=str(rep.get("status")))
             await transport.send(raw_rep)
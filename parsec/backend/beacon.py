@@ -2,7 +2,7 @@ from uuid import UUID
 from typing import List, Tuple
 
 from parsec.types import DeviceID, OrganizationID
-from parsec.api.protocole import beacon_read_serializer
+from parsec.api.protocole import beacon_read_serializer, beacon_get_head_serializer
 from parsec.backend.utils import catch_protocole_errors
 
 
@@ -12,20 +12,39 @@ class BaseBeaconComponent:
         msg = beacon_read_serializer.req_load(msg)
 
         # TODO: raise error if too many events since offset ?
-        items = await self.read(client_ctx.organization_id, msg["id"], msg["offset"])
+        index, items = await self.read(client_ctx.organization_id, msg["id"], msg["offset"])
 
         return beacon_read_serializer.rep_dump(
             {
                 "status": "ok",
+                "index": index,
                 "items": [
                     {"src_id": src_id, "src_version": src_version} for src_id, src_version in items
                 ],
             }
         )
 
+    @catch_protocole_errors
+    async def api_beacon_get_head(self, client_ctx, msg):
+        msg = beacon_get_head_serializer.req_load(msg)
+
+        index = await self.get_head(client_ctx.organization_id, msg["id"])
+
+        return beacon_get_head_serializer.rep_dump({"status": "ok", "index": index})
+
     async def read(
         self, organization_id: OrganizationID, id: UUID, offset: int
-    ) -> List[Tuple[UUID, int]]:
+    ) -> Tuple[int, List[Tuple[UUID, int]]]:
+        """
+        Returns: the index of the beacon's last update and the list of
+        (<src_id>, <src_version>) updated after `offset` up to this index
+        """
+        raise NotImplementedError()
+
+    async def get_head(self, organization_id: OrganizationID, id: UUID) -> int:
+        """
+        Returns: the index of the beacon's last update (0 if never updated)
+        """
         raise NotImplementedError()
 
     async def update(
@@ -37,3 +56,13 @@ class BaseBeaconComponent:
         author: DeviceID = None,
     ) -> None:
         raise NotImplementedError()
+
+    async def compact(self) -> int:
+        """
+        Fold the history of each beacon down to the latest version of each
+        src_id. Readers only care about the latest versions and indexes are
+        kept, so offsets remain valid.
+
+        Returns: the number of removed entries
+        """
+        raise NotImplementedError()
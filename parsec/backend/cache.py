@@ -0,0 +1,244 @@
+import trio
+import attr
+from collections import OrderedDict
+from typing import Tuple, Dict
+
+from parsec.types import UserID, DeviceID, OrganizationID
+from parsec.event_bus import EventBus
+from parsec.backend.user import BaseUserComponent, User, Device, UserNotFoundError
+from parsec.backend.organization import BaseOrganizationComponent, Organization
+from parsec.backend.config import DEFAULT_CACHE_TTL, DEFAULT_CACHE_SIZE
+from parsec.backend.metrics import BackendMetrics
+
+
+def _extract_user_id(device_id: str) -> str:
+    # PostgreSQL notifications provide ids as plain strings, which compare
+    # equal to their typed counterparts used as cache keys
+    return device_id.split("@", 1)[0]
+
+
+@attr.s(slots=True)
+class CacheStats:
+    hits = attr.ib(default=0)
+    misses = attr.ib(default=0)
+    hits_latency = attr.ib(default=0.0)
+    misses_latency = attr.ib(default=0.0)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    @property
+    def hit_avg_latency(self) -> float:
+        return self.hits_latency / self.hits if self.hits else 0.0
+
+    @property
+    def miss_avg_latency(self) -> float:
+        return self.misses_latency / self.misses if self.misses else 0.0
+
+
+class CacheStore:
+    """
+    LRU store of `(expire_on, value, exc)` entries bounded to `max_size` items.
+    """
+
+    def __init__(self, name: str, max_size: int):
+        self.name = name
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now):
+        try:
+            expire_on, value, exc = self._entries[key]
+        except KeyError:
+            return None
+        if expire_on <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, exc
+
+    def set(self, key, expire_on, value, exc) -> None:
+        self._entries[key] = (expire_on, value, exc)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def pop_organization(self, organization_id: OrganizationID) -> None:
+        for key in [key for key in self._entries if key[0] == organization_id]:
+            del self._entries[key]
+
+    def sweep(self, now) -> None:
+        for key in [key for key, entry in self._entries.items() if entry[0] <= now]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class BackendCache:
+    """
+    Read-through cache on top of the organization and user components.
+
+    Entries expire after `ttl` seconds and are invalidated as soon as the
+    related `user.created`/`user.updated`/`device.created`/`device.revoked`
+    event is received (with PostgreSQL those events come through the
+    notification channel, hence every backend connected to the database
+    keeps its cache consistent).
+    Only bootstrapped organizations are cached given they cannot change anymore.
+
+    Each lookup is reported through a `backend.cache.lookup` event and the
+    backend metrics (if enabled).
+
+    The user component itself reads through the cache, so the components
+    are bound once created.
+    """
+
+    def __init__(
+        self,
+        event_bus: EventBus,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_size: int = DEFAULT_CACHE_SIZE,
+        metrics: BackendMetrics = None,
+    ):
+        self.event_bus = event_bus
+        self.organization_component = None
+        self.user_component = None
+        self.ttl = ttl
+        self.metrics = metrics
+        self.stats = CacheStats()
+        self._organizations = CacheStore("organization", max_size)
+        self._users = CacheStore("user", max_size)
+        self._trustchains = CacheStore("trustchain", max_size)
+        self._next_sweep = 0
+        # Incremented on each invalidation to avoid storing a value fetched
+        # before an invalidation occured
+        self._generation = 0
+
+        self.event_bus.connect("user.created", self._on_user_changed, weak=True)
+        self.event_bus.connect("user.updated", self._on_user_changed, weak=True)
+        self.event_bus.connect("device.created", self._on_device_changed, weak=True)
+        self.event_bus.connect("device.revoked", self._on_device_revoked, weak=True)
+
+    def bind(
+        self, organization_component: BaseOrganizationComponent, user_component: BaseUserComponent
+    ) -> None:
+        self.organization_component = organization_component
+        self.user_component = user_component
+
+    def _invalidate_user(self, organization_id, user_id):
+        self._generation += 1
+        key = (organization_id, user_id)
+        self._users.pop(key)
+        self._trustchains.pop(key)
+
+    def _on_user_changed(self, event, organization_id, user_id, **kwargs):
+        self._invalidate_user(organization_id, user_id)
+
+    def _on_device_changed(self, event, organization_id, device_id, **kwargs):
+        self._invalidate_user(organization_id, _extract_user_id(device_id))
+
+    def _on_device_revoked(self, event, organization_id, device_id, **kwargs):
+        self._invalidate_user(organization_id, _extract_user_id(device_id))
+        # Revoked device may be part of any trustchain of the organization,
+        # revocation should be rare enough to just drop them all
+        self._trustchains.pop_organization(organization_id)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._organizations.clear()
+        self._users.clear()
+        self._trustchains.clear()
+
+    def _sweep(self, now) -> None:
+        # Expired entries are otherwise only dropped when they are accessed
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.ttl
+        for store in (self._organizations, self._users, self._trustchains):
+            store.sweep(now)
+
+    def _report_lookup(self, store, hit, latency):
+        if hit:
+            self.stats.hits += 1
+            self.stats.hits_latency += latency
+        else:
+            self.stats.misses += 1
+            self.stats.misses_latency += latency
+        if self.metrics is not None:
+            result = "hit" if hit else "miss"
+            self.metrics.cache_lookups.inc(store=store.name, result=result)
+            self.metrics.cache_lookup_duration.observe(latency, store=store.name, result=result)
+            self.metrics.cache_hit_ratio.set(self.stats.hit_ratio)
+        self.event_bus.send("backend.cache.lookup", store=store.name, hit=hit, latency=latency)
+
+    async def _read_through(self, store, key, fetch, cache_if=lambda value: True):
+        start = trio.current_time()
+        self._sweep(start)
+        cached = store.get(key, start)
+        if cached:
+            value, exc = cached
+            self._report_lookup(store, True, trio.current_time() - start)
+            if exc:
+                raise UserNotFoundError(*exc.args)
+            return value
+
+        generation = self._generation
+        value = exc = None
+        try:
+            value = await fetch()
+        except UserNotFoundError as caught:
+            # Also cache unknown users to protect the database against
+            # clients with a bad identity
+            exc = caught
+        now = trio.current_time()
+        if self.ttl > 0 and generation == self._generation and (exc or cache_if(value)):
+            store.set(key, now + self.ttl, value, exc)
+
+        self._report_lookup(store, False, now - start)
+        if exc:
+            raise exc
+        return value
+
+    async def get_organization(self, organization_id: OrganizationID) -> Organization:
+        """
+        Raises:
+            OrganizationNotFoundError
+        """
+        return await self._read_through(
+            self._organizations,
+            organization_id,
+            lambda: self.organization_component.get(organization_id),
+            cache_if=lambda organization: organization.is_bootstrapped(),
+        )
+
+    async def get_user(self, organization_id: OrganizationID, user_id: UserID) -> User:
+        """
+        Raises:
+            UserNotFoundError
+        """
+        return await self._read_through(
+            self._users,
+            (organization_id, user_id),
+            lambda: self.user_component.get_user(organization_id, user_id),
+        )
+
+    async def get_user_with_trustchain(
+        self, organization_id: OrganizationID, user_id: UserID
+    ) -> Tuple[User, Dict[DeviceID, Device]]:
+        """
+        Raises:
+            UserNotFoundError
+        """
+        return await self._read_through(
+            self._trustchains,
+            (organization_id, user_id),
+            lambda: self.user_component.get_user_with_trustchain(organization_id, user_id),
+        )
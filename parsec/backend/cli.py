@@ -6,6 +6,7 @@ from structlog import get_logger
 
 from parsec.cli_utils import spinner, cli_exception_handler
 from parsec.logging import configure_logging, configure_sentry_logging
+from parsec.tracing import configure_tracing, JSONLSink
 from parsec.backend import BackendApp, config_factory
 from parsec.backend.drivers.postgresql import init_db
 
@@ -59,12 +60,33 @@ def init_cmd(db, force):
     type=click.Path(exists=True, dir_okay=False),
     help="SSL certificate file",
 )
+@click.option(
+    "--metrics-port",
+    default=None,
+    type=int,
+    envvar="METRICS_PORT",
+    help="Expose Prometheus metrics over HTTP on this port of localhost (default: disabled)",
+)
 @click.option(
     "--log-level", "-l", default="WARNING", type=click.Choice(("DEBUG", "INFO", "WARNING", "ERROR"))
 )
 @click.option("--log-format", "-f", default="CONSOLE", type=click.Choice(("CONSOLE", "JSON")))
 @click.option("--log-file", "-o")
 @click.option("--log-filter", default=None)
+@click.option(
+    "--log-payloads",
+    default=0.0,
+    type=click.FloatRange(0, 1),
+    help="Ratio of the messages whose payload is logged with DEBUG log level (default: 0)",
+)
+@click.option("--trace-file", default=None, help="Record tracing spans into this JSONL file")
+@click.option(
+    "--trace-sample-rate",
+    default=1.0,
+    type=click.FloatRange(0, 1),
+    help="Ratio of the requests traced, requests traced by the clients are always traced "
+    "(default: 1)",
+)
 def run_cmd(
     host,
     port,
@@ -72,19 +94,28 @@ def run_cmd(
     blockstore,
     ssl_keyfile,
     ssl_certfile,
+    metrics_port,
     log_level,
     log_format,
     log_file,
     log_filter,
+    log_payloads,
+    trace_file,
+    trace_sample_rate,
 ):
-    configure_logging(log_level, log_format, log_file, log_filter)
+    configure_logging(log_level, log_format, log_file, log_filter, log_payloads)
+    if trace_file:
+        configure_tracing(JSONLSink(trace_file), trace_sample_rate)
 
     debug = "DEBUG" in os.environ
     with cli_exception_handler(debug):
 
+        environ = dict(os.environ)
+        if metrics_port is not None:
+            environ["METRICS_PORT"] = str(metrics_port)
         try:
             config = config_factory(
-                blockstore_type=blockstore, db_url=db, debug=debug, environ=os.environ
+                blockstore_type=blockstore, db_url=db, debug=debug, environ=environ
             )
 
         except ValueError as exc:
@@ -130,6 +161,10 @@ def run_cmd(
             f"Starting Parsec Backend on {host}:{port} (db={config.db_type}, "
             f"blockstore={config.blockstore_config.type})"
         )
+        if config.metrics_port is not None:
+            print(
+                f"Metrics available on http://{config.metrics_host}:{config.metrics_port}/metrics"
+            )
         try:
             trio_asyncio.run(_run_backend)
         except KeyboardInterrupt:
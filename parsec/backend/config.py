@@ -8,6 +8,14 @@ from collections import defaultdict
 __all__ = ("config_factory", "BackendConfig", "BaseBlockstoreConfig")
 
 
+DEFAULT_CACHE_TTL = 60
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_BEACON_COMPACTION_PERIOD = 3600
+DEFAULT_HANDSHAKE_MAX_CONCURRENCY = 100
+DEFAULT_HANDSHAKE_TIMEOUT = 10
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+
 # Must be changed in production obviously !!!
 DEFAULT_ADMINISTRATOR_TOKEN = "CCDCC27B6108438D99EF8AF5E847C3BB"
 
@@ -170,6 +178,24 @@ class BackendConfig:
 
     handshake_challenge_size: int = 48
 
+    # Time in seconds organizations and users are cached, 0 to disable the cache
+    cache_ttl: float = DEFAULT_CACHE_TTL
+    # Maximum number of entries in each of the cache stores
+    cache_size: int = DEFAULT_CACHE_SIZE
+
+    # Time in seconds between two compactions of the beacons' history, 0 to disable
+    beacon_compaction_period: float = DEFAULT_BEACON_COMPACTION_PERIOD
+
+    # Maximum number of handshake answers checked at the same time, other
+    # clients wait for their answer to be processed
+    handshake_max_concurrency: int = DEFAULT_HANDSHAKE_MAX_CONCURRENCY
+    # Time in seconds a client has to answer the handshake challenge
+    handshake_timeout: float = DEFAULT_HANDSHAKE_TIMEOUT
+
+    # Port of the HTTP server exposing the metrics, metrics are not collected if None
+    metrics_port: int = None
+    metrics_host: str = DEFAULT_METRICS_HOST
+
 
 def config_factory(
     db_url: str = "MOCKED", blockstore_type: str = "MOCKED", debug: bool = False, environ: dict = {}
@@ -190,4 +216,45 @@ def config_factory(
 
     config["sentry_url"] = environ.get("SENTRY_URL") or None
 
+    try:
+        config["cache_ttl"] = float(environ.get("CACHE_TTL", DEFAULT_CACHE_TTL))
+    except ValueError:
+        raise ValueError("CACHE_TTL must be a number of seconds")
+    try:
+        config["cache_size"] = int(environ.get("CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    except ValueError:
+        raise ValueError("CACHE_SIZE must be a number of entries")
+    if config["cache_size"] < 1:
+        raise ValueError("CACHE_SIZE must be a number of entries")
+    try:
+        config["beacon_compaction_period"] = float(
+            environ.get("BEACON_COMPACTION_PERIOD", DEFAULT_BEACON_COMPACTION_PERIOD)
+        )
+    except ValueError:
+        raise ValueError("BEACON_COMPACTION_PERIOD must be a number of seconds")
+    try:
+        config["handshake_max_concurrency"] = int(
+            environ.get("HANDSHAKE_MAX_CONCURRENCY", DEFAULT_HANDSHAKE_MAX_CONCURRENCY)
+        )
+    except ValueError:
+        raise ValueError("HANDSHAKE_MAX_CONCURRENCY must be a number of handshakes")
+    if config["handshake_max_concurrency"] < 1:
+        raise ValueError("HANDSHAKE_MAX_CONCURRENCY must be a number of handshakes")
+    try:
+        config["handshake_timeout"] = float(
+            environ.get("HANDSHAKE_TIMEOUT", DEFAULT_HANDSHAKE_TIMEOUT)
+        )
+    except ValueError:
+        raise ValueError("HANDSHAKE_TIMEOUT must be a number of seconds")
+    if config["handshake_timeout"] <= 0:
+        raise ValueError("HANDSHAKE_TIMEOUT must be a number of seconds")
+    if environ.get("METRICS_PORT"):
+        try:
+            config["metrics_port"] = int(environ["METRICS_PORT"])
+        except ValueError:
+            raise ValueError("METRICS_PORT must be a port number")
+        if not 0 <= config["metrics_port"] <= 65535:
+            raise ValueError("METRICS_PORT must be a port number")
+    config["metrics_host"] = environ.get("METRICS_HOST", DEFAULT_METRICS_HOST)
+
     return BackendConfig(**config)
@@ -1,3 +1,5 @@
+import attr
+from bisect import bisect_left
 from typing import List, Tuple
 from collections import defaultdict
 from uuid import UUID
@@ -7,16 +9,29 @@ from parsec.event_bus import EventBus
 from parsec.backend.beacon import BaseBeaconComponent
 
 
+@attr.s
+class BeaconStore:
+    # Index of the last update, still valid once the history is compacted
+    head = attr.ib(default=0)
+    # List of (<index>, <src_id>, <src_version>) ordered by index
+    entries = attr.ib(factory=list)
+
+
 class MemoryBeaconComponent(BaseBeaconComponent):
     def __init__(self, event_bus: EventBus):
         self.event_bus = event_bus
-        self._organizations = defaultdict(lambda: defaultdict(list))
+        self._organizations = defaultdict(lambda: defaultdict(BeaconStore))
 
     async def read(
         self, organization_id: OrganizationID, id: UUID, offset: int
-    ) -> List[Tuple[UUID, int]]:
-        beacons = self._organizations[organization_id]
-        return beacons[id][offset:]
+    ) -> Tuple[int, List[Tuple[UUID, int]]]:
+        beacon = self._organizations[organization_id][id]
+        start = bisect_left(beacon.entries, (offset + 1,))
+        items = [(src_id, src_version) for _, src_id, src_version in beacon.entries[start:]]
+        return beacon.head, items
+
+    async def get_head(self, organization_id: OrganizationID, id: UUID) -> int:
+        return self._organizations[organization_id][id].head
 
     async def update(
         self,
@@ -26,9 +41,10 @@ class MemoryBeaconComponent(BaseBeaconComponent):
         src_version: int,
         author: DeviceID = None,
     ) -> None:
-        beacons = self._organizations[organization_id]
-        beacons[id].append((src_id, src_version))
-        index = len(beacons[id])
+        beacon = self._organizations[organization_id][id]
+        beacon.head += 1
+        index = beacon.head
+        beacon.entries.append((index, src_id, src_version))
         if author:
             self.event_bus.send(
                 "beacon.updated",
@@ -39,3 +55,15 @@ class MemoryBeaconComponent(BaseBeaconComponent):
                 src_id=src_id,
                 src_version=src_version,
             )
+
+    async def compact(self) -> int:
+        removed = 0
+        for beacons in self._organizations.values():
+            for beacon in beacons.values():
+                latest = {}
+                for entry in beacon.entries:
+                    latest[entry[1]] = entry
+                compacted = sorted(latest.values())
+                removed += len(beacon.entries) - len(compacted)
+                beacon.entries = compacted
+        return removed
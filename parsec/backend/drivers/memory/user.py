@@ -1,10 +1,12 @@
 import attr
 import pendulum
-from typing import Tuple, Dict
+from bisect import bisect_left, insort
+from typing import Tuple, List, Dict
 from collections import defaultdict
 
 from parsec.types import UserID, DeviceID, OrganizationID
 from parsec.event_bus import EventBus
+from parsec.backend.cache import BackendCache
 from parsec.backend.user import (
     BaseUserComponent,
     User,
@@ -21,14 +23,17 @@ from parsec.backend.user import (
 @attr.s
 class OrganizationStore:
     _users = attr.ib(factory=dict)
+    # Sorted list of (<lowercased user id>, <user id>) used by `find`
+    _users_index = attr.ib(factory=list)
     _invitations = attr.ib(factory=dict)
     _device_configuration_tries = attr.ib(factory=dict)
     _unconfigured_devices = attr.ib(factory=dict)
 
 
 class MemoryUserComponent(BaseUserComponent):
-    def __init__(self, event_bus: EventBus):
+    def __init__(self, event_bus: EventBus, cache: BackendCache = None):
         self.event_bus = event_bus
+        self.cache = cache
         self._organizations = defaultdict(OrganizationStore)
 
     async def set_user_admin(
@@ -38,6 +43,7 @@ class MemoryUserComponent(BaseUserComponent):
 
         user = await self.get_user(organization_id, user_id)
         org._users[user_id] = user.evolve(is_admin=is_admin)
+        self.event_bus.send("user.updated", organization_id=organization_id, user_id=user_id)
 
     async def create_user(self, organization_id: OrganizationID, user: User) -> None:
         org = self._organizations[organization_id]
@@ -46,6 +52,7 @@ class MemoryUserComponent(BaseUserComponent):
             raise UserAlreadyExistsError(f"User `{user.user_id}` already exists")
 
         org._users[user.user_id] = user
+        insort(org._users_index, (user.user_id.lower(), user.user_id))
         self.event_bus.send("user.created", organization_id=organization_id, user_id=user.user_id)
 
     async def create_device(
@@ -72,17 +79,17 @@ class MemoryUserComponent(BaseUserComponent):
 
     async def _get_trustchain(self, organization_id, *devices_ids):
         trustchain = {}
-
-        async def _recursive_extract_creators(device_id):
+        # Iterative walk, long certification chains would otherwise hit
+        # the recursion limit
+        devices_to_fetch = list(devices_ids)
+        while devices_to_fetch:
+            device_id = devices_to_fetch.pop()
             if not device_id or device_id in trustchain:
-                return
+                continue
             device = await self.get_device(organization_id, device_id)
             trustchain[device_id] = device
-            await _recursive_extract_creators(device.device_certifier)
-            await _recursive_extract_creators(device.revocation_certifier)
-
-        for device_id in devices_ids:
-            await _recursive_extract_creators(device_id)
+            devices_to_fetch.append(device.device_certifier)
+            devices_to_fetch.append(device.revocation_certifier)
         return trustchain
 
     async def get_user(self, organization_id: OrganizationID, user_id: UserID) -> User:
@@ -124,18 +131,27 @@ class MemoryUserComponent(BaseUserComponent):
         return device, trustchain
 
     async def find(
-        self, organization_id: OrganizationID, query: str = None, page: int = 0, per_page: int = 100
-    ):
+        self, organization_id: OrganizationID, query: str = None, page: int = 1, per_page: int = 100
+    ) -> Tuple[List[UserID], int]:
         org = self._organizations[organization_id]
-
-        if query:
-            results = [user_id for user_id in org._users.keys() if user_id.startswith(query)]
-        else:
-            results = org._users.keys()
-
-        # PostgreSQL does case insensitive sort
-        sorted_results = sorted(results, key=lambda s: s.lower())
-        return sorted_results[(page - 1) * per_page : page * per_page], len(results)
+        # PostgreSQL does case insensitive sort, hence the lowercased index
+        index = org._users_index
+
+        if not query:
+            page_entries = index[(page - 1) * per_page : page * per_page]
+            return [user_id for _, user_id in page_entries], len(index)
+
+        # Users matching the query are in the range starting with the
+        # lowercased query, the search itself being case sensitive
+        lowered = query.lower()
+        results = []
+        for i in range(bisect_left(index, (lowered,)), len(index)):
+            lowered_user_id, user_id = index[i]
+            if not lowered_user_id.startswith(lowered):
+                break
+            if user_id.startswith(query):
+                results.append(user_id)
+        return results[(page - 1) * per_page : page * per_page], len(results)
 
     async def create_user_invitation(
         self, organization_id: OrganizationID, invitation: UserInvitation
@@ -255,3 +271,4 @@ class MemoryUserComponent(BaseUserComponent):
             patched_devices.append(device)
 
         org._users[device_id.user_id] = user.evolve(devices=DevicesMapping(*patched_devices))
+        self.event_bus.send("device.revoked", organization_id=organization_id, device_id=device_id)
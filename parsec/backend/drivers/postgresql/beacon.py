@@ -12,8 +12,14 @@ class PGBeaconComponent(BaseBeaconComponent):
 
     async def read(
         self, organization_id: OrganizationID, id: UUID, offset: int
-    ) -> List[Tuple[UUID, int]]:
+    ) -> Tuple[int, List[Tuple[UUID, int]]]:
         async with self.dbh.pool.acquire() as conn:
+            # Head is retrieved first and items are bounded by it, so items
+            # added in the meantime are not skipped by the next read
+            index = await self._get_head(conn, organization_id, id)
+            if index <= offset:
+                return index, []
+
             results = await conn.fetch(
                 """
 SELECT src_id, src_version
@@ -23,13 +29,37 @@ WHERE
         SELECT _id from organizations WHERE organization_id = $1
     )
     AND beacon_id = $2
-ORDER BY _id ASC OFFSET $3
+    AND beacon_index > $3
+    AND beacon_index <= $4
+ORDER BY beacon_index ASC
 """,
                 organization_id,
                 id,
                 offset,
+                index,
             )
-            return results
+            return index, results
+
+    async def get_head(self, organization_id: OrganizationID, id: UUID) -> int:
+        async with self.dbh.pool.acquire() as conn:
+            return await self._get_head(conn, organization_id, id)
+
+    @staticmethod
+    async def _get_head(conn, organization_id: OrganizationID, id: UUID) -> int:
+        index = await conn.fetchval(
+            """
+SELECT beacon_index
+FROM beacon_heads
+WHERE
+    organization = (
+        SELECT _id from organizations WHERE organization_id = $1
+    )
+    AND beacon_id = $2
+""",
+            organization_id,
+            id,
+        )
+        return index or 0
 
     async def update(
         self,
@@ -54,8 +84,27 @@ ORDER BY _id ASC OFFSET $3
         src_version: int,
         author: DeviceID = None,
     ) -> None:
+        # The head row is locked until the end of the transaction, hence
+        # concurrent updates of the same beacon get consecutive indexes
         beacon_index = await conn.fetchval(
             """
+INSERT INTO beacon_heads (
+    organization,
+    beacon_id,
+    beacon_index
+)
+SELECT _id, $2, 1
+FROM organizations
+WHERE organization_id = $1
+ON CONFLICT (organization, beacon_id) DO UPDATE
+SET beacon_index = beacon_heads.beacon_index + 1
+RETURNING beacon_index
+""",
+            organization_id,
+            beacon_id,
+        )
+        await conn.execute(
+            """
 INSERT INTO beacons (
     organization,
     beacon_id,
@@ -63,28 +112,13 @@ INSERT INTO beacons (
     src_id,
     src_version
 )
-SELECT
-    _id,
-    $2,
-    (
-        -- Retrieve last index of this beacon, or default to 1
-        SELECT COALESCE(
-            (
-                SELECT  beacon_index + 1
-                FROM beacons
-                WHERE organization = organizations._id AND beacon_id=$2
-                ORDER BY _id DESC LIMIT 1
-            ),
-            1
-        )
-    ),
-    $3, $4
+SELECT _id, $2, $3, $4, $5
 FROM organizations
 WHERE organization_id = $1
-RETURNING beacon_index
 """,
             organization_id,
             beacon_id,
+            beacon_index,
             src_id,
             src_version,
         )
@@ -100,3 +134,19 @@ RETURNING beacon_index
             src_id=src_id,
             src_version=src_version,
         )
+
+    async def compact(self) -> int:
+        async with self.dbh.pool.acquire() as conn:
+            result = await conn.execute(
+                """
+DELETE FROM beacons
+USING beacons AS newer
+WHERE
+    newer.organization = beacons.organization
+    AND newer.beacon_id = beacons.beacon_id
+    AND newer.src_id = beacons.src_id
+    AND newer.beacon_index > beacons.beacon_index
+"""
+            )
+        # Result is `DELETE <count>`
+        return int(result.split()[-1])
@@ -5,6 +5,7 @@ from base64 import b64decode, b64encode
 from parsec.event_bus import EventBus
 from parsec.serde import packb, unpackb
 from parsec.utils import call_with_control
+from parsec.backend.metrics import TimedPool
 
 
 logger = get_logger()
@@ -50,6 +51,7 @@ async def _drop_db(conn):
             messages,
             vlobs,
             beacons,
+            beacon_heads,
 
             blockstore
         CASCADE;
@@ -94,6 +96,8 @@ async def _create_db_tables(conn):
             created_on TIMESTAMPTZ NOT NULL,
             UNIQUE(organization, user_id)
         );
+        -- Prefix search on user_id (i.e. `user_id LIKE 'foo%'`)
+        CREATE INDEX users_user_id_pattern_idx ON users (organization, user_id text_pattern_ops);
 
         CREATE TABLE devices (
             _id SERIAL PRIMARY KEY,
@@ -133,8 +137,11 @@ async def _create_db_tables(conn):
             _id SERIAL PRIMARY KEY,
             organization INTEGER REFERENCES organizations (_id),
             recipient INTEGER REFERENCES users (_id) NOT NULL,
+            -- Position of the message among the recipient's ones, starting at 1
+            index INTEGER NOT NULL,
             sender INTEGER REFERENCES devices (_id) NOT NULL,
-            body BYTEA NOT NULL
+            body BYTEA NOT NULL,
+            UNIQUE(recipient, index)
         );
 
         CREATE TABLE vlobs (
@@ -157,7 +164,18 @@ async def _create_db_tables(conn):
             beacon_index INTEGER NOT NULL,
             src_id UUID NOT NULL,
             -- src_id UUID REFERENCES vlobs (vlob_id) NOT NULL,
-            src_version INTEGER NOT NULL
+            src_version INTEGER NOT NULL,
+            -- Also used for keyset reads (i.e. `beacon_index > offset`)
+            UNIQUE(organization, beacon_id, beacon_index)
+        );
+
+        -- Index of the last update of each beacon
+        CREATE TABLE beacon_heads (
+            _id SERIAL PRIMARY KEY,
+            organization INTEGER REFERENCES organizations (_id),
+            beacon_id UUID NOT NULL,
+            beacon_index INTEGER NOT NULL,
+            UNIQUE(organization, beacon_id)
         );
 
         CREATE TABLE blockstore (
@@ -173,9 +191,10 @@ async def _create_db_tables(conn):
 
 # TODO: replace by a fonction
 class PGHandler:
-    def __init__(self, url: str, event_bus: EventBus):
+    def __init__(self, url: str, event_bus: EventBus, metrics=None):
         self.url = url
         self.event_bus = event_bus
+        self.metrics = metrics
         self.pool = None
         self.notification_conn = None
         self._run_connections_control = None
@@ -186,7 +205,8 @@ class PGHandler:
         )
 
     async def _run_connections(self, started_cb):
-        async with triopg.create_pool(self.url) as self.pool:
+        async with triopg.create_pool(self.url) as pool:
+            self.pool = TimedPool(pool, self.metrics) if self.metrics is not None else pool
             async with self.pool.acquire() as conn:
                 if not await _is_db_initialized(conn):
                     raise RuntimeError("Database not initialized !")
@@ -14,60 +14,58 @@ class PGMessageComponent(BaseMessageComponent):
     ) -> None:
         async with self.dbh.pool.acquire() as conn:
             async with conn.transaction():
-                result = await conn.execute(
+                # Locking the recipient serializes the messages sent to it,
+                # hence each one gets the next index
+                recipient_internal_id = await conn.fetchval(
+                    """
+SELECT _id
+FROM users
+WHERE
+    organization = (
+        SELECT _id from organizations WHERE organization_id = $1
+    )
+    AND user_id = $2
+FOR UPDATE
+""",
+                    organization_id,
+                    recipient,
+                )
+                if recipient_internal_id is None:
+                    raise MessageError(f"Insertion error: unknown recipient `{recipient}`")
+
+                # Max index is read from the (recipient, index) unique index
+                index = await conn.fetchval(
                     """
 INSERT INTO messages (
     organization,
     sender,
     recipient,
+    index,
     body
 )
 SELECT
-    _id,
+    organization,
     (
         SELECT _id
         FROM devices
         WHERE
-            organization = organizations._id
+            organization = users.organization
             AND device_id = $2
     ),
-    (
-        SELECT _id
-        FROM users
-        WHERE
-            organization = organizations._id
-            AND user_id = $3
-    ),
-    $4
-FROM organizations
-WHERE organization_id = $1
+    _id,
+    COALESCE((SELECT MAX(index) FROM messages WHERE recipient = $1), 0) + 1,
+    $3
+FROM users
+WHERE _id = $1
+RETURNING index
 """,
-                    organization_id,
+                    recipient_internal_id,
                     sender,
-                    recipient,
                     body,
                 )
-                if result != "INSERT 0 1":
-                    raise MessageError(f"Insertion error: {result}")
+                if index is None:
+                    raise MessageError("Insertion error: no message inserted")
 
-                # TODO: index doesn't seem to be used in the core, and is complicated to get here...
-                # Maybe we should replace it by a timestamp ?
-                index, = await conn.fetchrow(
-                    """
-SELECT COUNT(*) FROM messages
-WHERE recipient = (
-    SELECT _id
-    FROM users
-    WHERE
-        organization = (
-            SELECT _id from organizations WHERE organization_id = $1
-        )
-        AND user_id = $2
-)
-""",
-                    organization_id,
-                    recipient,
-                )
                 await send_signal(
                     conn,
                     "message.received",
@@ -95,7 +93,8 @@ WHERE recipient = (
         )
         AND user_id = $2
 )
-ORDER BY messages._id ASC OFFSET $3
+AND messages.index > $3
+ORDER BY messages.index ASC
 """,
                 organization_id,
                 recipient,
@@ -13,7 +13,7 @@ from parsec.backend.organization import (
     OrganizationNotFoundError,
     OrganizationFirstUserCreationError,
 )
-from parsec.backend.drivers.postgresql.handler import PGHandler
+from parsec.backend.drivers.postgresql.handler import send_signal, PGHandler
 
 
 class PGOrganizationComponent(BaseOrganizationComponent):
@@ -96,3 +96,7 @@ class PGOrganizationComponent(BaseOrganizationComponent):
 
                 if result != "UPDATE 1":
                     raise OrganizationError(f"Update error: {result}")
+
+                await send_signal(
+                    conn, "user.created", organization_id=organization_id, user_id=user.user_id
+                )
@@ -5,6 +5,7 @@ from typing import Tuple, Dict, List
 
 from parsec.types import UserID, DeviceID, OrganizationID
 from parsec.event_bus import EventBus
+from parsec.backend.cache import BackendCache
 from parsec.backend.user import (
     BaseUserComponent,
     User,
@@ -21,9 +22,10 @@ from parsec.backend.drivers.postgresql.handler import send_signal, PGHandler
 
 
 class PGUserComponent(BaseUserComponent):
-    def __init__(self, dbh: PGHandler, event_bus: EventBus):
+    def __init__(self, dbh: PGHandler, event_bus: EventBus, cache: BackendCache = None):
         self.dbh = dbh
         self.event_bus = event_bus
+        self.cache = cache
 
     async def set_user_admin(
         self, organization_id: OrganizationID, user_id: UserID, is_admin: bool
@@ -48,6 +50,10 @@ WHERE
             if result != "UPDATE 1":
                 raise UserError(f"Update error: {result}")
 
+            await send_signal(
+                conn, "user.updated", organization_id=organization_id, user_id=user_id
+            )
+
     async def create_user(self, organization_id: OrganizationID, user: User) -> None:
         async with self.dbh.pool.acquire() as conn:
             async with conn.transaction():
@@ -299,57 +305,49 @@ WHERE user_ = (
         )
 
     async def _get_trustchain(
-        self, conn, organization_id: OrganizationID, user: User
+        self, conn, organization_id: OrganizationID, *devices_ids: DeviceID
     ) -> Dict[DeviceID, Device]:
-        # TODO: it's time to do a super awesome SQL query fetching everything
-        # in one go...
-        devices = {}
-        devices_to_fetch = []
-        if user.user_certifier:
-            devices_to_fetch.append(user.user_certifier)
-        for device in user.devices.values():
-            if device.device_certifier:
-                devices_to_fetch.append(device.device_certifier)
-            if device.revocation_certifier:
-                devices_to_fetch.append(device.revocation_certifier)
-
-        while devices_to_fetch:
-            results = await conn.fetch(
-                """
-SELECT
-    d1.device_id,
-    d1.certified_device,
-    (
-        SELECT devices.device_id FROM devices WHERE devices._id = d1.device_certifier
-    ) AS device_certifier,
-    d1.created_on,
-    d1.revocated_on,
-    d1.certified_revocation,
-    (
-        SELECT devices.device_id FROM devices WHERE devices._id = d1.revocation_certifier
-    ) as revocation_certifier
-FROM devices as d1
-WHERE
-    organization = (
-        SELECT _id from organizations WHERE organization_id = $1
+        devices_ids = [device_id for device_id in devices_ids if device_id]
+        if not devices_ids:
+            return {}
+
+        # Walk up the certifiers in a single query, UNION (instead of UNION ALL)
+        # discards already visited devices so each one is fetched only once
+        results = await conn.fetch(
+            """
+WITH RECURSIVE trustchain(_id, device_certifier, revocation_certifier) AS (
+    SELECT _id, device_certifier, revocation_certifier
+    FROM devices
+    WHERE
+        organization = (
+            SELECT _id from organizations WHERE organization_id = $1
+        )
+        AND device_id = any($2::text[])
+    UNION
+    SELECT devices._id, devices.device_certifier, devices.revocation_certifier
+    FROM devices
+    JOIN trustchain ON devices._id IN (
+        trustchain.device_certifier, trustchain.revocation_certifier
     )
-    AND device_id = any($2::text[]);
+)
+SELECT
+    d.device_id,
+    d.certified_device,
+    device_certifier.device_id,
+    d.created_on,
+    d.revocated_on,
+    d.certified_revocation,
+    revocation_certifier.device_id
+FROM trustchain
+JOIN devices AS d ON d._id = trustchain._id
+LEFT JOIN devices AS device_certifier ON device_certifier._id = d.device_certifier
+LEFT JOIN devices AS revocation_certifier ON revocation_certifier._id = d.revocation_certifier
 """,
-                organization_id,
-                devices_to_fetch,
-            )
-
-            for result in results:
-                devices[result[0]] = Device(*result)
-
-            devices_to_fetch = []
-            for device in devices.values():
-                if device.device_certifier and device.device_certifier not in devices:
-                    devices_to_fetch.append(device.device_certifier)
-                if device.revocation_certifier and device.revocation_certifier not in devices:
-                    devices_to_fetch.append(device.revocation_certifier)
+            organization_id,
+            devices_ids,
+        )
 
-        return devices
+        return {DeviceID(result[0]): Device(DeviceID(result[0]), *result[1:]) for result in results}
 
     async def get_user_with_trustchain(
         self, organization_id: OrganizationID, user_id: UserID
@@ -357,7 +355,13 @@ WHERE
         async with self.dbh.pool.acquire() as conn:
             async with conn.transaction():
                 user = await self._get_user(conn, organization_id, user_id)
-                trustchain = await self._get_trustchain(conn, organization_id, user)
+                trustchain = await self._get_trustchain(
+                    conn,
+                    organization_id,
+                    user.user_certifier,
+                    *[device.device_certifier for device in user.devices.values()],
+                    *[device.revocation_certifier for device in user.devices.values()],
+                )
                 return user, trustchain
 
     # async def get_device(self, device_id: DeviceID) -> Device:
@@ -371,37 +375,45 @@ WHERE
     async def find(
         self, organization_id: OrganizationID, query: str = None, page: int = 1, per_page: int = 100
     ) -> Tuple[List[UserID], int]:
-        async with self.dbh.pool.acquire() as conn:
-            if query:
-                # LIKE only use % and _ as special tokens
-                escaped_query = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
-                all_results = await conn.fetch(
-                    """
-SELECT user_id FROM users
+        if query:
+            # LIKE only use % and _ as special tokens
+            escaped_query = query.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+            # Prefix search is served by the `users_user_id_pattern_idx` index
+            condition = "AND user_id LIKE $2 ESCAPE '!'"
+            args = (organization_id, f"{escaped_query}%")
+        else:
+            condition = ""
+            args = (organization_id,)
+        from_where = f"""
+FROM users
 WHERE
     organization = (
         SELECT _id from organizations WHERE organization_id = $1
     )
-    AND user_id LIKE $2 ESCAPE '!'
+    {condition}
+"""
+
+        async with self.dbh.pool.acquire() as conn:
+            # Only the requested page is retrieved, total is computed along
+            results = await conn.fetch(
+                f"""
+SELECT user_id, COUNT(*) OVER() AS total
+{from_where}
 ORDER BY user_id
+LIMIT ${len(args) + 1} OFFSET ${len(args) + 2}
 """,
-                    organization_id,
-                    f"{escaped_query}%",
-                )
+                *args,
+                per_page,
+                (page - 1) * per_page,
+            )
+            if results:
+                total = results[0]["total"]
+            elif page > 1:
+                # No row to carry the total when past the last page
+                total = await conn.fetchval(f"SELECT COUNT(*) {from_where}", *args)
             else:
-                all_results = await conn.fetch(
-                    """
-SELECT user_id FROM users
-WHERE organization = (
-    SELECT _id from organizations WHERE organization_id = $1
-)
-ORDER BY user_id
-""",
-                    organization_id,
-                )
-            # TODO: should user LIMIT and OFFSET in the SQL query instead
-            results = [UserID(x[0]) for x in all_results[(page - 1) * per_page : page * per_page]]
-        return results, len(all_results)
+                total = 0
+        return [UserID(x["user_id"]) for x in results], total
 
     async def _user_exists(self, conn, organization_id: OrganizationID, user_id: UserID) -> bool:
         user_result = await conn.fetchrow(
@@ -723,3 +735,7 @@ WHERE
 
                     else:
                         raise UserError(f"Update error: {result}")
+
+                await send_signal(
+                    conn, "device.revoked", organization_id=organization_id, device_id=device_id
+                )
@@ -15,6 +15,11 @@ from parsec.backend.vlob import (
 from parsec.backend.drivers.postgresql.handler import PGHandler
 
 
+# Above this number of ids, group check goes through a temporary table.
+# Clients check their entries by chunks of 1000, so full chunks do.
+GROUP_CHECK_TEMP_TABLE_THRESHOLD = 500
+
+
 class PGVlobComponent(BaseVlobComponent):
     def __init__(self, dbh: PGHandler, beacon_component: BaseBeaconComponent):
         self.dbh = dbh
@@ -32,8 +37,13 @@ class PGVlobComponent(BaseVlobComponent):
                 to_check_dict[x["id"]] = x
 
         async with self.dbh.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
+            if len(to_check_dict) > GROUP_CHECK_TEMP_TABLE_THRESHOLD:
+                rows = await self._group_check_with_temp_table(
+                    conn, organization_id, to_check_dict.keys()
+                )
+            else:
+                rows = await conn.fetch(
+                    """
 SELECT DISTINCT ON (vlob_id) vlob_id, rts, version
 FROM vlobs
 WHERE
@@ -43,9 +53,9 @@ WHERE
     AND vlob_id = any($2::uuid[])
 ORDER BY vlob_id, version DESC
 """,
-                organization_id,
-                to_check_dict.keys(),
-            )
+                    organization_id,
+                    to_check_dict.keys(),
+                )
 
         for id, rts, version in rows:
             if rts != to_check_dict[id]["rts"]:
@@ -55,6 +65,33 @@ ORDER BY vlob_id, version DESC
 
         return changed
 
+    @staticmethod
+    async def _group_check_with_temp_table(conn, organization_id, ids):
+        # Big arrays are slow to parse and to plan with, instead ids are
+        # bulk loaded into an indexed temporary table used in a join
+        async with conn.transaction():
+            await conn.execute(
+                """
+CREATE TEMPORARY TABLE vlob_group_check (
+    vlob_id UUID PRIMARY KEY
+) ON COMMIT DROP
+"""
+            )
+            await conn.copy_records_to_table("vlob_group_check", records=[(id,) for id in ids])
+            return await conn.fetch(
+                """
+SELECT DISTINCT ON (vlobs.vlob_id) vlobs.vlob_id, rts, version
+FROM vlob_group_check
+JOIN vlobs ON vlobs.vlob_id = vlob_group_check.vlob_id
+WHERE
+    organization = (
+        SELECT _id from organizations WHERE organization_id = $1
+    )
+ORDER BY vlobs.vlob_id, version DESC
+""",
+                organization_id,
+            )
+
     async def create(
         self,
         organization_id: OrganizationID,
@@ -5,7 +5,19 @@ from parsec.api.protocole import events_subscribe_serializer, events_listen_seri
 from parsec.backend.utils import catch_protocole_errors
 
 
-def _pinged_callback_factory(client_ctx, pings):
+def _put_event(client_ctx, metrics, msg):
+    try:
+        client_ctx.events.put_nowait(msg)
+    except trio.WouldBlock:
+        client_ctx.logger.warning("event queue is full")
+        if metrics is not None:
+            metrics.event_queue_full.inc(event=msg["event"])
+    else:
+        if metrics is not None:
+            metrics.event_queue_depth.observe(client_ctx.events.qsize())
+
+
+def _pinged_callback_factory(client_ctx, metrics, pings):
     pings = set(pings)
 
     def _on_pinged(event, organization_id, author, ping):
@@ -16,15 +28,12 @@ def _pinged_callback_factory(client_ctx, pings):
         ):
             return
 
-        try:
-            client_ctx.events.put_nowait({"event": event, "ping": ping})
-        except trio.WouldBlock:
-            client_ctx.logger.warning("event queue is full")
+        _put_event(client_ctx, metrics, {"event": event, "ping": ping})
 
     return _on_pinged
 
 
-def _beacon_updated_callback_factory(client_ctx, beacons_ids):
+def _beacon_updated_callback_factory(client_ctx, metrics, beacons_ids):
     beacons_ids = set(beacons_ids)
 
     def _on_beacon_updated(event, organization_id, author, beacon_id, index, src_id, src_version):
@@ -42,15 +51,12 @@ def _beacon_updated_callback_factory(client_ctx, beacons_ids):
             "src_id": src_id,
             "src_version": src_version,
         }
-        try:
-            client_ctx.events.put_nowait(msg)
-        except trio.WouldBlock:
-            client_ctx.logger.warning("event queue is full")
+        _put_event(client_ctx, metrics, msg)
 
     return _on_beacon_updated
 
 
-def _message_received_callback_factory(client_ctx):
+def _message_received_callback_factory(client_ctx, metrics):
     def _on_message_received(event, organization_id, author, recipient, index):
         if (
             organization_id != client_ctx.organization_id
@@ -59,17 +65,15 @@ def _message_received_callback_factory(client_ctx):
         ):
             return
 
-        try:
-            client_ctx.events.put_nowait({"event": event, "index": index})
-        except trio.WouldBlock:
-            client_ctx.logger.warning("event queue is full")
+        _put_event(client_ctx, metrics, {"event": event, "index": index})
 
     return _on_message_received
 
 
 class EventsComponent:
-    def __init__(self, event_bus: EventBus):
+    def __init__(self, event_bus: EventBus, metrics=None):
         self.event_bus = event_bus
+        self.metrics = metrics
 
     @catch_protocole_errors
     async def api_events_subscribe(self, client_ctx, msg):
@@ -78,17 +82,19 @@ class EventsComponent:
         new_subscribed_events = []
 
         if msg["pinged"]:
-            on_pinged = _pinged_callback_factory(client_ctx, msg["pinged"])
+            on_pinged = _pinged_callback_factory(client_ctx, self.metrics, msg["pinged"])
             new_subscribed_events.append(on_pinged)
             self.event_bus.connect("pinged", on_pinged, weak=True)
 
         if msg["beacon_updated"]:
-            on_beacon_updated = _beacon_updated_callback_factory(client_ctx, msg["beacon_updated"])
+            on_beacon_updated = _beacon_updated_callback_factory(
+                client_ctx, self.metrics, msg["beacon_updated"]
+            )
             new_subscribed_events.append(on_beacon_updated)
             self.event_bus.connect("beacon.updated", on_beacon_updated, weak=True)
 
         if msg["message_received"]:
-            on_message_received = _message_received_callback_factory(client_ctx)
+            on_message_received = _message_received_callback_factory(client_ctx, self.metrics)
             new_subscribed_events.append(on_message_received)
             self.event_bus.connect("message.received", on_message_received, weak=True)
 
@@ -0,0 +1,167 @@
+import trio
+from functools import partial
+from structlog import get_logger
+from async_generator import asynccontextmanager
+
+from parsec.metrics import DEFAULT_SIZE_BUCKETS, DEFAULT_DEPTH_BUCKETS, MetricsRegistry
+
+
+logger = get_logger()
+
+
+class BackendMetrics:
+    """
+    Metrics collected by the backend, only built when they are enabled
+    so components just have to check `metrics is not None`.
+    """
+
+    def __init__(self):
+        self.registry = registry = MetricsRegistry()
+        self.connections = registry.gauge(
+            "parsec_backend_connections", "Number of clients currently connected"
+        )
+        self.connections.set(0)
+        self.cmd_duration = registry.histogram(
+            "parsec_backend_cmd_duration_seconds", "Time spent processing commands", ("cmd",)
+        )
+        self.cmd_request_size = registry.histogram(
+            "parsec_backend_cmd_request_bytes",
+            "Size of the commands' requests",
+            ("cmd",),
+            buckets=DEFAULT_SIZE_BUCKETS,
+        )
+        self.cmd_response_size = registry.histogram(
+            "parsec_backend_cmd_response_bytes",
+            "Size of the commands' responses",
+            ("cmd",),
+            buckets=DEFAULT_SIZE_BUCKETS,
+        )
+        self.cmd_errors = registry.counter(
+            "parsec_backend_cmd_errors_total",
+            "Number of commands which didn't return an ok status",
+            ("cmd", "status"),
+        )
+        self.event_queue_depth = registry.histogram(
+            "parsec_backend_event_queue_depth",
+            "Number of events pending in the client's queue when a new one is pushed",
+            buckets=DEFAULT_DEPTH_BUCKETS,
+        )
+        self.event_queue_full = registry.counter(
+            "parsec_backend_event_queue_full_total",
+            "Number of events dropped because the client's queue was full",
+            ("event",),
+        )
+        self.db_pool_wait = registry.histogram(
+            "parsec_backend_db_pool_wait_seconds",
+            "Time spent waiting for a connection from the database pool",
+        )
+        self.blockstore_duration = registry.histogram(
+            "parsec_backend_blockstore_duration_seconds",
+            "Time spent in the blockstore",
+            ("driver", "operation"),
+        )
+        self.cache_lookups = registry.counter(
+            "parsec_backend_cache_lookups_total",
+            "Number of lookups in the organizations and users cache",
+            ("store", "result"),
+        )
+        self.cache_lookup_duration = registry.histogram(
+            "parsec_backend_cache_lookup_duration_seconds",
+            "Time spent looking up the organizations and users cache (misses included)",
+            ("store", "result"),
+        )
+        self.cache_hit_ratio = registry.gauge(
+            "parsec_backend_cache_hit_ratio", "Ratio of the cache lookups that were hits"
+        )
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+class TimedPool:
+    """
+    Database pool proxy measuring how long acquiring a connection takes.
+    """
+
+    def __init__(self, pool, metrics: BackendMetrics):
+        self._pool = pool
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    @asynccontextmanager
+    async def acquire(self):
+        start = trio.current_time()
+        async with self._pool.acquire() as conn:
+            self._metrics.db_pool_wait.observe(trio.current_time() - start)
+            yield conn
+
+
+def instrument_blockstore(blockstore, metrics: BackendMetrics, driver: str) -> None:
+    """
+    Measure the blockstore operations, `api_blockstore_*` commands go through them.
+    """
+    vanilla_read = blockstore.read
+    vanilla_create = blockstore.create
+
+    async def read(*args, **kwargs):
+        with metrics.blockstore_duration.time(driver=driver, operation="read"):
+            return await vanilla_read(*args, **kwargs)
+
+    async def create(*args, **kwargs):
+        with metrics.blockstore_duration.time(driver=driver, operation="create"):
+            return await vanilla_create(*args, **kwargs)
+
+    blockstore.read = read
+    blockstore.create = create
+
+
+async def _handle_metrics_request(stream, metrics):
+    async with stream:
+        request = b""
+        with trio.move_on_after(5):
+            while b"\r\n\r\n" not in request and len(request) < 8192:
+                data = await stream.receive_some(4096)
+                if not data:
+                    break
+                request += data
+        method, _, rest = request.partition(b" ")
+        path = rest.split(b" ", 1)[0].split(b"?", 1)[0]
+        if method == b"GET" and path in (b"/", b"/metrics"):
+            status = b"200 OK"
+            body = metrics.render().encode("utf8")
+        else:
+            status = b"404 Not Found"
+            body = b"Not found\n"
+        headers = (
+            b"HTTP/1.1 %s\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: %d\r\n"
+            b"Connection: close\r\n"
+            b"\r\n"
+        ) % (status, len(body))
+        try:
+            await stream.send_all(headers + body)
+        except trio.BrokenStreamError:
+            pass
+
+
+async def serve_metrics(
+    metrics: BackendMetrics, port: int, host: str, *, task_status=trio.TASK_STATUS_IGNORED
+):
+    """
+    Minimal HTTP server exposing the metrics on `/metrics`, not meant to be
+    reachable from outside (bind it on localhost).
+    """
+
+    async def _serve(stream):
+        try:
+            await _handle_metrics_request(stream, metrics)
+        except Exception:
+            logger.exception("Error while serving metrics")
+
+    with trio.open_cancel_scope() as cancel_scope:
+        async with trio.open_nursery() as nursery:
+            listeners = await nursery.start(partial(trio.serve_tcp, _serve, port, host=host))
+            task_status.started((cancel_scope, listeners))
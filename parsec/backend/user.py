@@ -168,14 +168,17 @@ class DeviceInvitation:
 
 
 class BaseUserComponent:
+    # Read-only accesses go through `self.cache` when provided (see `BackendCache`)
+
     #### Access user API ####
 
     @catch_protocole_errors
     async def api_user_get(self, client_ctx, msg):
         msg = user_get_serializer.req_load(msg)
 
+        getter = self.cache or self
         try:
-            user, trustchain = await self.get_user_with_trustchain(
+            user, trustchain = await getter.get_user_with_trustchain(
                 client_ctx.organization_id, msg["user_id"]
             )
         except UserNotFoundError:
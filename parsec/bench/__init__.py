@@ -0,0 +1,12 @@
+from parsec.bench.stats import LatencyRecorder
+from parsec.bench.provisioning import create_organization, bootstrap_organization, create_users
+from parsec.bench.load import run_load
+
+
+__all__ = (
+    "LatencyRecorder",
+    "create_organization",
+    "bootstrap_organization",
+    "create_users",
+    "run_load",
+)
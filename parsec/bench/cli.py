@@ -0,0 +1,190 @@
+import os
+import json
+import click
+import trio_asyncio
+from functools import partial
+
+from parsec.cli_utils import cli_exception_handler
+from parsec.logging import configure_logging
+from parsec.types import BackendAddr
+from parsec.bench.fs_bench import WORKLOADS, run_fs_bench, backend_testbed
+from parsec.bench.load import DEFAULT_MIX, parse_mix, provision_and_run_load
+
+
+__all__ = ("bench_cmd", "fs_cmd", "load_cmd")
+
+
+def _run_with_asyncio(fn, *args):
+    # PostgreSQL driver needs trio-asyncio, whose `run` doesn't return the result
+    result = None
+
+    async def _run():
+        nonlocal result
+        result = await fn(*args)
+
+    trio_asyncio.run(_run)
+    return result
+
+
+def _dump_report(report, output):
+    raw = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as fd:
+            fd.write(raw + "\n")
+    else:
+        click.echo(raw)
+
+
+@click.command(short_help="benchmark core's FS against an in-process backend")
+@click.option("--clients", "-n", default=4, type=click.IntRange(2), help="Number of cores")
+@click.option(
+    "--workload",
+    "-w",
+    "workloads",
+    multiple=True,
+    type=click.Choice(list(WORKLOADS)),
+    help="Workload to run, can be provided multiple times (default: all of them)",
+)
+@click.option("--db", default="MOCKED", help="Database configuration (default: mocked in memory)")
+@click.option(
+    "--blockstore",
+    "-b",
+    default="MOCKED",
+    type=click.Choice(("MOCKED", "POSTGRESQL", "S3", "SWIFT", "RAID1")),
+    help="Block store of the backend (default: mocked in memory)",
+)
+@click.option("--output", "-o", help="Write the JSON report in this file instead of stdout")
+def fs_cmd(clients, workloads, db, blockstore, output):
+    """
+    Run scripted workloads with several cores against a backend running in
+    this process, and report throughput and latency percentiles as JSON.
+    """
+    debug = "DEBUG" in os.environ
+    configure_logging(log_level="DEBUG" if debug else "WARNING")
+    with cli_exception_handler(debug):
+        report = _run_with_asyncio(
+            run_fs_bench, workloads or list(WORKLOADS), clients, db, blockstore, os.environ
+        )
+    _dump_report(report, output)
+
+
+async def _run_load_bench(backend_addr, administrator_token, db, blockstore, environ, **config):
+    if backend_addr:
+        return await provision_and_run_load(backend_addr, administrator_token, **config)
+
+    async with backend_testbed(db, blockstore, environ) as (backend, backend_addr):
+        return await provision_and_run_load(
+            backend_addr, backend.config.administrator_token, **config
+        )
+
+
+def _parse_mix(ctx, param, value):
+    try:
+        return parse_mix(value)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc))
+
+
+@click.command(short_help="load test a backend with raw protocol commands")
+@click.option(
+    "--backend-addr",
+    type=BackendAddr,
+    help="Backend to load (default: start one in this process, see --db and --blockstore)",
+)
+@click.option(
+    "--administrator-token",
+    envvar="ADMINISTRATOR_TOKEN",
+    help="Token to create the organization with on --backend-addr",
+)
+@click.option("--db", default="MOCKED", help="Database configuration (default: mocked in memory)")
+@click.option(
+    "--blockstore",
+    "-b",
+    default="MOCKED",
+    type=click.Choice(("MOCKED", "POSTGRESQL", "S3", "SWIFT", "RAID1")),
+    help="Block store of the backend (default: mocked in memory)",
+)
+@click.option("--users", "-u", default=100, type=click.IntRange(1), help="Users to create")
+@click.option("--devices-per-user", default=1, type=click.IntRange(1))
+@click.option("--processes", "-p", default=1, type=click.IntRange(1), help="Worker processes")
+@click.option("--tasks", "-t", default=10, type=click.IntRange(1), help="Tasks per process")
+@click.option(
+    "--duration", "-d", default=10.0, type=click.FloatRange(0), help="Seconds (0 for no limit)"
+)
+@click.option("--requests", "-r", type=click.IntRange(1), help="Commands issued by each task")
+@click.option("--payload-size", default=1024, type=click.IntRange(1), help="Blob and block size")
+@click.option(
+    "--mix",
+    "-m",
+    default=",".join(f"{cmd}={weight}" for cmd, weight in DEFAULT_MIX.items()),
+    callback=_parse_mix,
+    show_default=True,
+    help="Weight of each command",
+)
+@click.option("--output", "-o", help="Write the JSON report in this file instead of stdout")
+def load_cmd(
+    backend_addr,
+    administrator_token,
+    db,
+    blockstore,
+    users,
+    devices_per_user,
+    processes,
+    tasks,
+    duration,
+    requests,
+    payload_size,
+    mix,
+    output,
+):
+    """
+    Create an organization populated with users, then make their devices
+    issue a mix of commands from several processes, and report latency
+    percentiles, throughput and error rate of each command as JSON.
+    """
+    if backend_addr and not administrator_token:
+        raise click.BadParameter("Required with --backend-addr", param_hint="--administrator-token")
+    if not duration and not requests:
+        raise click.BadParameter(
+            "Either --duration or --requests must be set", param_hint="--duration"
+        )
+
+    debug = "DEBUG" in os.environ
+    configure_logging(log_level="DEBUG" if debug else "WARNING")
+    with cli_exception_handler(debug):
+        report = _run_with_asyncio(
+            partial(
+                _run_load_bench,
+                backend_addr,
+                administrator_token,
+                db,
+                blockstore,
+                os.environ,
+                users=users,
+                devices_per_user=devices_per_user,
+                mix=mix,
+                processes=processes,
+                tasks=tasks,
+                duration=duration,
+                requests=requests,
+                payload_size=payload_size,
+            )
+        )
+    report["config"] = {
+        "backend": str(backend_addr) if backend_addr else {"db": db, "blockstore": blockstore},
+        "processes": processes,
+        "tasks": tasks,
+        "duration": duration,
+        "requests": requests,
+        "mix": mix,
+    }
+    _dump_report(report, output)
+
+
+@click.group()
+def bench_cmd():
+    pass
+
+
+bench_cmd.add_command(fs_cmd, "fs")
+bench_cmd.add_command(load_cmd, "load")
@@ -0,0 +1,239 @@
+import os
+import trio
+import random
+import tempfile
+from pathlib import Path
+from functools import partial
+from time import perf_counter
+from typing import List
+from async_generator import asynccontextmanager
+
+from parsec.types import BackendAddr, DeviceID, OrganizationID
+from parsec.backend import BackendApp, config_factory
+from parsec.core.config import CoreConfig
+from parsec.core.logged_core import logged_core_factory
+from parsec.bench.stats import LatencyRecorder, run_concurrently
+from parsec.bench.provisioning import create_organization, bootstrap_organization, create_users
+
+
+@asynccontextmanager
+async def backend_testbed(db_url: str = "MOCKED", blockstore_type: str = "MOCKED", environ={}):
+    """
+    Run a backend in this process, listening on a random port of localhost.
+    """
+    config = config_factory(db_url=db_url, blockstore_type=blockstore_type, environ=environ)
+    backend = BackendApp(config)
+    async with trio.open_nursery() as nursery:
+        await backend.init(nursery)
+        try:
+            listeners = await nursery.start(
+                partial(trio.serve_tcp, backend.handle_client, 0, host="127.0.0.1")
+            )
+            port = listeners[0].socket.getsockname()[1]
+            yield backend, BackendAddr(f"ws://127.0.0.1:{port}")
+
+        finally:
+            await backend.teardown()
+            nursery.cancel_scope.cancel()
+
+
+@asynccontextmanager
+async def logged_cores(devices, base_dir: Path, **config):
+    """
+    Start a core for each device, each one with its own config and data directories.
+    """
+    cores = []
+    async with trio.open_nursery() as nursery:
+
+        async def _run_core(device, task_status=trio.TASK_STATUS_IGNORED):
+            core_dir = base_dir / str(device.device_id)
+            core_config = CoreConfig(
+                config_dir=core_dir / "config",
+                cache_base_dir=core_dir / "cache",
+                data_base_dir=core_dir / "data",
+                mountpoint_base_dir=core_dir / "mnt",
+                **config,
+            )
+            async with logged_core_factory(core_config, device) as core:
+                task_status.started(core)
+                await trio.sleep_forever()
+
+        for device in devices:
+            cores.append(await nursery.start(_run_core, device))
+        try:
+            yield cores
+        finally:
+            nursery.cancel_scope.cancel()
+
+
+def _payload(size: int) -> bytes:
+    return os.urandom(size)
+
+
+async def file_create_storm(cores, recorder, files_per_client: int = 100):
+    async def _storm(core):
+        workspace = f"/storm-{core.device.user_id}"
+        await core.fs.workspace_create(workspace)
+        for i in range(files_per_client):
+            with recorder.measure("file_create"):
+                await core.fs.file_create(f"{workspace}/file{i}.txt")
+        with recorder.measure("sync"):
+            await core.fs.sync(workspace)
+
+    await run_concurrently(_storm, *[(core,) for core in cores])
+
+
+async def sequential_io(cores, recorder, file_size: int = 8 * 2 ** 20, chunk_size: int = 2 ** 20):
+    async def _sequential(core):
+        workspace = f"/seq-{core.device.user_id}"
+        path = f"{workspace}/big.bin"
+        await core.fs.workspace_create(workspace)
+        await core.fs.file_create(path)
+        chunk = _payload(chunk_size)
+        for offset in range(0, file_size, chunk_size):
+            with recorder.measure("sequential_write", size=chunk_size):
+                await core.fs.file_write(path, chunk, offset)
+        with recorder.measure("sync", size=file_size):
+            await core.fs.sync(workspace)
+        for offset in range(0, file_size, chunk_size):
+            with recorder.measure("sequential_read", size=chunk_size):
+                await core.fs.file_read(path, chunk_size, offset)
+
+    await run_concurrently(_sequential, *[(core,) for core in cores])
+
+
+async def random_io(
+    cores, recorder, file_size: int = 4 * 2 ** 20, io_size: int = 4096, operations: int = 200
+):
+    async def _random(core, rand):
+        workspace = f"/random-{core.device.user_id}"
+        path = f"{workspace}/random.bin"
+        await core.fs.workspace_create(workspace)
+        await core.fs.file_create(path)
+        await core.fs.file_write(path, _payload(file_size))
+        await core.fs.sync(workspace)
+        data = _payload(io_size)
+        for _ in range(operations):
+            offset = rand.randrange(0, file_size - io_size)
+            if rand.random() < 0.5:
+                with recorder.measure("random_write", size=io_size):
+                    await core.fs.file_write(path, data, offset)
+            else:
+                with recorder.measure("random_read", size=io_size):
+                    await core.fs.file_read(path, io_size, offset)
+
+    await run_concurrently(_random, *[(core, random.Random(i)) for i, core in enumerate(cores)])
+
+
+async def deep_tree_listing(cores, recorder, depth: int = 6, fanout: int = 3):
+    async def _listing(core):
+        workspace = f"/tree-{core.device.user_id}"
+        await core.fs.workspace_create(workspace)
+
+        async def _create(path, level):
+            if level == depth:
+                await core.fs.file_create(f"{path}/leaf.txt")
+                return
+            for i in range(fanout):
+                child = f"{path}/dir{i}"
+                await core.fs.folder_create(child)
+                await _create(child, level + 1)
+
+        await _create(workspace, 0)
+
+        async def _walk(path):
+            with recorder.measure("stat"):
+                stat = await core.fs.stat(path)
+            for child in stat.get("children", ()):
+                await _walk(f"{path}/{child}")
+
+        with recorder.measure("tree_walk"):
+            await _walk(workspace)
+
+    await run_concurrently(_listing, *[(core,) for core in cores])
+
+
+async def full_sync_after_offline_edits(cores, recorder, files_per_client: int = 50):
+    async def _edits(core):
+        workspace = f"/offline-{core.device.user_id}"
+        await core.fs.workspace_create(workspace)
+        await core.fs.sync(workspace)
+        # Edits are done without syncing, as if the backend was not reachable
+        for i in range(files_per_client):
+            path = f"{workspace}/file{i}.txt"
+            await core.fs.file_create(path)
+            await core.fs.file_write(path, _payload(1024))
+        with recorder.measure("full_sync"):
+            await core.fs.full_sync()
+
+    await run_concurrently(_edits, *[(core,) for core in cores])
+
+
+async def sharing_fan_out(cores, recorder):
+    sharer, *recipients = cores
+    workspace = "/shared"
+    await sharer.fs.workspace_create(workspace)
+    await sharer.fs.sync(workspace)
+    waiters = [(core, core.event_bus.waiter_on("sharing.new")) for core in recipients]
+
+    start = perf_counter()
+    for core in recipients:
+        with recorder.measure("share"):
+            await sharer.fs.share(workspace, core.device.user_id)
+
+    async def _wait_shared(core, waiter):
+        with recorder.measure("share_received"):
+            await waiter.wait()
+        recorder.record("share_received_since_first_share", perf_counter() - start)
+
+    await run_concurrently(_wait_shared, *waiters)
+
+
+WORKLOADS = {
+    "file_create_storm": file_create_storm,
+    "sequential_io": sequential_io,
+    "random_io": random_io,
+    "deep_tree_listing": deep_tree_listing,
+    "full_sync_after_offline_edits": full_sync_after_offline_edits,
+    "sharing_fan_out": sharing_fan_out,
+}
+
+
+async def run_fs_bench(
+    workloads: List[str],
+    clients: int = 4,
+    db_url: str = "MOCKED",
+    blockstore_type: str = "MOCKED",
+    environ: dict = {},
+    workload_timeout: float = 600,
+) -> dict:
+    """
+    Start a backend and `clients` cores in this process, then run the
+    workloads one after the other against the cores' FS.
+
+    Returns: JSON-serializable report of each workload
+    """
+    report = {
+        "config": {"clients": clients, "db": db_url, "blockstore": blockstore_type},
+        "workloads": {},
+    }
+    async with backend_testbed(db_url, blockstore_type, environ) as (backend, backend_addr):
+        bootstrap_addr = await create_organization(
+            backend_addr, backend.config.administrator_token, OrganizationID("BenchOrg")
+        )
+        admin = await bootstrap_organization(bootstrap_addr, DeviceID("admin@dev0"))
+        devices = await create_users(admin, clients)
+
+        with tempfile.TemporaryDirectory(prefix="parsec-bench-") as base_dir:
+            async with logged_cores(devices, Path(base_dir)) as cores:
+                for name in workloads:
+                    recorder = LatencyRecorder()
+                    recorder.start()
+                    with trio.fail_after(workload_timeout):
+                        await WORKLOADS[name](cores, recorder)
+                    recorder.stop()
+                    report["workloads"][name] = {
+                        "duration": recorder.duration,
+                        "operations": recorder.report(),
+                    }
+    return report
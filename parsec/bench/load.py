@@ -0,0 +1,232 @@
+import os
+import trio
+import random
+import multiprocessing
+from uuid import uuid4
+from time import perf_counter
+from typing import Dict, List
+
+from parsec.types import DeviceID, OrganizationID, BackendAddr
+from parsec.core.types import LocalDevice, local_device_serializer
+from parsec.core.backend_connection import (
+    BackendConnectionError,
+    BackendCmdsBadResponse,
+    backend_cmds_factory,
+)
+from parsec.bench.stats import LatencyRecorder
+from parsec.bench.provisioning import create_organization, bootstrap_organization, create_users
+
+
+COMMANDS = (
+    "vlob_create",
+    "vlob_read",
+    "vlob_update",
+    "blockstore_create",
+    "blockstore_read",
+    "events_listen",
+    "message_send",
+)
+
+DEFAULT_MIX = {
+    "vlob_create": 1,
+    "vlob_read": 4,
+    "vlob_update": 2,
+    "blockstore_create": 1,
+    "blockstore_read": 4,
+    "events_listen": 2,
+    "message_send": 1,
+}
+
+
+def parse_mix(raw: str) -> Dict[str, int]:
+    """
+    Parse a commands mix such as `vlob_read=4,blockstore_read=1`, each
+    command being picked proportionally to its weight.
+
+    Raises:
+        ValueError
+    """
+    mix = {}
+    for item in raw.split(","):
+        try:
+            cmd, weight = item.split("=")
+            weight = int(weight)
+        except ValueError:
+            raise ValueError(f"Invalid mix item `{item}`, should be `<command>=<weight>`")
+        if cmd not in COMMANDS:
+            raise ValueError(f"Unknown command `{cmd}`, should be one of {', '.join(COMMANDS)}")
+        if weight < 0:
+            raise ValueError(f"Invalid weight for `{cmd}`, should be positive")
+        mix[cmd] = weight
+    if not any(mix.values()):
+        raise ValueError("At least one command must have a non-zero weight")
+    return mix
+
+
+class _LoadTask:
+    """
+    Client issuing commands from the mix over its own connection, keeping
+    track of the vlobs and blocks it has created so it can read them back.
+    """
+
+    def __init__(self, cmds, device, recipients, rand, payload_size):
+        self.cmds = cmds
+        self.device = device
+        self.recipients = recipients
+        self.rand = rand
+        self.payload = os.urandom(payload_size)
+        # vlob id -> (rts, wts, last version)
+        self.vlobs = {}
+        self.blocks = []
+
+    async def vlob_create(self):
+        id = uuid4()
+        rts, wts = uuid4().hex, uuid4().hex
+        await self.cmds.vlob_create(id, rts, wts, self.payload, None)
+        self.vlobs[id] = (rts, wts, 1)
+
+    async def vlob_read(self):
+        id = self.rand.choice(list(self.vlobs))
+        await self.cmds.vlob_read(id, self.vlobs[id][0])
+
+    async def vlob_update(self):
+        id = self.rand.choice(list(self.vlobs))
+        rts, wts, version = self.vlobs[id]
+        await self.cmds.vlob_update(id, wts, version + 1, self.payload, None)
+        self.vlobs[id] = (rts, wts, version + 1)
+
+    async def blockstore_create(self):
+        id = uuid4()
+        await self.cmds.blockstore_create(id, self.payload)
+        self.blocks.append(id)
+
+    async def blockstore_read(self):
+        await self.cmds.blockstore_read(self.rand.choice(self.blocks))
+
+    async def events_listen(self):
+        try:
+            await self.cmds.events_listen(wait=False)
+        except BackendCmdsBadResponse as exc:
+            if exc.status != "no_events":
+                raise
+
+    async def message_send(self):
+        await self.cmds.message_send(self.rand.choice(self.recipients), self.payload)
+
+    async def run(self, recorder, mix, deadline, requests):
+        # Read and update commands need something to work on
+        await self.vlob_create()
+        await self.blockstore_create()
+        await self.cmds.events_subscribe(message_received=True)
+
+        cmds, weights = zip(*mix.items())
+        done = 0
+        while perf_counter() < deadline and (requests is None or done < requests):
+            cmd = self.rand.choices(cmds, weights)[0]
+            size = len(self.payload) if cmd not in ("events_listen", "vlob_read") else 0
+            with recorder.measure(cmd, size=size, catch=BackendConnectionError):
+                await getattr(self, cmd)()
+            done += 1
+
+
+async def _run_process_tasks(
+    raw_devices, recipients, mix, duration, requests, payload_size, seed
+) -> LatencyRecorder:
+    devices = [local_device_serializer.loads(raw) for raw in raw_devices]
+    recorder = LatencyRecorder()
+    deadline = perf_counter() + duration if duration else float("inf")
+
+    async def _run_task(index, device):
+        async with backend_cmds_factory(
+            device.organization_addr, device.device_id, device.signing_key, max_pool=1
+        ) as cmds:
+            task = _LoadTask(cmds, device, recipients, random.Random(seed + index), payload_size)
+            await task.run(recorder, mix, deadline, requests)
+
+    async with trio.open_nursery() as nursery:
+        for index, device in enumerate(devices):
+            nursery.start_soon(_run_task, index, device)
+    return recorder
+
+
+def _process_main(args) -> LatencyRecorder:
+    return trio.run(_run_process_tasks, *args)
+
+
+async def run_load(
+    devices: List[LocalDevice],
+    mix: Dict[str, int] = DEFAULT_MIX,
+    processes: int = 1,
+    tasks: int = 10,
+    duration: float = 10,
+    requests: int = None,
+    payload_size: int = 1024,
+) -> LatencyRecorder:
+    """
+    Drive the commands `mix` from `tasks` concurrent tasks in each of the
+    `processes` worker processes, tasks being given the devices in turn.
+
+    Each task stops after `duration` seconds or `requests` commands,
+    whichever comes first.
+    """
+    raw_devices = [local_device_serializer.dumps(device) for device in devices]
+    recipients = sorted({device.user_id for device in devices})
+    args = []
+    for process_index in range(processes):
+        process_devices = [
+            raw_devices[(process_index * tasks + task_index) % len(raw_devices)]
+            for task_index in range(tasks)
+        ]
+        args.append(
+            (
+                process_devices,
+                recipients,
+                mix,
+                duration,
+                requests,
+                payload_size,
+                process_index * tasks,
+            )
+        )
+
+    # Worker processes don't inherit the trio loop (nor a backend running in it)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes) as pool:
+        recorders = await trio.run_sync_in_worker_thread(pool.map, _process_main, args)
+
+    recorder = LatencyRecorder()
+    for other in recorders:
+        recorder.merge(other)
+    return recorder
+
+
+async def provision_and_run_load(
+    backend_addr: BackendAddr,
+    administrator_token: str,
+    users: int = 100,
+    devices_per_user: int = 1,
+    **load_config,
+) -> dict:
+    """
+    Bootstrap a new organization on the backend, populate it with `users`
+    users, then run the load with their devices.
+
+    Returns: JSON-serializable report of provisioning and load
+    """
+    organization_id = OrganizationID(f"LoadOrg{uuid4().hex[:8]}")
+    provisioning_start = perf_counter()
+    bootstrap_addr = await create_organization(backend_addr, administrator_token, organization_id)
+    admin = await bootstrap_organization(bootstrap_addr, DeviceID("admin@dev0"))
+    devices = await create_users(admin, users, devices_per_user, concurrency=16)
+    provisioning_duration = perf_counter() - provisioning_start
+
+    recorder = await run_load(devices, **load_config)
+    return {
+        "organization": str(organization_id),
+        "provisioning": {
+            "users": users,
+            "devices": len(devices),
+            "duration": provisioning_duration,
+        },
+        "operations": recorder.report(),
+    }
@@ -0,0 +1,114 @@
+import trio
+import pendulum
+from typing import List
+
+from parsec.types import DeviceID, OrganizationID, BackendAddr, BackendOrganizationBootstrapAddr
+from parsec.crypto import SigningKey
+from parsec.trustchain import certify_user, certify_device
+from parsec.core.types import LocalDevice
+from parsec.core.devices_manager import generate_new_device
+from parsec.core.backend_connection import (
+    backend_administrator_cmds_factory,
+    backend_anonymous_cmds_factory,
+    backend_cmds_factory,
+)
+
+
+async def create_organization(
+    backend_addr: BackendAddr, administrator_token: str, organization_id: OrganizationID
+) -> BackendOrganizationBootstrapAddr:
+    async with backend_administrator_cmds_factory(backend_addr, administrator_token) as cmds:
+        bootstrap_token = await cmds.organization_create(organization_id)
+    return BackendOrganizationBootstrapAddr.build(backend_addr, organization_id, bootstrap_token)
+
+
+async def bootstrap_organization(
+    bootstrap_addr: BackendOrganizationBootstrapAddr, device_id: DeviceID
+) -> LocalDevice:
+    """
+    Returns: the organization's first device, which is an admin one
+    """
+    root_signing_key = SigningKey.generate()
+    organization_addr = bootstrap_addr.generate_organization_addr(root_signing_key.verify_key)
+    device = generate_new_device(device_id, organization_addr)
+
+    now = pendulum.now()
+    certified_user = certify_user(None, root_signing_key, device.user_id, device.public_key, now)
+    certified_device = certify_device(None, root_signing_key, device_id, device.verify_key, now)
+    async with backend_anonymous_cmds_factory(bootstrap_addr) as cmds:
+        await cmds.organization_bootstrap(
+            bootstrap_addr.organization_id,
+            bootstrap_addr.bootstrap_token,
+            root_signing_key.verify_key,
+            certified_user,
+            certified_device,
+        )
+    return device
+
+
+async def create_users(
+    admin: LocalDevice,
+    users: int,
+    devices_per_user: int = 1,
+    concurrency: int = 8,
+    user_prefix: str = "user",
+) -> List[LocalDevice]:
+    """
+    Create `users` users (certified by `admin`) with `devices_per_user`
+    devices each, using `concurrency` connections to the backend.
+
+    Returns: the created devices, grouped by user
+    """
+    created = [None] * users
+
+    async def _create_user(index, cmds):
+        device = generate_new_device(
+            DeviceID(f"{user_prefix}{index}@dev0"), admin.organization_addr
+        )
+        now = pendulum.now()
+        certified_user = certify_user(
+            admin.device_id, admin.signing_key, device.user_id, device.public_key, now
+        )
+        certified_device = certify_device(
+            admin.device_id, admin.signing_key, device.device_id, device.verify_key, now
+        )
+        await cmds.user_create(certified_user, certified_device, False)
+        devices = [device]
+
+        if devices_per_user > 1:
+            async with backend_cmds_factory(
+                device.organization_addr, device.device_id, device.signing_key, max_pool=1
+            ) as user_cmds:
+                for device_index in range(1, devices_per_user):
+                    other_device = generate_new_device(
+                        DeviceID(f"{device.user_id}@dev{device_index}"), admin.organization_addr
+                    ).evolve(
+                        private_key=device.private_key,
+                        user_manifest_access=device.user_manifest_access,
+                    )
+                    certified_device = certify_device(
+                        device.device_id,
+                        device.signing_key,
+                        other_device.device_id,
+                        other_device.verify_key,
+                        pendulum.now(),
+                    )
+                    await user_cmds.device_create(certified_device, b"")
+                    devices.append(other_device)
+
+        created[index] = devices
+
+    async with backend_cmds_factory(
+        admin.organization_addr, admin.device_id, admin.signing_key, max_pool=concurrency
+    ) as cmds:
+        limiter = trio.CapacityLimiter(concurrency)
+
+        async def _limited_create_user(index):
+            async with limiter:
+                await _create_user(index, cmds)
+
+        async with trio.open_nursery() as nursery:
+            for index in range(users):
+                nursery.start_soon(_limited_create_user, index)
+
+    return [device for devices in created for device in devices]
@@ -0,0 +1,115 @@
+import trio
+from time import perf_counter
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import List, Dict
+
+
+def percentile(sorted_values: List[float], ratio: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * ratio), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    """
+    Collect the latency and errors of each operation, reported as
+    throughput and percentiles (in milliseconds) once the run is over.
+
+    Throughputs are computed over the period the operation was running,
+    from the start of its first occurence to the end of its last one.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        # operation -> (first start, last end)
+        self.periods = {}
+        self._start = None
+        self._end = None
+
+    def start(self) -> None:
+        self._start = perf_counter()
+
+    def stop(self) -> None:
+        self._end = perf_counter()
+
+    @property
+    def duration(self) -> float:
+        end = self._end if self._end is not None else perf_counter()
+        return end - self._start if self._start is not None else 0.0
+
+    def record(self, operation: str, latency: float, size: int = 0) -> None:
+        end = perf_counter()
+        self.latencies[operation].append(latency)
+        self.bytes[operation] += size
+        first_start, last_end = self.periods.get(operation, (end - latency, end))
+        self.periods[operation] = (min(first_start, end - latency), max(last_end, end))
+
+    def record_error(self, operation: str) -> None:
+        self.errors[operation] += 1
+
+    @contextmanager
+    def measure(self, operation: str, size: int = 0, catch=()):
+        """
+        Record the latency of the wrapped code, exceptions from `catch` are
+        accounted as errors of the operation and swallowed.
+        """
+        start = perf_counter()
+        try:
+            yield
+        except catch:
+            self.record_error(operation)
+        else:
+            self.record(operation, perf_counter() - start, size)
+
+    def merge(self, other: "LatencyRecorder") -> None:
+        for operation, latencies in other.latencies.items():
+            self.latencies[operation] += latencies
+        for operation, errors in other.errors.items():
+            self.errors[operation] += errors
+        for operation, size in other.bytes.items():
+            self.bytes[operation] += size
+        for operation, (first_start, last_end) in other.periods.items():
+            if operation in self.periods:
+                self.periods[operation] = (
+                    min(first_start, self.periods[operation][0]),
+                    max(last_end, self.periods[operation][1]),
+                )
+            else:
+                self.periods[operation] = (first_start, last_end)
+
+    def report(self) -> Dict[str, dict]:
+        report = {}
+        for operation in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies[operation])
+            count = len(latencies)
+            errors = self.errors[operation]
+            first_start, last_end = self.periods.get(operation, (0, 0))
+            duration = last_end - first_start
+            entry = {
+                "count": count,
+                "errors": errors,
+                "error_rate": errors / (count + errors) if count + errors else 0.0,
+                "throughput": count / duration if duration else 0.0,
+                "p50_ms": percentile(latencies, 0.5) * 1000,
+                "p90_ms": percentile(latencies, 0.9) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+                "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            }
+            if self.bytes[operation]:
+                entry["bytes"] = self.bytes[operation]
+                entry["mb_per_s"] = self.bytes[operation] / duration / 2 ** 20 if duration else 0.0
+            report[operation] = entry
+        return report
+
+
+async def run_concurrently(fn, *args_list) -> None:
+    """
+    Run `fn` once for each of the arguments tuples, all at the same time.
+    """
+    async with trio.open_nursery() as nursery:
+        for args in args_list:
+            nursery.start_soon(fn, *args)
@@ -1,6 +1,6 @@
-import trio
 import click
 import traceback
+from importlib import import_module
 from async_generator import asynccontextmanager
 from contextlib import contextmanager
 
@@ -31,6 +31,9 @@ def operation(txt):
 
 @asynccontextmanager
 async def spinner(txt, sep=" ", scheme="dots", color="magenta"):
+    # Imported here to keep trio out of the CLI startup
+    import trio
+
     interval = SCHEMES[scheme]["interval"]
     frames = SCHEMES[scheme]["frames"]
     result = None
@@ -105,3 +108,49 @@ def generate_not_available_cmd(exc, hint=None):
         raise SystemExit(error_msg)
 
     return bad_cmd
+
+
+class LazyGroup(click.Group):
+    """
+    Click group importing the module of a subcommand only when it is invoked.
+
+    `lazy_commands` maps command names to `("<module>:<attribute>", short help)`,
+    so the group's help can be displayed without importing anything.
+    """
+
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands or {})
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        try:
+            target, _ = self.lazy_commands.pop(cmd_name)
+        except KeyError:
+            return super().get_command(ctx, cmd_name)
+
+        module_name, attr_name = target.split(":")
+        try:
+            cmd = getattr(import_module(module_name), attr_name)
+        except ImportError as exc:
+            cmd = generate_not_available_cmd(exc)
+        self.add_command(cmd, cmd_name)
+        return cmd
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for cmd_name in self.list_commands(ctx):
+            try:
+                _, short_help = self.lazy_commands[cmd_name]
+            except KeyError:
+                cmd = self.get_command(ctx, cmd_name)
+                if cmd is None or cmd.hidden:
+                    continue
+                short_help = cmd.get_short_help_str()
+            rows.append((cmd_name, short_help))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
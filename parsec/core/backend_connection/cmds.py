@@ -2,6 +2,8 @@ from typing import Tuple, List, Dict, Iterable
 from uuid import UUID
 
 from parsec.types import DeviceID, UserID, DeviceName, OrganizationID
+from parsec.logging import payload_logging_enabled
+from parsec.tracing import span
 from parsec.crypto import VerifyKey
 from parsec.api.transport import Transport, TransportError
 from parsec.api.protocole import (
@@ -12,6 +14,7 @@ from parsec.api.protocole import (
     events_subscribe_serializer,
     events_listen_serializer,
     beacon_read_serializer,
+    beacon_get_head_serializer,
     message_send_serializer,
     message_get_serializer,
     vlob_group_check_serializer,
@@ -43,14 +46,23 @@ from parsec.core.backend_connection.exceptions import (
 )
 
 
+def _shorten_data(data):
+    if len(data) > 300:
+        return data[:150] + b"[...]" + data[-150:]
+    else:
+        return data
+
+
 async def _send_cmd(transport, serializer, **req):
-    transport.logger.info("Request", cmd=req["cmd"])
+    with span("backend_cmd", cmd=req["cmd"]) as cmd_span:
+        if cmd_span.sampled:
+            # Let the backend attach its spans to ours
+            req["request_id"] = cmd_span.request_id
+        return await _send_traced_cmd(transport, serializer, req)
 
-    def _shorten_data(data):
-        if len(req) > 300:
-            return data[:150] + b"[...]" + data[-150:]
-        else:
-            return data
+
+async def _send_traced_cmd(transport, serializer, req):
+    transport.logger.info("Request", cmd=req["cmd"])
 
     try:
         raw_req = serializer.req_dumps(req)
@@ -58,7 +70,8 @@ async def _send_cmd(transport, serializer, **req):
     except ProtocoleError as exc:
         raise BackendCmdsInvalidRequest() from exc
 
-    transport.logger.debug("send req", req=_shorten_data(raw_req))
+    if payload_logging_enabled():
+        transport.logger.debug("send req", req=_shorten_data(raw_req))
     try:
         await transport.send(raw_req)
         raw_rep = await transport.recv()
@@ -67,7 +80,8 @@ async def _send_cmd(transport, serializer, **req):
         transport.logger.info("Request failed (backend not available)", cmd=req["cmd"])
         raise BackendNotAvailable(exc) from exc
 
-    transport.logger.debug("recv rep", req=_shorten_data(raw_rep))
+    if payload_logging_enabled():
+        transport.logger.debug("recv rep", req=_shorten_data(raw_rep))
 
     try:
         rep = serializer.rep_loads(raw_rep)
@@ -124,13 +138,22 @@ async def events_listen(transport: Transport, wait: bool = True) -> dict:
 # Beacon
 
 
-async def beacon_read(transport: Transport, id: UUID, offset: int) -> List[Tuple[UUID, int]]:
+async def beacon_read(
+    transport: Transport, id: UUID, offset: int
+) -> Tuple[int, List[Tuple[UUID, int]]]:
     rep = await _send_cmd(
         transport, beacon_read_serializer, cmd="beacon_read", id=id, offset=offset
     )
     if rep["status"] != "ok":
         raise BackendCmdsBadResponse(rep)
-    return [(item["src_id"], item["src_version"]) for item in rep["items"]]
+    return rep["index"], [(item["src_id"], item["src_version"]) for item in rep["items"]]
+
+
+async def beacon_get_head(transport: Transport, id: UUID) -> int:
+    rep = await _send_cmd(transport, beacon_get_head_serializer, cmd="beacon_get_head", id=id)
+    if rep["status"] != "ok":
+        raise BackendCmdsBadResponse(rep)
+    return rep["index"]
 
 
 # Message
@@ -1,3 +1,4 @@
+from typing import Optional
 from structlog import get_logger
 from async_generator import asynccontextmanager
 
@@ -30,6 +31,8 @@ class BackendCmdsPool:
         self.transport_pool = transport_pool
 
     def _expose_cmds_with_retrier(name):
+        # Only for idempotent commands: the request may have been processed
+        # by the backend even if the connection broke before the response
         cmd = getattr(cmds, name)
 
         async def wrapper(self, *args, **kwargs):
@@ -38,6 +41,7 @@ class BackendCmdsPool:
                     return await cmd(transport, *args, **kwargs)
 
             except BackendNotAvailable:
+                self.transport_pool.stats.retries += 1
                 async with self.transport_pool.acquire(force_fresh=True) as transport:
                     return await cmd(transport, *args, **kwargs)
 
@@ -45,32 +49,44 @@ class BackendCmdsPool:
 
         return wrapper
 
+    def _expose_cmds(name):
+        cmd = getattr(cmds, name)
+
+        async def wrapper(self, *args, **kwargs):
+            async with self.transport_pool.acquire() as transport:
+                return await cmd(transport, *args, **kwargs)
+
+        wrapper.__name__ = name
+
+        return wrapper
+
     ping = _expose_cmds_with_retrier("ping")
 
     events_subscribe = _expose_cmds_with_retrier("events_subscribe")
     events_listen = _expose_cmds_with_retrier("events_listen")
     beacon_read = _expose_cmds_with_retrier("beacon_read")
-    message_send = _expose_cmds_with_retrier("message_send")
+    beacon_get_head = _expose_cmds_with_retrier("beacon_get_head")
+    message_send = _expose_cmds("message_send")
     message_get = _expose_cmds_with_retrier("message_get")
 
     vlob_group_check = _expose_cmds_with_retrier("vlob_group_check")
-    vlob_create = _expose_cmds_with_retrier("vlob_create")
+    vlob_create = _expose_cmds("vlob_create")
     vlob_read = _expose_cmds_with_retrier("vlob_read")
-    vlob_update = _expose_cmds_with_retrier("vlob_update")
+    vlob_update = _expose_cmds("vlob_update")
 
-    blockstore_create = _expose_cmds_with_retrier("blockstore_create")
+    blockstore_create = _expose_cmds("blockstore_create")
     blockstore_read = _expose_cmds_with_retrier("blockstore_read")
 
     user_get = _expose_cmds_with_retrier("user_get")
     user_find = _expose_cmds_with_retrier("user_find")
-    user_invite = _expose_cmds_with_retrier("user_invite")
+    user_invite = _expose_cmds("user_invite")
     user_cancel_invitation = _expose_cmds_with_retrier("user_cancel_invitation")
-    user_create = _expose_cmds_with_retrier("user_create")
+    user_create = _expose_cmds("user_create")
 
-    device_invite = _expose_cmds_with_retrier("device_invite")
+    device_invite = _expose_cmds("device_invite")
     device_cancel_invitation = _expose_cmds_with_retrier("device_cancel_invitation")
-    device_create = _expose_cmds_with_retrier("device_create")
-    device_revoke = _expose_cmds_with_retrier("device_revoke")
+    device_create = _expose_cmds("device_create")
+    device_revoke = _expose_cmds("device_revoke")
 
 
 class BackendAnonymousCmds:
@@ -120,9 +136,17 @@ class BackendAdministratorCmds:
 
 @asynccontextmanager
 async def backend_cmds_factory(
-    addr: BackendOrganizationAddr, device_id: DeviceID, signing_key: SigningKey, max_pool: int = 4
+    addr: BackendOrganizationAddr,
+    device_id: DeviceID,
+    signing_key: SigningKey,
+    max_pool: int = 4,
+    keepalive: Optional[float] = None,
+    min_pool: int = 0,
+    idle_timeout: Optional[float] = None,
 ) -> BackendCmdsPool:
-    async with transport_pool_factory(addr, device_id, signing_key, max_pool) as transport_pool:
+    async with transport_pool_factory(
+        addr, device_id, signing_key, max_pool, keepalive, min_pool, idle_timeout
+    ) as transport_pool:
         yield BackendCmdsPool(addr, transport_pool)
 
 
@@ -1,4 +1,5 @@
 import os
+import attr
 import trio
 from async_generator import asynccontextmanager
 from structlog import get_logger
@@ -19,6 +20,7 @@ from parsec.api.protocole import (
     ClientHandshake,
 )
 from parsec.core.backend_connection.exceptions import (
+    BackendConnectionError,
     BackendNotAvailable,
     BackendHandshakeError,
     BackendDeviceRevokedError,
@@ -31,12 +33,50 @@ __all__ = (
     "administrator_transport_factory",
     "transport_pool_factory",
     "TransportPool",
+    "TransportPoolStats",
 )
 
 
 logger = get_logger()
 
 
+# Keepalive pings not answered within this time mean the connection is dead
+KEEPALIVE_TIMEOUT = 10
+# Transports idle for more than this number of seconds are checked before reuse
+LIVENESS_CHECK_AFTER = 5
+# Maximum time between two maintenances of a transport pool
+MAINTENANCE_PERIOD = 30
+
+
+@attr.s(slots=True)
+class SSLClientConfig:
+    context = attr.ib()
+    # Last TLS session negotiated with the server, reused to skip the full
+    # handshake on the next connection
+    session = attr.ib(default=None)
+
+
+# (hostname, port, keyfile, certfile) -> SSLClientConfig
+_ssl_configs = {}
+
+
+def _get_ssl_config(hostname: str, port: int) -> SSLClientConfig:
+    keyfile = os.environ.get("SSL_KEYFILE")
+    certfile = os.environ.get("SSL_CERTFILE")
+    key = (hostname, port, keyfile, certfile)
+    try:
+        return _ssl_configs[key]
+
+    except KeyError:
+        ssl_context = trio.ssl.create_default_context(trio.ssl.Purpose.CLIENT_AUTH)
+        if certfile:
+            ssl_context.load_cert_chain(certfile, keyfile)
+        else:
+            ssl_context.load_default_certs()
+        ssl_config = _ssl_configs[key] = SSLClientConfig(ssl_context)
+        return ssl_config
+
+
 async def _connect(
     addr: Union[BackendAddr, BackendOrganizationBootstrapAddr, BackendOrganizationAddr],
     device_id: Optional[DeviceID] = None,
@@ -50,8 +90,10 @@ async def _connect(
         logger.debug("Impossible to connect to backend", reason=exc)
         raise BackendNotAvailable(exc) from exc
 
+    ssl_config = None
     if addr.scheme == "wss":
-        stream = _upgrade_stream_to_ssl(stream, addr.hostname)
+        ssl_config = _get_ssl_config(addr.hostname, addr.port)
+        stream = _upgrade_stream_to_ssl(stream, addr.hostname, ssl_config)
 
     try:
         transport = await Transport.init_for_client(stream, addr.hostname)
@@ -82,22 +124,19 @@ async def _connect(
         await transport.aclose()
         raise
 
-    return transport
-
+    if ssl_config and stream.session:
+        # With TLS 1.3 the session ticket is only sent after the handshake,
+        # hence retrieving it once data has been exchanged
+        ssl_config.session = stream.session
 
-def _upgrade_stream_to_ssl(raw_stream, hostname):
-    # The ssl context should be generated once and stored into the config
-    # however this is tricky (should ssl configuration be stored per device ?)
-    keyfile = os.environ.get("SSL_KEYFILE")
-    certfile = os.environ.get("SSL_CERTFILE")
+    return transport
 
-    ssl_context = trio.ssl.create_default_context(trio.ssl.Purpose.CLIENT_AUTH)
-    if certfile:
-        ssl_context.load_cert_chain(certfile, keyfile)
-    else:
-        ssl_context.load_default_certs()
 
-    return trio.ssl.SSLStream(raw_stream, ssl_context, server_hostname=hostname)
+def _upgrade_stream_to_ssl(raw_stream, hostname, ssl_config):
+    stream = trio.ssl.SSLStream(raw_stream, ssl_config.context, server_hostname=hostname)
+    if ssl_config.session:
+        stream.session = ssl_config.session
+    return stream
 
 
 async def _do_handshade(transport: Transport, ch):
@@ -156,56 +195,229 @@ async def administrator_transport_factory(addr: BackendAddr, token: str) -> Tran
         await transport.aclose()
 
 
+@attr.s(slots=True)
+class TransportPoolStats:
+    connections = attr.ib(default=0)
+    connect_latency = attr.ib(default=0.0)
+    ssl_sessions_reused = attr.ib(default=0)
+    closed = attr.ib(default=0)
+    acquisitions = attr.ib(default=0)
+    wait_latency = attr.ib(default=0.0)
+    in_use = attr.ib(default=0)
+    stale = attr.ib(default=0)
+    retries = attr.ib(default=0)
+    evicted = attr.ib(default=0)
+    keepalive_pings = attr.ib(default=0)
+    keepalive_failures = attr.ib(default=0)
+
+    @property
+    def connect_avg_latency(self) -> float:
+        return self.connect_latency / self.connections if self.connections else 0.0
+
+    @property
+    def wait_avg_latency(self) -> float:
+        return self.wait_latency / self.acquisitions if self.acquisitions else 0.0
+
+
 class TransportPool:
-    def __init__(self, addr, device_id, signing_key, max):
+    """
+    Pool of at most `max` authenticated transports.
+
+    Transports idle for more than `LIVENESS_CHECK_AFTER` seconds are pinged
+    before being reused. Background maintenance (see `run_maintenance`) pings
+    idle transports every `keepalive` seconds, closes the ones idle for more
+    than `idle_timeout` seconds and keeps at least `min` of them connected.
+    """
+
+    def __init__(self, addr, device_id, signing_key, max, keepalive=None, min=0, idle_timeout=None):
+        if min > max:
+            raise ValueError("Pool min size cannot be greater than its max size")
         self.addr = addr
         self.device_id = device_id
         self.signing_key = signing_key
+        self.min = min
+        self.max = max
+        # None disables the keepalive pings and the idle eviction
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.stats = TransportPoolStats()
+        # Idle transports as (transport, last used), most recently used last
         self.transports = []
         self._closed = False
         self._lock = trio.Semaphore(max)
 
+    async def _connect(self):
+        start = trio.current_time()
+        transport = await _connect(self.addr, self.device_id, self.signing_key)
+        transport.logger = transport.logger.bind(device_id=self.device_id)
+        latency = trio.current_time() - start
+
+        self.stats.connections += 1
+        self.stats.connect_latency += latency
+        ssl_session_reused = getattr(transport.stream, "session_reused", False)
+        if ssl_session_reused:
+            self.stats.ssl_sessions_reused += 1
+        transport.logger.debug(
+            "Connected to backend", latency=latency, ssl_session_reused=ssl_session_reused
+        )
+        return transport
+
+    async def _close(self, transport):
+        self.stats.closed += 1
+        await transport.aclose()
+
+    async def _ping(self, transport):
+        with trio.move_on_after(KEEPALIVE_TIMEOUT):
+            try:
+                await transport.ping()
+                return True
+
+            except TransportError as exc:
+                transport.logger.debug("Ping failed", reason=exc)
+
+        await self._close(transport)
+        return False
+
+    async def _get_idle_transport(self):
+        while self.transports:
+            transport, last_used = self.transports.pop()
+            if last_used + LIVENESS_CHECK_AFTER > trio.current_time():
+                return transport
+            # Peer (or a proxy) may have closed the connection meanwhile
+            if await self._ping(transport):
+                return transport
+            self.stats.stale += 1
+        return None
+
     @asynccontextmanager
     async def acquire(self, force_fresh=False):
+        start = trio.current_time()
         async with self._lock:
+            self.stats.acquisitions += 1
+            self.stats.wait_latency += trio.current_time() - start
+
             transport = None
             if not force_fresh:
-                try:
-                    transport = self.transports.pop()
-                except IndexError:
-                    pass
+                transport = await self._get_idle_transport()
 
             if not transport:
                 if self._closed:
                     raise trio.ClosedResourceError()
 
-                transport = await _connect(self.addr, self.device_id, self.signing_key)
-                transport.logger = transport.logger.bind(device_id=self.device_id)
+                transport = await self._connect()
 
+            self.stats.in_use += 1
             try:
                 yield transport
 
             except TransportClosedByPeer:
+                self.stats.closed += 1
                 raise
 
             except Exception:
-                await transport.aclose()
+                await self._close(transport)
                 raise
 
             else:
-                self.transports.append(transport)
+                self.transports.append((transport, trio.current_time()))
+
+            finally:
+                self.stats.in_use -= 1
+
+    async def _evict_idle_transports(self, now):
+        while len(self.transports) > self.min:
+            transport, last_used = self.transports[0]
+            if last_used + self.idle_timeout > now:
+                return
+            del self.transports[0]
+            self.stats.evicted += 1
+            transport.logger.debug("Closing idle connection")
+            await self._close(transport)
+
+    async def _ping_idle_transports(self, now):
+        # Oldest transports are at the begining of the list
+        while self.transports:
+            _, last_used = self.transports[0]
+            if last_used + self.keepalive > now:
+                return
+
+            async with self._lock:
+                if not self.transports:
+                    return
+                transport, _ = self.transports.pop(0)
+                self.stats.keepalive_pings += 1
+                if await self._ping(transport):
+                    self.transports.append((transport, trio.current_time()))
+                else:
+                    self.stats.keepalive_failures += 1
+
+    async def _fill_min_transports(self):
+        while len(self.transports) + self.stats.in_use < self.min:
+            # Connecting (TLS and handshake) doesn't hold the lock so requests
+            # are not delayed by the background connections
+            try:
+                transport = await self._connect()
+            except BackendConnectionError:
+                # Will retry on next maintenance
+                return
+            async with self._lock:
+                # Requests may have opened their own connections meanwhile
+                if len(self.transports) + self.stats.in_use >= self.max:
+                    await self._close(transport)
+                    return
+                self.transports.append((transport, trio.current_time()))
+
+    async def run_maintenance(self):
+        """
+        Ping the transports idle for more than `keepalive` seconds so they
+        are not closed by the peer (or a proxy in between), sparing a new
+        handshake to the next request. Dead transports are dropped, and so
+        are the ones idle for more than `idle_timeout` seconds as long as
+        `min` transports remain.
+        """
+        while True:
+            now = trio.current_time()
+            if self.idle_timeout:
+                await self._evict_idle_transports(now)
+            if self.keepalive:
+                await self._ping_idle_transports(now)
+            await self._fill_min_transports()
+            await trio.sleep_until(self._next_maintenance(trio.current_time()))
+
+    def _next_maintenance(self, now):
+        # Transports returned to the pool meanwhile cannot be due before
+        # at least one of those periods
+        periods = [period for period in (self.keepalive, self.idle_timeout) if period]
+        deadlines = [now + min(periods, default=MAINTENANCE_PERIOD)]
+        if self.transports:
+            _, oldest_last_used = self.transports[0]
+            if self.keepalive:
+                deadlines.append(oldest_last_used + self.keepalive)
+            if self.idle_timeout and len(self.transports) > self.min:
+                deadlines.append(oldest_last_used + self.idle_timeout)
+        return min(deadlines)
 
 
 @asynccontextmanager
 async def transport_pool_factory(
-    addr: BackendOrganizationAddr, device_id: DeviceID, signing_key: SigningKey, max: int = 4
+    addr: BackendOrganizationAddr,
+    device_id: DeviceID,
+    signing_key: SigningKey,
+    max: int = 4,
+    keepalive: Optional[float] = None,
+    min: int = 0,
+    idle_timeout: Optional[float] = None,
 ) -> TransportPool:
-    pool = TransportPool(addr, device_id, signing_key, max)
+    pool = TransportPool(addr, device_id, signing_key, max, keepalive, min, idle_timeout)
     try:
-        yield pool
+        async with trio.open_nursery() as nursery:
+            if keepalive or idle_timeout or min:
+                nursery.start_soon(pool.run_maintenance)
+            yield pool
+            nursery.cancel_scope.cancel()
 
     finally:
         pool._closed = True
         async with trio.open_nursery() as nursery:
-            for transport in pool.transports:
+            for transport, _ in pool.transports:
                 nursery.start_soon(transport.aclose)
@@ -1,33 +1,36 @@
 import click
 
-from parsec.core.cli import list_devices
-from parsec.core.cli import invite_user
-from parsec.core.cli import claim_user
-from parsec.core.cli import invite_device
-from parsec.core.cli import claim_device
-from parsec.core.cli import create_organization
-from parsec.core.cli import create_workspace
-from parsec.core.cli import share_workspace
-from parsec.core.cli import bootstrap_organization
-from parsec.core.cli import run
+from parsec.cli_utils import LazyGroup
 
 
 __all__ = ("core_cmd",)
 
 
-@click.group()
+# Subcommands modules are only imported when invoked
+@click.group(
+    cls=LazyGroup,
+    lazy_commands={
+        "gui": ("parsec.core.cli.run:run_gui", "run parsec GUI"),
+        "run": ("parsec.core.cli.run:run_mountpoint", "run parsec mountpoint"),
+        "create_workspace": (
+            "parsec.core.cli.create_workspace:create_workspace",
+            "create workspace",
+        ),
+        "share_workspace": ("parsec.core.cli.share_workspace:share_workspace", "share workspace"),
+        "list_devices": ("parsec.core.cli.list_devices:list_devices", ""),
+        "invite_user": ("parsec.core.cli.invite_user:invite_user", ""),
+        "claim_user": ("parsec.core.cli.claim_user:claim_user", ""),
+        "invite_device": ("parsec.core.cli.invite_device:invite_device", ""),
+        "claim_device": ("parsec.core.cli.claim_device:claim_device", ""),
+        "create_organization": (
+            "parsec.core.cli.create_organization:create_organization",
+            "create new organization",
+        ),
+        "bootstrap_organization": (
+            "parsec.core.cli.bootstrap_organization:bootstrap_organization",
+            "configure new organization",
+        ),
+    },
+)
 def core_cmd():
     pass
-
-
-core_cmd.add_command(run.run_gui, "gui")
-core_cmd.add_command(run.run_mountpoint, "run")
-core_cmd.add_command(create_workspace.create_workspace, "create_workspace")
-core_cmd.add_command(share_workspace.share_workspace, "share_workspace")
-core_cmd.add_command(list_devices.list_devices, "list_devices")
-core_cmd.add_command(invite_user.invite_user, "invite_user")
-core_cmd.add_command(claim_user.claim_user, "claim_user")
-core_cmd.add_command(invite_device.invite_device, "invite_device")
-core_cmd.add_command(claim_device.claim_device, "claim_device")
-core_cmd.add_command(create_organization.create_organization, "create_organization")
-core_cmd.add_command(bootstrap_organization.bootstrap_organization, "bootstrap_organization")
@@ -6,6 +6,7 @@ from pathlib import Path
 
 from parsec.types import DeviceID, OrganizationID
 from parsec.logging import configure_logging, configure_sentry_logging
+from parsec.tracing import configure_tracing, JSONLSink
 from parsec.core.config import get_default_config_dir, load_config
 from parsec.core.devices_manager import (
     get_cipher_info,
@@ -38,6 +39,19 @@ def core_config_options(fn):
     @click.option("--log-format", "-f", default="CONSOLE", type=click.Choice(("CONSOLE", "JSON")))
     @click.option("--log-file", "-o")
     @click.option("--log-filter", default=None)
+    @click.option(
+        "--log-payloads",
+        default=0.0,
+        type=click.FloatRange(0, 1),
+        help="Ratio of the messages whose payload is logged with DEBUG log level (default: 0)",
+    )
+    @click.option("--trace-file", default=None, help="Record tracing spans into this JSONL file")
+    @click.option(
+        "--trace-sample-rate",
+        default=1.0,
+        type=click.FloatRange(0, 1),
+        help="Ratio of the operations traced (default: 1)",
+    )
     @wraps(fn)
     def wrapper(config_dir, *args, **kwargs):
         assert "config" not in kwargs
@@ -54,8 +68,14 @@ def core_config_options(fn):
             kwargs["ssl_context"] = ssl_context
 
         configure_logging(
-            kwargs["log_level"], kwargs["log_format"], kwargs["log_file"], kwargs["log_filter"]
+            kwargs["log_level"],
+            kwargs["log_format"],
+            kwargs["log_file"],
+            kwargs["log_filter"],
+            kwargs["log_payloads"],
         )
+        if kwargs["trace_file"]:
+            configure_tracing(JSONLSink(kwargs["trace_file"]), kwargs["trace_sample_rate"])
 
         config_dir = Path(config_dir) if config_dir else get_default_config_dir(os.environ)
         config = load_config(config_dir, debug="DEBUG" in os.environ)
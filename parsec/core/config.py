@@ -9,6 +9,20 @@ from structlog import get_logger
 logger = get_logger()
 
 
+# Number of blocks read and uploaded in parallel during a file sync
+DEFAULT_SYNC_CONCURRENCY = 4
+# Maximum amount of block data held in memory during a file sync
+DEFAULT_SYNC_MEMORY_BUDGET = 2 ** 24  # 16Mio
+# Idle backend connections are pinged after this number of seconds to keep
+# them open (proxies commonly close connections idle for 60s)
+DEFAULT_BACKEND_KEEPALIVE = 29
+# Idle backend connections are closed after this number of seconds
+DEFAULT_BACKEND_IDLE_TIMEOUT = 300
+# Modified manifests are written to disk in batches, at most this number of
+# seconds after the modification (0 to write them right away)
+DEFAULT_MANIFEST_WRITE_BACK_DELAY = 0.2
+
+
 def get_default_data_base_dir(environ: dict):
     if os.name == "nt":
         return Path(environ["APPDATA"]) / "parsec/data"
@@ -52,12 +66,20 @@ class CoreConfig:
 
     debug: bool = False
     backend_watchdog: int = 0
+    backend_min_connections: int = 1
     backend_max_connections: int = 4
+    backend_keepalive: Optional[int] = DEFAULT_BACKEND_KEEPALIVE
+    backend_idle_timeout: Optional[int] = DEFAULT_BACKEND_IDLE_TIMEOUT
 
     invitation_token_size: int = 8
 
     mountpoint_enabled: bool = False
 
+    content_defined_chunking: bool = False
+    sync_concurrency: int = DEFAULT_SYNC_CONCURRENCY
+    sync_memory_budget: int = DEFAULT_SYNC_MEMORY_BUDGET
+    manifest_write_back_delay: float = DEFAULT_MANIFEST_WRITE_BACK_DELAY
+
     sentry_url: Optional[str] = None
 
     ssl_keyfile: Optional[str] = None
@@ -74,12 +96,30 @@ def config_factory(
     mountpoint_base_dir: Path = None,
     mountpoint_enabled: bool = False,
     backend_watchdog: int = 0,
+    backend_min_connections: int = 1,
     backend_max_connections: int = 4,
+    backend_keepalive: Optional[int] = DEFAULT_BACKEND_KEEPALIVE,
+    backend_idle_timeout: Optional[int] = DEFAULT_BACKEND_IDLE_TIMEOUT,
+    content_defined_chunking: bool = False,
+    sync_concurrency: int = DEFAULT_SYNC_CONCURRENCY,
+    sync_memory_budget: int = DEFAULT_SYNC_MEMORY_BUDGET,
+    manifest_write_back_delay: float = DEFAULT_MANIFEST_WRITE_BACK_DELAY,
     debug: bool = False,
     ssl_keyfile: str = None,
     ssl_certfile: str = None,
     environ: dict = {},
 ) -> CoreConfig:
+    if backend_max_connections < 1:
+        raise ValueError("backend_max_connections must be at least 1")
+    if backend_min_connections > backend_max_connections:
+        raise ValueError("backend_min_connections cannot be greater than backend_max_connections")
+    if sync_concurrency < 1:
+        raise ValueError("sync_concurrency must be at least 1")
+    if sync_memory_budget <= 0:
+        raise ValueError("sync_memory_budget must be strictly positive")
+    if manifest_write_back_delay < 0:
+        raise ValueError("manifest_write_back_delay cannot be negative")
+
     return CoreConfig(
         config_dir=config_dir or get_default_config_dir(environ),
         data_base_dir=data_base_dir or get_default_data_base_dir(environ),
@@ -87,6 +127,14 @@ def config_factory(
         mountpoint_base_dir=mountpoint_base_dir or get_default_mountpoint_base_dir(environ),
         debug=debug,
         backend_watchdog=backend_watchdog,
+        backend_min_connections=backend_min_connections,
+        backend_max_connections=backend_max_connections,
+        backend_keepalive=backend_keepalive,
+        backend_idle_timeout=backend_idle_timeout,
+        content_defined_chunking=content_defined_chunking,
+        sync_concurrency=sync_concurrency,
+        sync_memory_budget=sync_memory_budget,
+        manifest_write_back_delay=manifest_write_back_delay,
         ssl_keyfile=ssl_keyfile,
         ssl_certfile=ssl_certfile,
         sentry_url=environ.get("SENTRY_URL") or None,
@@ -139,6 +187,10 @@ def save_config(config: CoreConfig):
                 "cache_base_dir": str(config.cache_base_dir),
                 "mountpoint_base_dir": str(config.mountpoint_base_dir),
                 "backend_watchdog": config.backend_watchdog,
+                "content_defined_chunking": config.content_defined_chunking,
+                "sync_concurrency": config.sync_concurrency,
+                "sync_memory_budget": config.sync_memory_budget,
+                "manifest_write_back_delay": config.manifest_write_back_delay,
                 "sentry_url": config.sentry_url,
             }
         )
@@ -1,5 +1,7 @@
 import pickle
 import hashlib
+from time import perf_counter
+from collections import OrderedDict
 from typing import Tuple
 
 from parsec.types import DeviceID, UserID
@@ -12,11 +14,16 @@ from parsec.crypto import (
     decrypt_with_secret_key,
 )
 from parsec.core.base import BaseAsyncComponent
+from parsec.core.metrics import CoreMetrics
 from parsec.core.local_db import LocalDBMissingEntry
 from parsec.core.types import RemoteDevice, RemoteUser, ManifestAccess
 from parsec.core.backend_connection import BackendCmdsBadResponse
 
 
+# Number of vlob versions whose verified content is kept in memory
+DEFAULT_VERIFIED_CACHE_SIZE = 1024
+
+
 class EncryptionManagerError(Exception):
     pass
 
@@ -46,12 +53,23 @@ class MessageSignatureError(EncryptionManagerError):
 
 
 class EncryptionManager(BaseAsyncComponent):
-    def __init__(self, device, local_db, backend_cmds):
+    def __init__(
+        self,
+        device,
+        local_db,
+        backend_cmds,
+        metrics: CoreMetrics = None,
+        verified_cache_size=DEFAULT_VERIFIED_CACHE_SIZE,
+    ):
         super().__init__()
         self.device = device
         self.backend_cmds = backend_cmds
         self.local_db = local_db
         self._mem_cache = {}
+        # (vlob id, version, ciphered digest) -> verified content
+        self._verified_cache = OrderedDict()
+        self.verified_cache_size = verified_cache_size
+        self.metrics = metrics
 
     async def _init(self, nursery):
         pass
@@ -72,24 +90,26 @@ class EncryptionManager(BaseAsyncComponent):
 
         # TODO: use schema here
         raw = pickle.dumps(user)
-        self.local_db.set(self._build_remote_user_local_access(user_id), raw)
+        await self.local_db.set_async(self._build_remote_user_local_access(user_id), raw)
 
     def _build_remote_user_local_access(self, user_id: UserID) -> ManifestAccess:
         return ManifestAccess(
             id=hashlib.sha256(user_id.encode("utf8")).hexdigest(), key=self.device.local_symkey
         )
 
-    def _fetch_remote_user_from_local(self, user_id: UserID):
+    async def _fetch_remote_user_from_local(self, user_id: UserID):
         try:
-            raw_user_data = self.local_db.get(self._build_remote_user_local_access(user_id))
+            raw_user_data = await self.local_db.get_async(
+                self._build_remote_user_local_access(user_id)
+            )
             return pickle.loads(raw_user_data)
 
         except LocalDBMissingEntry:
             return None
 
-    def _fetch_remote_device_from_local(self, device_id: DeviceID):
+    async def _fetch_remote_device_from_local(self, device_id: DeviceID):
         try:
-            raw_user_data = self.local_db.get(
+            raw_user_data = await self.local_db.get_async(
                 self._build_remote_user_local_access(device_id.user_id)
             )
             user_data = pickle.loads(raw_user_data)
@@ -123,11 +143,11 @@ class EncryptionManager(BaseAsyncComponent):
             return self.device
         else:
             # First try to retrieve from the local cache
-            remote_device = self._fetch_remote_device_from_local(device_id)
+            remote_device = await self._fetch_remote_device_from_local(device_id)
             if not remote_device:
                 # Cache miss ! Fetch data from the backend and retry
                 await self._populate_remote_user_cache(device_id.user_id)
-                remote_device = self._fetch_remote_device_from_local(device_id)
+                remote_device = await self._fetch_remote_device_from_local(device_id)
                 if not remote_device:
                     # Still nothing found, the device doesn't exist
                     return None
@@ -156,11 +176,11 @@ class EncryptionManager(BaseAsyncComponent):
         if user_id == self.device.user_id:
             return self.device
         else:
-            remote_user = self._fetch_remote_user_from_local(user_id)
+            remote_user = await self._fetch_remote_user_from_local(user_id)
             if not remote_user:
                 # Cache miss ! Fetch data from the backend and retry
                 await self._populate_remote_user_cache(user_id)
-                remote_user = self._fetch_remote_user_from_local(user_id)
+                remote_user = await self._fetch_remote_user_from_local(user_id)
                 if not remote_user:
                     # Still nothing found, the device doesn't exist
                     return None
@@ -208,3 +228,48 @@ class EncryptionManager(BaseAsyncComponent):
                 "but this device cannot be found on the backend."
             )
         return verify_signature_from(author_device.verify_key, signed)
+
+    async def decrypt_vlob_with_secret_key(
+        self, key: bytes, id, version: int, ciphered: bytes
+    ) -> bytes:
+        """
+        Same as `decrypt_with_secret_key`, but a given version of a vlob is
+        only verified once: its content is then kept in a bounded cache.
+
+        The cache key contains a digest of the ciphered data keyed with the
+        secret key, so a hit means the exact same blob is decrypted with the
+        same key as what has already been verified.
+        """
+        digest = hashlib.blake2b(ciphered, key=key, digest_size=32).digest()
+        cache_key = (id, version, digest)
+        try:
+            raw = self._verified_cache[cache_key]
+        except KeyError:
+            pass
+        else:
+            self._verified_cache.move_to_end(cache_key)
+            if self.metrics is not None:
+                self.metrics.verified_cache.inc(result="hit")
+            return raw
+
+        if self.metrics is not None:
+            self.metrics.verified_cache.inc(result="miss")
+        start = perf_counter()
+        device_id, signed = decrypt_with_secret_key(key, ciphered)
+        # Time spent fetching the author device is not accounted for
+        duration = perf_counter() - start
+        author_device = await self.fetch_remote_device(device_id)
+        if not author_device:
+            raise MessageSignatureError(
+                f"Message is said to be signed by `{device_id}`, "
+                "but this device cannot be found on the backend."
+            )
+        start = perf_counter()
+        raw = verify_signature_from(author_device.verify_key, signed)
+        if self.metrics is not None:
+            self.metrics.verify_duration.observe(duration + perf_counter() - start)
+
+        self._verified_cache[cache_key] = raw
+        if len(self._verified_cache) > self.verified_cache_size:
+            self._verified_cache.popitem(last=False)
+        return raw
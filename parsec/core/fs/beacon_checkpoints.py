@@ -0,0 +1,25 @@
+from uuid import UUID
+from hashlib import sha256
+
+from parsec.serde import UnknownCheckedSchema, fields, validate
+from parsec.crypto import SymetricKey
+from parsec.core.types import ManifestAccess
+from parsec.core.types.base import AccessID, serializer_factory
+
+
+class BeaconCheckpointsSchema(UnknownCheckedSchema):
+    # beacon id -> beacon index the local entries were known to be up to date with
+    checkpoints = fields.Map(
+        fields.UUID(), fields.Integer(validate=validate.Range(min=0)), required=True
+    )
+
+
+beacon_checkpoints_serializer = serializer_factory(BeaconCheckpointsSchema)
+
+
+def build_beacon_checkpoints_access(
+    user_manifest_id: AccessID, local_symkey: SymetricKey
+) -> ManifestAccess:
+    # Checkpoints are only a local thing, so their id is derived from the user manifest's one
+    checkpoints_id = sha256(b"beacon-checkpoints" + user_manifest_id.bytes).digest()[:16]
+    return ManifestAccess(id=UUID(bytes=checkpoints_id), key=local_symkey)
@@ -0,0 +1,86 @@
+from hashlib import sha256
+from typing import Iterator
+
+
+# Content-defined chunking bounds. Average size is kept equal to the
+# fixed block size so both modes produce roughly the same number of blocks.
+CDC_MIN_SIZE = 2 ** 14  # 16Kio
+CDC_AVG_SIZE = 2 ** 16  # 64Kio
+CDC_MAX_SIZE = 2 ** 18  # 256Kio
+
+
+_MASK_64 = 2 ** 64 - 1
+
+
+def _generate_gear_table():
+    # Gear table must be stable across devices and versions, otherwise the
+    # same content would be cut differently and deduplication would be lost.
+    return tuple(int.from_bytes(sha256(bytes([i])).digest()[:8], "big") for i in range(256))
+
+
+GEAR = _generate_gear_table()
+
+
+def _high_bits_mask(bits: int) -> int:
+    # Gear hash's high bits depend on the last 64 bytes while low bits only
+    # depend on the last few bytes, so we test the high ones.
+    return ((1 << bits) - 1) << (64 - bits)
+
+
+def _normalized_masks(avg_size: int):
+    bits = avg_size.bit_length() - 1
+    # FastCDC's normalized chunking: harder to cut before the average size,
+    # easier after it. This tightens the chunk size distribution.
+    return _high_bits_mask(bits + 2), _high_bits_mask(bits - 2)
+
+
+def find_cut_point(
+    data: bytes,
+    min_size: int = CDC_MIN_SIZE,
+    avg_size: int = CDC_AVG_SIZE,
+    max_size: int = CDC_MAX_SIZE,
+) -> int:
+    """
+    Return the size of the first chunk in `data` (FastCDC-style gear hash).
+
+    Note the returned size is only final if `data` contains at least
+    `max_size` bytes or is the end of the stream.
+    """
+    size = len(data)
+    if size <= min_size:
+        return size
+    if size > max_size:
+        size = max_size
+    normal_size = avg_size if avg_size < size else size
+    mask_s, mask_l = _normalized_masks(avg_size)
+
+    gear = GEAR
+    fingerprint = 0
+    i = min_size
+    while i < normal_size:
+        fingerprint = ((fingerprint << 1) + gear[data[i]]) & _MASK_64
+        if not fingerprint & mask_s:
+            return i + 1
+        i += 1
+    while i < size:
+        fingerprint = ((fingerprint << 1) + gear[data[i]]) & _MASK_64
+        if not fingerprint & mask_l:
+            return i + 1
+        i += 1
+    return size
+
+
+def iter_chunks(
+    data: bytes,
+    min_size: int = CDC_MIN_SIZE,
+    avg_size: int = CDC_AVG_SIZE,
+    max_size: int = CDC_MAX_SIZE,
+) -> Iterator[memoryview]:
+    """
+    Split `data` into content-defined chunks.
+    """
+    view = memoryview(data)
+    while view:
+        cut = find_cut_point(view, min_size, avg_size, max_size)
+        yield view[:cut]
+        view = view[cut:]
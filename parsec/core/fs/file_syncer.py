@@ -1,8 +1,14 @@
+import attr
 import trio
 import pendulum
-from typing import List
+from time import perf_counter
+from hashlib import sha256
+from typing import List, Tuple, Optional
 from structlog import get_logger
 
+from parsec.crypto import encrypt_raw_with_secret_key, encrypt_raw_with_secret_key_batch
+from parsec.serde import SerdeError
+from parsec.tracing import traced
 from parsec.core.types import (
     FsPath,
     LocalFileManifest,
@@ -11,16 +17,34 @@ from parsec.core.types import (
     ManifestAccess,
     BlockAccess,
 )
+from parsec.core.local_db import LocalDBMissingEntry
 from parsec.core.fs.merge_folders import find_conflicting_name_for_child_entry
-from parsec.core.fs.buffer_ordering import merge_buffers_with_limits_and_alignment
+from parsec.core.fs.buffer_ordering import (
+    ContiguousSpace,
+    UncontiguousSpace,
+    merge_buffers_with_limits,
+    merge_buffers_with_limits_and_alignment,
+)
+from parsec.core.fs.chunking import find_cut_point, CDC_MAX_SIZE
 from parsec.core.fs.local_file_fs import Buffer, DirtyBlockBuffer, BlockBuffer, NullFillerBuffer
-from parsec.core.fs.sync_base import SyncConcurrencyError, BaseSyncer
+from parsec.core.fs.sync_base import SyncConcurrencyError, BaseSyncer, BLOCKS_INDEX_MAX_SIZE
+from parsec.core.fs.sync_journal import (
+    SYNC_JOURNAL_FLUSH_BLOCKS,
+    SyncJournal,
+    sync_journal_serializer,
+    sync_journal_segment_serializer,
+    build_sync_journal_access,
+)
 from parsec.core.fs.utils import is_file_manifest, is_placeholder_manifest
 
 
 logger = get_logger()
 
 
+# Maximum number of blocks encrypted together by the sync pipeline
+ENCRYPT_BATCH_SIZE = 16
+
+
 def fast_forward_file(
     local_base: LocalFileManifest, local_current: LocalFileManifest, remote_target: FileManifest
 ) -> LocalFileManifest:
@@ -35,6 +59,7 @@ def fast_forward_file(
     merged_need_sync = bool(merged_dirty_blocks or local_current.size != remote_target.size)
     return local_current.evolve(
         blocks=remote_target.blocks,
+        block_size=remote_target.block_size,
         dirty_blocks=merged_dirty_blocks,
         base_version=remote_target.version,
         is_placeholder=False,
@@ -53,36 +78,94 @@ def get_sync_map(manifest, block_size: int) -> List[Buffer]:
     )
 
 
-class FileSyncerMixin(BaseSyncer):
-    async def _build_data_from_contiguous_space(self, cs):
-        data = bytearray(cs.size)
-        buffers = cs.buffers.copy()
-
-        async def _process_buffer():
-            while buffers:
-                bs = buffers.pop()
-                if isinstance(bs.buffer, BlockBuffer):
-                    buff = await self._backend_block_read(bs.buffer.access)
-                elif isinstance(bs.buffer, DirtyBlockBuffer):
-                    buff = self.local_file_fs.get_block(bs.buffer.access)
-                else:
-                    assert isinstance(bs.buffer, NullFillerBuffer)
-                    buff = bs.buffer.data
-                assert buff
-                data[bs.start - cs.start : bs.end - cs.start] = buff[
-                    bs.buffer_slice_start : bs.buffer_slice_end
-                ]
+def get_cdc_sync_map(
+    manifest
+) -> Tuple[List[BlockAccess], List[Tuple[int, int]], UncontiguousSpace]:
+    """
+    Split the file between the blocks that can be kept verbatim and the
+    ranges that must be re-chunked.
 
-        if len(buffers) < 2:
-            await _process_buffer()
+    Returns: a tuple of (<clean blocks>, <dirty ranges>, <merged buffers>)
+    """
+    dirty_blocks: List[Buffer] = [
+        DirtyBlockBuffer(x.offset, x.offset + x.size, x) for x in manifest.dirty_blocks
+    ]
+    blocks: List[Buffer] = [BlockBuffer(x.offset, x.offset + x.size, x) for x in manifest.blocks]
+    merged = merge_buffers_with_limits(blocks + dirty_blocks, 0, manifest.size)
+
+    # A block is clean if it is still fully visible in the file, given chunk
+    # boundaries only depend on content they will be found again if re-chunked
+    clean_blocks = []
+    for cs in merged.spaces:
+        for bs in cs.buffers:
+            if isinstance(bs.buffer, BlockBuffer) and not bs.slice_needed():
+                clean_blocks.append(bs.buffer.access)
+
+    dirty_ranges = []
+    curr_pos = 0
+    for block in clean_blocks:
+        if curr_pos < block.offset:
+            dirty_ranges.append((curr_pos, block.offset))
+        curr_pos = block.offset + block.size
+    if curr_pos < manifest.size:
+        dirty_ranges.append((curr_pos, manifest.size))
+
+    return clean_blocks, dirty_ranges, merged
 
+
+class FileSyncerMixin(BaseSyncer):
+    async def _get_buffer_data(self, buffer):
+        if isinstance(buffer, BlockBuffer):
+            return await self._backend_block_read(buffer.access)
+        elif isinstance(buffer, DirtyBlockBuffer):
+            return await self.local_file_fs.local_db.get_async(buffer.access)
         else:
-            async with trio.open_nursery() as nursery:
-                nursery.start_soon(_process_buffer)
-                nursery.start_soon(_process_buffer)
-                nursery.start_soon(_process_buffer)
-                nursery.start_soon(_process_buffer)
+            assert isinstance(buffer, NullFillerBuffer)
+            return buffer.data
 
+    async def _build_data_from_range(
+        self, merged: UncontiguousSpace, start: int, end: int, fetched: dict
+    ):
+        """
+        `fetched` keeps the buffers' data between calls: ranges are read in
+        increasing order, so a block overlapping several ranges is only
+        retrieved once and dropped as soon as the ranges are past it.
+        """
+        for key, (buffer_end, _) in list(fetched.items()):
+            if buffer_end <= start:
+                del fetched[key]
+
+        # Holes between contiguous spaces are zero-filled
+        data = bytearray(end - start)
+        for cs in merged.spaces:
+            if cs.end <= start or cs.start >= end:
+                continue
+            for bs in cs.buffers:
+                bs_start = max(bs.start, start)
+                bs_end = min(bs.end, end)
+                if bs_start >= bs_end:
+                    continue
+                try:
+                    _, buff = fetched[id(bs.buffer)]
+                except KeyError:
+                    buff = await self._get_buffer_data(bs.buffer)
+                    fetched[id(bs.buffer)] = (bs.buffer.end, buff)
+                data[bs_start - start : bs_end - start] = buff[
+                    bs_start - bs.buffer.start : bs_end - bs.buffer.start
+                ]
+        return data
+
+    async def _build_data_from_contiguous_space(self, cs):
+        # Buffers are fetched one after another: spaces are already read
+        # concurrently by the sync pipeline, which accounts for the memory
+        # used by the fetched blocks
+        data = bytearray(cs.size)
+        for bs in cs.buffers:
+            buff = await self._get_buffer_data(bs.buffer)
+            assert buff
+            data[bs.start - cs.start : bs.end - cs.start] = buff[
+                bs.buffer_slice_start : bs.buffer_slice_end
+            ]
         return data
 
     def _sync_file_look_resolve_concurrency(
@@ -145,6 +228,322 @@ class FileSyncerMixin(BaseSyncer):
             self.local_folder_fs.set_manifest(access, target_local_manifest)
         return True
 
+    def _get_sync_journal_header(self, access: Access) -> Optional[SyncJournal]:
+        journal_access = build_sync_journal_access(access.id, self.device.local_symkey)
+        try:
+            raw = self.local_file_fs.local_db.get(journal_access)
+            return sync_journal_serializer.loads(raw)
+        except (LocalDBMissingEntry, SerdeError):
+            return None
+
+    def _load_sync_journal(self, access: Access, manifest: LocalFileManifest) -> SyncJournal:
+        journal = self._get_sync_journal_header(access)
+        if not journal:
+            return SyncJournal(base_version=manifest.base_version)
+
+        if journal.base_version != manifest.base_version:
+            # The previous sync has been abandoned (remote changes have been
+            # merged in the meantime), so the journaled blocks are orphaned
+            logger.info(
+                "Discarding outdated sync journal",
+                access_id=access.id,
+                orphaned_segments=journal.segments,
+            )
+            self._clear_sync_journal(access)
+            return SyncJournal(base_version=manifest.base_version)
+
+        for segment in range(journal.segments):
+            segment_access = build_sync_journal_access(access.id, self.device.local_symkey, segment)
+            try:
+                raw = self.local_file_fs.local_db.get(segment_access)
+                data = sync_journal_segment_serializer.loads(raw)
+            except (LocalDBMissingEntry, SerdeError):
+                # Segment dropped by the local garbage collector, its blocks
+                # will just be uploaded again
+                continue
+            for block in data["blocks"]:
+                journal.add_block(block, pending=False)
+
+        return journal
+
+    def _save_sync_journal(self, access: Access, journal: SyncJournal) -> None:
+        if not journal.pending:
+            return
+        # Only the blocks added since the last save are written (as a new
+        # segment), then the header is updated to reference this segment.
+        # Journal is stored as cache data: if the sync is never retried (e.g.
+        # file removed) the local garbage collector will get rid of it
+        segment_access = build_sync_journal_access(
+            access.id, self.device.local_symkey, journal.segments
+        )
+        self.local_file_fs.local_db.set(
+            segment_access,
+            sync_journal_segment_serializer.dumps({"blocks": journal.pending}),
+            deletable=True,
+        )
+        journal.segments += 1
+        journal.pending.clear()
+        journal_access = build_sync_journal_access(access.id, self.device.local_symkey)
+        self.local_file_fs.local_db.set(
+            journal_access, sync_journal_serializer.dumps(journal), deletable=True
+        )
+
+    def _clear_sync_journal(self, access: Access) -> None:
+        journal = self._get_sync_journal_header(access)
+        if not journal:
+            return
+        to_clear = [
+            build_sync_journal_access(access.id, self.device.local_symkey, segment)
+            for segment in range(journal.segments)
+        ]
+        to_clear.append(build_sync_journal_access(access.id, self.device.local_symkey))
+        for journal_access in to_clear:
+            try:
+                self.local_file_fs.local_db.clear(journal_access)
+            except LocalDBMissingEntry:
+                pass
+
+    def _get_convergence_access(self, path: FsPath) -> Access:
+        # Blocks are deduplicated within the workspace, hence the workspace's
+        # key is used as convergence secret
+        _, workspace_name, *_ = path.parts
+        return self.local_folder_fs.get_access(FsPath(f"/{workspace_name}"))
+
+    def _index_block(self, workspace_id, block_access: BlockAccess) -> None:
+        self._blocks_index[(workspace_id, block_access.digest)] = block_access
+        self._blocks_index.move_to_end((workspace_id, block_access.digest))
+        while len(self._blocks_index) > BLOCKS_INDEX_MAX_SIZE:
+            self._blocks_index.popitem(last=False)
+
+    async def _upload_cdc_blocks(
+        self,
+        path: FsPath,
+        access: Access,
+        manifest: LocalFileManifest,
+        journal: SyncJournal,
+        block_size: int,
+    ) -> List[BlockAccess]:
+        convergence_access = self._get_convergence_access(path)
+        # Blocks from an interrupted sync are already in the backend
+        for block in (*manifest.blocks, *journal.blocks):
+            self._index_block(convergence_access.id, block)
+
+        blocks, dirty_ranges, merged = get_cdc_sync_map(manifest)
+        # Also limits the number of chunks kept in memory waiting for upload
+        upload_slots = trio.Semaphore(
+            min(self.sync_concurrency, self._get_memory_slots(CDC_MAX_SIZE))
+        )
+        timings = {"read": 0.0, "chunk": 0.0, "encrypt": 0.0, "upload": 0.0}
+        uploaded_blocks = uploaded_size = 0
+
+        async def _upload_block(block_access, ciphered):
+            nonlocal uploaded_blocks, uploaded_size
+            try:
+                start = perf_counter()
+                await self._backend_block_upload(block_access, ciphered)
+                timings["upload"] += perf_counter() - start
+            finally:
+                upload_slots.release()
+            uploaded_blocks += 1
+            uploaded_size += block_access.size
+            self._index_block(convergence_access.id, block_access)
+            journal.add_block(block_access)
+            if len(journal.pending) >= SYNC_JOURNAL_FLUSH_BLOCKS:
+                self._save_sync_journal(access, journal)
+
+        try:
+            async with trio.open_nursery() as nursery:
+                for range_start, range_end in dirty_ranges:
+                    # Stream the range through the chunker, only keeping in memory
+                    # the data needed to find the next cut point
+                    pending = bytearray()
+                    fetched = {}
+                    chunk_offset = read_offset = range_start
+                    while chunk_offset < range_end:
+                        start = perf_counter()
+                        while len(pending) < CDC_MAX_SIZE and read_offset < range_end:
+                            window_end = min(read_offset + block_size, range_end)
+                            pending += await self._build_data_from_range(
+                                merged, read_offset, window_end, fetched
+                            )
+                            read_offset = window_end
+                        timings["read"] += perf_counter() - start
+
+                        # Gear hash is a pure python loop, don't block the trio loop
+                        start = perf_counter()
+                        cut = await trio.run_sync_in_worker_thread(find_cut_point, pending)
+                        chunk = bytes(pending[:cut])
+                        del pending[:cut]
+                        timings["chunk"] += perf_counter() - start
+
+                        digest = sha256(chunk).hexdigest()
+                        known = self._blocks_index.get((convergence_access.id, digest))
+                        if known:
+                            # Same data already in the backend, no need to upload it
+                            blocks.append(attr.evolve(known, offset=chunk_offset))
+                        else:
+                            await upload_slots.acquire()
+                            start = perf_counter()
+                            block_access = BlockAccess.from_convergent_block(
+                                chunk, chunk_offset, convergence_access.key
+                            )
+                            ciphered = await trio.run_sync_in_worker_thread(
+                                encrypt_raw_with_secret_key, block_access.key, chunk
+                            )
+                            timings["encrypt"] += perf_counter() - start
+                            nursery.start_soon(_upload_block, block_access, ciphered)
+                            blocks.append(block_access)
+                        chunk_offset += cut
+
+        finally:
+            self._save_sync_journal(access, journal)
+
+        self.event_bus.send(
+            "fs.entry.blocks_uploaded",
+            path=str(path),
+            id=access.id,
+            blocks=uploaded_blocks,
+            size=uploaded_size,
+            timings=timings,
+        )
+        return sorted(blocks, key=lambda x: x.offset)
+
+    async def _upload_spaces(
+        self,
+        path: FsPath,
+        access: Access,
+        spaces: List[ContiguousSpace],
+        journal: SyncJournal,
+        block_size: int,
+    ) -> List[BlockAccess]:
+        """
+        Upload the file's contiguous spaces as blocks through a
+        read -> encrypt -> upload pipeline.
+
+        Stages are connected by memory channels and the amount of block data
+        held in memory is bounded by the syncer's memory budget. Uploaded
+        blocks are recorded in the sync journal so they can be reused if
+        the sync is interrupted.
+        """
+        blocks = []
+        to_read = []
+        for cs in spaces:
+            if len(cs.buffers) == 1 and isinstance(cs.buffers[0].buffer, BlockBuffer):
+                if not cs.buffers[0].slice_needed():
+                    # Already existing block taken verbatim
+                    blocks.append(cs.buffers[0].buffer.access)
+                    continue
+            to_read.append(cs)
+        if not to_read:
+            return sorted(blocks, key=lambda x: x.offset)
+
+        timings = {"read": 0.0, "encrypt": 0.0, "upload": 0.0}
+        uploaded_blocks = uploaded_size = 0
+        max_slots = self._get_memory_slots(block_size)
+        memory_slots = trio.Semaphore(max_slots)
+        # Readers take all their slots at once, otherwise two readers each
+        # holding part of the slots they need could wait on each other forever
+        acquire_lock = trio.Lock()
+        read_send, read_recv = trio.open_memory_channel(len(to_read))
+        encrypt_send, encrypt_recv = trio.open_memory_channel(0)
+        upload_send, upload_recv = trio.open_memory_channel(0)
+        for cs in to_read:
+            read_send.send_nowait(cs)
+        await read_send.aclose()
+
+        async def _read_stage(read_recv, encrypt_send):
+            async with read_recv, encrypt_send:
+                async for cs in read_recv:
+                    # Remote blocks are downloaded in full before being sliced
+                    # into the block to upload, so they count as well
+                    remote_size = sum(
+                        bs.buffer.end - bs.buffer.start
+                        for bs in cs.buffers
+                        if isinstance(bs.buffer, BlockBuffer)
+                    )
+                    read_slots = min(max_slots, 1 + -(-remote_size // block_size))
+                    async with acquire_lock:
+                        for _ in range(read_slots):
+                            await memory_slots.acquire()
+                    start = perf_counter()
+                    data = await self._build_data_from_contiguous_space(cs)
+                    timings["read"] += perf_counter() - start
+                    # Only the block to upload is kept from now on
+                    for _ in range(read_slots - 1):
+                        memory_slots.release()
+                    await encrypt_send.send((cs, data))
+
+        async def _encrypt_stage(encrypt_recv, upload_send):
+            # Blocks read in the meantime are encrypted together in a worker
+            # thread, a single one is enough given encryption is CPU bound
+            async with encrypt_recv, upload_send:
+                async for item in encrypt_recv:
+                    batch = [item]
+                    while len(batch) < ENCRYPT_BATCH_SIZE:
+                        try:
+                            batch.append(encrypt_recv.receive_nowait())
+                        except (trio.WouldBlock, trio.EndOfChannel):
+                            break
+
+                    start = perf_counter()
+                    to_encrypt = []
+                    for cs, data in batch:
+                        block_access = BlockAccess.from_block(data, cs.start)
+                        known = journal.find_block(
+                            block_access.offset, block_access.size, block_access.digest
+                        )
+                        if known:
+                            # Already uploaded by a previous attempt
+                            blocks.append(known)
+                            memory_slots.release()
+                        else:
+                            to_encrypt.append((block_access, bytes(data)))
+                    ciphered = await trio.run_sync_in_worker_thread(
+                        encrypt_raw_with_secret_key_batch,
+                        [(block_access.key, data) for block_access, data in to_encrypt],
+                    )
+                    timings["encrypt"] += perf_counter() - start
+                    for (block_access, _), block_ciphered in zip(to_encrypt, ciphered):
+                        await upload_send.send((block_access, block_ciphered))
+
+        async def _upload_stage(upload_recv):
+            nonlocal uploaded_blocks, uploaded_size
+            async with upload_recv:
+                async for block_access, ciphered in upload_recv:
+                    start = perf_counter()
+                    await self._backend_block_upload(block_access, ciphered)
+                    timings["upload"] += perf_counter() - start
+                    uploaded_blocks += 1
+                    uploaded_size += block_access.size
+                    blocks.append(block_access)
+                    memory_slots.release()
+                    journal.add_block(block_access)
+                    if len(journal.pending) >= SYNC_JOURNAL_FLUSH_BLOCKS:
+                        self._save_sync_journal(access, journal)
+
+        try:
+            async with trio.open_nursery() as nursery:
+                async with read_recv, encrypt_send, encrypt_recv, upload_send, upload_recv:
+                    for _ in range(self.sync_concurrency):
+                        nursery.start_soon(_read_stage, read_recv.clone(), encrypt_send.clone())
+                        nursery.start_soon(_upload_stage, upload_recv.clone())
+                    nursery.start_soon(_encrypt_stage, encrypt_recv.clone(), upload_send.clone())
+
+        finally:
+            self._save_sync_journal(access, journal)
+
+        self.event_bus.send(
+            "fs.entry.blocks_uploaded",
+            path=str(path),
+            id=access.id,
+            blocks=uploaded_blocks,
+            size=uploaded_size,
+            timings=timings,
+        )
+        # Spaces are processed concurrently, restore blocks ordering
+        return sorted(blocks, key=lambda x: x.offset)
+
+    @traced("fs.sync_file")
     async def _sync_file_actual_sync(
         self, path: FsPath, access: Access, manifest: LocalFileManifest
     ) -> None:
@@ -154,42 +553,32 @@ class FileSyncerMixin(BaseSyncer):
         to_sync_manifest = manifest.to_remote()
         to_sync_manifest = to_sync_manifest.evolve(version=manifest.base_version + 1)
 
-        # Compute the file's blocks and upload the new ones
-        blocks = []
-        sync_map = get_sync_map(manifest, self.block_size)
-
-        # Upload the new blocks
-        spaces = sync_map.spaces
-        blocks = []
-
-        async def _process_spaces():
-            nonlocal blocks
-            while spaces:
-                cs = spaces.pop()
-                data = await self._build_data_from_contiguous_space(cs)
-                if not data:
-                    # Already existing blocks taken verbatim
-                    blocks += [bs.buffer.data for bs in cs.buffers]
-                else:
-                    # Create a new block from existing data
-                    block_access = BlockAccess.from_block(data, cs.start)
-                    await self._backend_block_create(block_access, data)
-                    blocks.append(block_access)
+        block_size = self._get_block_size(path, manifest)
+        journal = self._load_sync_journal(access, manifest)
 
-        if len(spaces) < 2:
-            await _process_spaces()
+        if self.content_defined_chunking:
+            # Block size is only used as read window here, chunks have their own sizes
+            blocks = await self._upload_cdc_blocks(path, access, manifest, journal, block_size)
+            to_sync_manifest = to_sync_manifest.evolve(blocks=blocks, size=manifest.size)
+            return await self._sync_file_upload_manifest(path, access, manifest, to_sync_manifest)
 
-        else:
-            async with trio.open_nursery() as nursery:
-                nursery.start_soon(_process_spaces)
-                nursery.start_soon(_process_spaces)
-                nursery.start_soon(_process_spaces)
-                nursery.start_soon(_process_spaces)
+        # Compute the file's blocks and upload the new ones
+        sync_map = get_sync_map(manifest, block_size)
+        blocks = await self._upload_spaces(path, access, sync_map.spaces, journal, block_size)
 
         to_sync_manifest = to_sync_manifest.evolve(
-            blocks=blocks, size=sync_map.size  # TODO: useful ?
+            blocks=blocks, size=sync_map.size, block_size=block_size  # TODO: useful ?
         )
 
+        return await self._sync_file_upload_manifest(path, access, manifest, to_sync_manifest)
+
+    async def _sync_file_upload_manifest(
+        self,
+        path: FsPath,
+        access: Access,
+        manifest: LocalFileManifest,
+        to_sync_manifest: FileManifest,
+    ) -> FileManifest:
         # Upload the file manifest as new vlob version
         notify_beacons = self.local_folder_fs.get_beacon(path)
         try:
@@ -226,6 +615,8 @@ class FileSyncerMixin(BaseSyncer):
         else:
             self._sync_file_merge_back(access, manifest, to_sync_manifest)
 
+        # Uploaded blocks are now referenced by the remote manifest
+        self._clear_sync_journal(access)
         return to_sync_manifest
 
     async def _sync_file(self, path: FsPath, access: Access, manifest: LocalFileManifest) -> None:
@@ -1,8 +1,11 @@
+import trio
 import math
 import inspect
 from uuid import UUID
+from typing import List, Dict, Optional
 
 from parsec.event_bus import EventBus
+from parsec.tracing import span
 from parsec.core.types import LocalDevice, FsPath
 from parsec.core.local_db import LocalDB
 from parsec.core.backend_connection import BackendCmdsPool
@@ -13,6 +16,7 @@ from parsec.core.fs.local_folder_fs import (
 )
 from parsec.core.fs.local_file_fs import LocalFileFS, FSBlocksLocalMiss
 from parsec.core.fs.syncer import Syncer
+from parsec.core.config import DEFAULT_SYNC_CONCURRENCY, DEFAULT_SYNC_MEMORY_BUDGET
 from parsec.core.fs.sharing import Sharing
 from parsec.core.fs.remote_loader import RemoteLoader
 
@@ -25,13 +29,19 @@ class FS:
         backend_cmds: BackendCmdsPool,
         encryption_manager,
         event_bus: EventBus,
+        content_defined_chunking: bool = False,
+        sync_concurrency: int = DEFAULT_SYNC_CONCURRENCY,
+        sync_memory_budget: int = DEFAULT_SYNC_MEMORY_BUDGET,
+        manifest_write_back_delay: float = 0,
     ):
         self.device = device
         self.local_db = local_db
         self.backend_cmds = backend_cmds
         self.event_bus = event_bus
 
-        self._local_folder_fs = LocalFolderFS(device, local_db, event_bus)
+        self._local_folder_fs = LocalFolderFS(
+            device, local_db, event_bus, write_back_delay=manifest_write_back_delay
+        )
         self._local_file_fs = LocalFileFS(device, local_db, self._local_folder_fs, event_bus)
         self._remote_loader = RemoteLoader(backend_cmds, encryption_manager, local_db)
         self._syncer = Syncer(
@@ -41,6 +51,9 @@ class FS:
             self._local_folder_fs,
             self._local_file_fs,
             event_bus,
+            content_defined_chunking=content_defined_chunking,
+            sync_concurrency=sync_concurrency,
+            sync_memory_budget=sync_memory_budget,
         )
         self._sharing = Sharing(
             device,
@@ -53,23 +66,24 @@ class FS:
         )
 
     async def _load_and_retry(self, fn, *args, **kwargs):
-        while True:
-            try:
-                if inspect.iscoroutinefunction(fn):
-                    return await fn(*args, **kwargs)
-                else:
-                    return fn(*args, **kwargs)
+        with span("fs.load_and_retry", fn=fn.__name__):
+            while True:
+                try:
+                    if inspect.iscoroutinefunction(fn):
+                        return await fn(*args, **kwargs)
+                    else:
+                        return fn(*args, **kwargs)
 
-            except FSManifestLocalMiss as exc:
-                await self._remote_loader.load_manifest(exc.access)
+                except FSManifestLocalMiss as exc:
+                    await self._remote_loader.load_manifest(exc.access)
 
-            except FSMultiManifestLocalMiss as exc:
-                for access in exc.accesses:
-                    await self._remote_loader.load_manifest(access)
+                except FSMultiManifestLocalMiss as exc:
+                    for access in exc.accesses:
+                        await self._remote_loader.load_manifest(access)
 
-            except FSBlocksLocalMiss as exc:
-                for access in exc.accesses:
-                    await self._remote_loader.load_block(access)
+                except FSBlocksLocalMiss as exc:
+                    for access in exc.accesses:
+                        await self._remote_loader.load_block(access)
 
     async def stat(self, path: str):
         cooked_path = FsPath(path)
@@ -120,6 +134,24 @@ class FS:
     async def file_fd_flush(self, fd: int):
         self._local_file_fs.flush(fd)
 
+    async def file_fd_fsync(self, fd: int):
+        self._local_file_fs.flush(fd)
+        await self.flush()
+
+    async def flush(self):
+        """
+        Make the local modifications durable.
+        """
+        await self._local_folder_fs.flush()
+        await self.local_db.flush()
+
+    async def run_write_back(self, *, task_status=trio.TASK_STATUS_IGNORED):
+        """
+        Flush the modified manifests in the background, only needed with
+        a `manifest_write_back_delay`.
+        """
+        await self._local_folder_fs.run_write_back(task_status=task_status)
+
     async def file_fd_read(self, fd: int, size: int = -1, offset: int = None):
         return await self._load_and_retry(self._local_file_fs.read, fd, size, offset)
 
@@ -146,6 +178,12 @@ class FS:
         cooked_dst = FsPath(dst)
         await self._load_and_retry(self._local_folder_fs.workspace_rename, cooked_src, cooked_dst)
 
+    async def workspace_set_block_size(self, path: str, block_size: Optional[int]):
+        cooked_path = FsPath(path)
+        await self._load_and_retry(
+            self._local_folder_fs.workspace_set_block_size, cooked_path, block_size
+        )
+
     async def move(self, src: str, dst: str):
         cooked_src = FsPath(src)
         cooked_dst = FsPath(dst)
@@ -178,6 +216,9 @@ class FS:
         path, _, _ = await self._load_and_retry(self._local_folder_fs.get_entry_path, id)
         return path
 
+    async def get_entries_paths(self, ids: List[UUID]) -> Dict[UUID, FsPath]:
+        return await self._load_and_retry(self._local_folder_fs.get_entries_paths, ids)
+
     async def share(self, path: str, recipient: str):
         cooked_path = FsPath(path)
         await self._load_and_retry(self._sharing.share, cooked_path, recipient)
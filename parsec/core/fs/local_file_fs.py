@@ -280,4 +280,4 @@ class LocalFileFS:
         self.local_folder_fs.set_manifest(cursor.access, manifest)
 
         hf.pending_writes.clear()
-        self.event_bus.send("fs.entry.updated", id=cursor.access.id)
+        self.local_folder_fs.notify_updated(cursor.access.id)
@@ -1,9 +1,11 @@
 import attr
+import trio
 from uuid import UUID
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Iterable, Optional
 
 from parsec.event_bus import EventBus
 from parsec.core.types import (
+    MAX_BLOCK_SIZE,
     FsPath,
     Access,
     LocalDevice,
@@ -16,6 +18,10 @@ from parsec.core.types import (
     LocalUserManifest,
 )
 from parsec.core.local_db import LocalDB, LocalDBMissingEntry
+from parsec.core.fs.manifests_journal import (
+    manifests_journal_serializer,
+    build_manifests_journal_access,
+)
 from parsec.core.fs.utils import (
     is_file_manifest,
     is_folder_manifest,
@@ -41,12 +47,94 @@ class FSMultiManifestLocalMiss(Exception):
 
 
 class LocalFolderFS:
-    def __init__(self, device: LocalDevice, local_db: LocalDB, event_bus: EventBus):
+    """
+    With a `write_back_delay`, modified manifests are kept in memory and
+    written by `flush`, `fs.entry.updated` events being sent once per
+    entry and per flush. `run_write_back` flushes them after this delay.
+
+    Manifests flushed together are first written in a journal, which is
+    replayed on startup if the flush has been interrupted, so a crash
+    never leaves a folder referencing a child that has not been written.
+    """
+
+    def __init__(
+        self,
+        device: LocalDevice,
+        local_db: LocalDB,
+        event_bus: EventBus,
+        write_back_delay: float = 0,
+    ):
         self.local_author = device.device_id
         self.root_access = device.user_manifest_access
         self._local_db = local_db
         self.event_bus = event_bus
         self._manifests_cache = {}
+        self.write_back_delay = write_back_delay
+        # access id -> (access, manifest) modified since the last flush
+        self._dirty = {}
+        # Entries updated since the last flush, the dict is used as an ordered set
+        self._updated = {}
+        self._flush_needed = trio.Event()
+        self._flush_lock = trio.Lock()
+        self._journal_access = build_manifests_journal_access(
+            self.root_access.id, device.local_symkey
+        )
+        self._replay_journal()
+
+    def _replay_journal(self) -> None:
+        try:
+            raw = self._local_db.get(self._journal_access)
+        except LocalDBMissingEntry:
+            return
+        # Local database applies the changes in order: the journal is only
+        # removed once the manifests have been written
+        for record in manifests_journal_serializer.loads(raw)["manifests"]:
+            self._local_db.set(record["access"], record["manifest"], False)
+        self._local_db.clear(self._journal_access)
+
+    def notify_updated(self, id: UUID) -> None:
+        if self.write_back_delay:
+            self._updated[id] = None
+            self._flush_needed.set()
+        else:
+            self.event_bus.send("fs.entry.updated", id=id)
+
+    async def flush(self) -> None:
+        """
+        Write the modified manifests and send their `fs.entry.updated` events.
+        """
+        async with self._flush_lock:
+            self._flush_needed.clear()
+            dirty, self._dirty = self._dirty, {}
+            updated, self._updated = self._updated, {}
+
+            records = [
+                {"access": access, "manifest": local_manifest_serializer.dumps(manifest)}
+                for access, manifest in dirty.values()
+            ]
+            # A single manifest is written atomically anyway
+            journaled = len(records) > 1
+            if journaled:
+                raw = manifests_journal_serializer.dumps({"manifests": records})
+                self._local_db.set(self._journal_access, raw, False)
+                await self._local_db.flush()
+            for record in records:
+                # Skip the manifests marked outdated while the journal was written
+                if record["access"].id in self._manifests_cache:
+                    self._local_db.set(record["access"], record["manifest"], False)
+            if journaled:
+                self._local_db.clear(self._journal_access)
+
+            for id in updated:
+                self.event_bus.send("fs.entry.updated", id=id)
+
+    async def run_write_back(self, *, task_status=trio.TASK_STATUS_IGNORED) -> None:
+        task_status.started()
+        while True:
+            await self._flush_needed.wait()
+            # Let the modifications done in the meantime join this flush
+            await trio.sleep(self.write_back_delay)
+            await self.flush()
 
     def get_local_beacons(self) -> List[UUID]:
         # beacon_id is either the id of the user manifest or of a workpace manifest
@@ -119,8 +207,12 @@ class LocalFolderFS:
         return self._get_manifest_read_only(access)
 
     def set_manifest(self, access: Access, manifest: LocalManifest):
-        raw = local_manifest_serializer.dumps(manifest)
-        self._local_db.set(access, raw, False)
+        if self.write_back_delay:
+            self._dirty[access.id] = (access, manifest)
+            self._flush_needed.set()
+        else:
+            raw = local_manifest_serializer.dumps(manifest)
+            self._local_db.set(access, raw, False)
         self._manifests_cache[access.id] = manifest
 
     def update_manifest(self, access: Access, manifest: LocalManifest):
@@ -128,7 +220,13 @@ class LocalFolderFS:
         self._manifests_cache[access.id] = manifest
 
     def mark_outdated_manifest(self, access: Access):
-        self._local_db.clear(access)
+        dirty = self._dirty.pop(access.id, None)
+        try:
+            self._local_db.clear(access)
+        except LocalDBMissingEntry:
+            # Manifest may have never been flushed
+            if not dirty:
+                raise
         self._manifests_cache.pop(access.id, None)
 
     def get_beacon(self, path: FsPath) -> UUID:
@@ -176,6 +274,33 @@ class LocalFolderFS:
             raise FSEntryNotFound(entry_id)
         return found
 
+    def get_entries_paths(self, entries_ids: Iterable[UUID]) -> Dict[UUID, FsPath]:
+        """
+        Resolve the paths of multiple entries with a single walk of the tree,
+        entries not present in local are omitted from the result.
+        """
+        to_find = set(entries_ids)
+        found = {}
+
+        def _recursive_search(access, path):
+            try:
+                manifest = self._get_manifest_read_only(access)
+            except FSManifestLocalMiss:
+                return
+            if access.id in to_find:
+                found[access.id] = path
+                to_find.discard(access.id)
+
+            if is_folderish_manifest(manifest):
+                for child_name, child_access in manifest.children.items():
+                    if not to_find:
+                        return
+                    _recursive_search(child_access, path / child_name)
+
+        if to_find:
+            _recursive_search(self.root_access, FsPath("/"))
+        return found
+
     def _retrieve_entry(self, path: FsPath, collector=None) -> Tuple[Access, LocalManifest]:
         access, read_only_manifest = self._retrieve_entry_read_only(path, collector)
         return access, read_only_manifest
@@ -299,8 +424,8 @@ class LocalFolderFS:
         manifest = manifest.evolve_children_and_mark_updated({path.name: child_access})
         self.set_manifest(access, manifest)
         self.set_manifest(child_access, child_manifest)
-        self.event_bus.send("fs.entry.updated", id=access.id)
-        self.event_bus.send("fs.entry.updated", id=child_access.id)
+        self.notify_updated(access.id)
+        self.notify_updated(child_access.id)
 
     def mkdir(self, path: FsPath) -> None:
         if path.is_root():
@@ -323,8 +448,8 @@ class LocalFolderFS:
 
         self.set_manifest(access, manifest)
         self.set_manifest(child_access, child_manifest)
-        self.event_bus.send("fs.entry.updated", id=access.id)
-        self.event_bus.send("fs.entry.updated", id=child_access.id)
+        self.notify_updated(access.id)
+        self.notify_updated(child_access.id)
 
     def workspace_create(self, path: FsPath) -> None:
         if not path.parent.is_root():
@@ -342,8 +467,8 @@ class LocalFolderFS:
 
         self.set_manifest(self.root_access, root_manifest)
         self.set_manifest(child_access, child_manifest)
-        self.event_bus.send("fs.entry.updated", id=self.root_access.id)
-        self.event_bus.send("fs.entry.updated", id=child_access.id)
+        self.notify_updated(self.root_access.id)
+        self.notify_updated(child_access.id)
 
         self.event_bus.send("fs.workspace.loaded", path=str(path), id=child_access.id)
 
@@ -374,7 +499,25 @@ class LocalFolderFS:
         )
         self.set_manifest(self.root_access, root_manifest)
 
-        self.event_bus.send("fs.entry.updated", id=self.root_access.id)
+        self.notify_updated(self.root_access.id)
+
+    def workspace_set_block_size(self, path: FsPath, block_size: Optional[int]) -> None:
+        """
+        Set the size of the blocks files in the workspace are split into
+        when synchronized, `None` means it is chosen according to the file size.
+        """
+        if block_size is not None and not 0 < block_size <= MAX_BLOCK_SIZE:
+            raise ValueError(f"Block size must be between 1 and {MAX_BLOCK_SIZE}")
+
+        access, manifest = self._retrieve_entry_read_only(path)
+        if not is_workspace_manifest(manifest):
+            raise PermissionError(13, "Permission denied (not a workspace)", str(path))
+        if manifest.block_size == block_size:
+            return
+
+        manifest = manifest.evolve_and_mark_updated(block_size=block_size)
+        self.set_manifest(access, manifest)
+        self.notify_updated(access.id)
 
     def _delete(self, path: FsPath, expect=None) -> None:
         if path.is_root():
@@ -399,7 +542,7 @@ class LocalFolderFS:
 
         parent_manifest = parent_manifest.evolve_children_and_mark_updated({path.name: None})
         self.set_manifest(parent_access, parent_manifest)
-        self.event_bus.send("fs.entry.updated", id=parent_access.id)
+        self.notify_updated(parent_access.id)
 
     def delete(self, path: FsPath) -> None:
         return self._delete(path)
@@ -504,7 +647,7 @@ class LocalFolderFS:
                     {dst.name: moved_access, src.name: None}
                 )
             self.set_manifest(parent_access, parent_manifest)
-            self.event_bus.send("fs.entry.updated", id=parent_access.id)
+            self.notify_updated(parent_access.id)
 
         else:
             parent_src_access, parent_src_manifest = self._retrieve_entry(parent_src)
@@ -555,14 +698,14 @@ class LocalFolderFS:
                 {dst.name: moved_access}
             )
             self.set_manifest(parent_dst_access, parent_dst_manifest)
-            self.event_bus.send("fs.entry.updated", id=parent_dst_access.id)
+            self.notify_updated(parent_dst_access.id)
 
             if delete_src:
                 parent_src_manifest = parent_src_manifest.evolve_children_and_mark_updated(
                     {src.name: None}
                 )
                 self.set_manifest(parent_src_access, parent_src_manifest)
-                self.event_bus.send("fs.entry.updated", id=parent_src_access.id)
+                self.notify_updated(parent_src_access.id)
 
     def _recursive_manifest_copy(self, access, manifest):
 
@@ -610,6 +753,7 @@ class LocalFolderFS:
                     size=manifest.size,
                     blocks=manifest.blocks,
                     dirty_blocks=manifest.dirty_blocks,
+                    block_size=manifest.block_size,
                 )
 
             else:
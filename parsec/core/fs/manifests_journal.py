@@ -0,0 +1,29 @@
+from uuid import UUID
+from hashlib import sha256
+
+from parsec.serde import UnknownCheckedSchema, fields
+from parsec.crypto import SymetricKey
+from parsec.core.types import ManifestAccess
+from parsec.core.types.access import ManifestAccessSchema
+from parsec.core.types.base import AccessID, serializer_factory
+
+
+class ManifestsJournalRecordSchema(UnknownCheckedSchema):
+    access = fields.Nested(ManifestAccessSchema, required=True)
+    # Serialized local manifest
+    manifest = fields.Bytes(required=True)
+
+
+class ManifestsJournalSchema(UnknownCheckedSchema):
+    manifests = fields.List(fields.Nested(ManifestsJournalRecordSchema), required=True)
+
+
+manifests_journal_serializer = serializer_factory(ManifestsJournalSchema)
+
+
+def build_manifests_journal_access(
+    user_manifest_id: AccessID, local_symkey: SymetricKey
+) -> ManifestAccess:
+    # Journal is only a local thing, so its id is derived from the user manifest's one
+    journal_id = sha256(b"manifests-journal" + user_manifest_id.bytes).digest()[:16]
+    return ManifestAccess(id=UUID(bytes=journal_id), key=local_symkey)
@@ -136,6 +136,9 @@ def merge_remote_folder_manifests(
     elif isinstance(target, WorkspaceManifest):
         # Only workspace manifest has this field
         evolves["participants"] = list({*target.participants, *diverged.participants})
+        base_block_size = base.block_size if base else None
+        if diverged.block_size != base_block_size:
+            evolves["block_size"] = diverged.block_size
 
     merged = target.evolve(**evolves)
     return merged, need_sync, conflicts
@@ -179,6 +182,11 @@ def merge_local_folder_manifests(
     elif isinstance(target, LocalWorkspaceManifest):
         # Only workspace manifest has this field
         evolves["participants"] = list(sorted(set(target.participants + diverged.participants)))
+        base_block_size = base.block_size if base else None
+        if diverged.block_size != base_block_size:
+            # Block size modified locally in the meantime
+            evolves["block_size"] = diverged.block_size
+            evolves["need_sync"] = need_sync or diverged.block_size != target.block_size
 
     merged = target.evolve(**evolves)
     return merged, conflicts
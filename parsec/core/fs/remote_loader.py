@@ -1,6 +1,8 @@
+import trio
 from hashlib import sha256
 
 from parsec.crypto import decrypt_raw_with_secret_key
+from parsec.tracing import traced
 from parsec.core.types import (
     BlockAccess,
     ManifestAccess,
@@ -15,6 +17,7 @@ class RemoteLoader:
         self.encryption_manager = encryption_manager
         self.local_db = local_db
 
+    @traced("fs.load_block")
     async def load_block(self, access: BlockAccess) -> None:
         """
         Raises:
@@ -27,19 +30,22 @@ class RemoteLoader:
         # on the ciphered data they cannot be tempered. And given each block
         # has an unique key, valid blocks cannot be switched together.
         # TODO: better exceptions
-        block = decrypt_raw_with_secret_key(access.key, ciphered_block)
+        block = await trio.run_sync_in_worker_thread(
+            decrypt_raw_with_secret_key, access.key, ciphered_block
+        )
         assert sha256(block).hexdigest() == access.digest, access
 
-        self.local_db.set(access, block)
+        await self.local_db.set_async(access, block)
 
+    @traced("fs.load_manifest")
     async def load_manifest(self, access: ManifestAccess) -> None:
-        _, blob = await self.backend_cmds.vlob_read(access.id, access.rts)
-        raw_remote_manifest = await self.encryption_manager.decrypt_with_secret_key(
-            access.key, blob
+        version, blob = await self.backend_cmds.vlob_read(access.id, access.rts)
+        raw_remote_manifest = await self.encryption_manager.decrypt_vlob_with_secret_key(
+            access.key, access.id, version, blob
         )
         # TODO: handle and/or document exceptions
         remote_manifest = remote_manifest_serializer.loads(raw_remote_manifest)
         local_manifest = remote_manifest.to_local()
         raw_local_manifest = local_manifest_serializer.dumps(local_manifest)
 
-        self.local_db.set(access, raw_local_manifest)
+        await self.local_db.set_async(access, raw_local_manifest)
@@ -1,9 +1,17 @@
 import trio
+from math import inf
 from uuid import UUID
+from itertools import chain, islice
+from typing import Dict, Set, Tuple
+from collections import OrderedDict, defaultdict
 
+from parsec.serde import SerdeError
 from parsec.crypto import decrypt_raw_with_secret_key, encrypt_raw_with_secret_key
+from parsec.core.config import DEFAULT_SYNC_CONCURRENCY, DEFAULT_SYNC_MEMORY_BUDGET
 from parsec.core.backend_connection import BackendCmdsBadResponse
 from parsec.core.types import (
+    DEFAULT_BLOCK_SIZE,
+    MAX_BLOCK_SIZE,
     FsPath,
     Access,
     LocalFolderManifest,
@@ -11,15 +19,41 @@ from parsec.core.types import (
     LocalManifest,
     remote_manifest_serializer,
 )
+from parsec.core.local_db import LocalDBMissingEntry
 from parsec.core.fs.utils import is_file_manifest, is_folderish_manifest, is_placeholder_manifest
 from parsec.core.fs.local_folder_fs import FSManifestLocalMiss, FSEntryNotFound
+from parsec.core.fs.beacon_checkpoints import (
+    beacon_checkpoints_serializer,
+    build_beacon_checkpoints_access,
+)
 
 
 class SyncConcurrencyError(Exception):
     pass
 
 
-DEFAULT_BLOCK_SIZE = 2 ** 16  # 64Kio
+# Files are split into bigger blocks as they grow to keep the number of
+# blocks (hence manifest size and backend round trips) reasonable
+BLOCK_SIZE_TIERS = (
+    (2 ** 24, DEFAULT_BLOCK_SIZE),  # Up to 16Mio: 64Kio blocks
+    (2 ** 27, 2 ** 18),  # Up to 128Mio: 256Kio blocks
+    (2 ** 30, 2 ** 20),  # Up to 1Gio: 1Mio blocks
+)
+# Number of already uploaded blocks remembered for deduplication. The index
+# only lives in memory: after a restart it is rebuilt from the blocks of the
+# files being synced, so reuse across files is limited to the current session.
+BLOCKS_INDEX_MAX_SIZE = 4096
+# Local entries are checked against the backend by chunks of this size, with
+# this number of `vlob_group_check` requests in parallel
+GROUP_CHECK_CHUNK_SIZE = 1000
+GROUP_CHECK_CONCURRENCY = 4
+
+
+def get_adaptive_block_size(file_size: int) -> int:
+    for max_file_size, block_size in BLOCK_SIZE_TIERS:
+        if file_size <= max_file_size:
+            return block_size
+    return MAX_BLOCK_SIZE
 
 
 class BaseSyncer:
@@ -31,8 +65,17 @@ class BaseSyncer:
         local_folder_fs,
         local_file_fs,
         event_bus,
-        block_size=DEFAULT_BLOCK_SIZE,
+        block_size=None,
+        content_defined_chunking=False,
+        sync_concurrency=DEFAULT_SYNC_CONCURRENCY,
+        sync_memory_budget=DEFAULT_SYNC_MEMORY_BUDGET,
     ):
+        # With no worker or no memory at all, blocks would never be uploaded
+        if sync_concurrency < 1:
+            raise ValueError("sync_concurrency must be at least 1")
+        if sync_memory_budget <= 0:
+            raise ValueError("sync_memory_budget must be strictly positive")
+
         self._lock = trio.Lock()
         self.device = device
         self.local_folder_fs = local_folder_fs
@@ -40,11 +83,118 @@ class BaseSyncer:
         self.backend_cmds = backend_cmds
         self.encryption_manager = encryption_manager
         self.event_bus = event_bus
+        # None means block size depends on the workspace config or file size
         self.block_size = block_size
+        self.content_defined_chunking = content_defined_chunking
+        self.sync_concurrency = sync_concurrency
+        self.sync_memory_budget = sync_memory_budget
+        # (workspace id, digest) -> BlockAccess of blocks known to be present
+        # in the backend, used to avoid uploading the same data twice
+        self._blocks_index = OrderedDict()
+        # beacon id -> beacon index of the last full sync, beacons that haven't
+        # moved since then have their entries skipped by the next full sync
+        self._beacon_checkpoints = self._load_beacon_checkpoints()
+        # entry id -> id of the beacon covering it, built from the local tree
+        # when needed and dropped once new checkpoints are saved
+        self._entries_beacons = None
+        # Entries updated while missing from `_entries_beacons`
+        self._unresolved_updates = set()
+        # beacon id -> number of local changes, to avoid storing a checkpoint
+        # computed before a change occured
+        self._beacon_generations = defaultdict(int)
+
+        self.event_bus.connect("fs.entry.updated", self._on_entry_updated, weak=True)
+
+    def _get_beacon_checkpoints_access(self):
+        return build_beacon_checkpoints_access(
+            self.device.user_manifest_access.id, self.device.local_symkey
+        )
+
+    def _load_beacon_checkpoints(self) -> Dict[UUID, int]:
+        try:
+            raw = self.local_file_fs.local_db.get(self._get_beacon_checkpoints_access())
+            return beacon_checkpoints_serializer.loads(raw)["checkpoints"]
+        except (LocalDBMissingEntry, SerdeError):
+            return {}
+
+    def _save_beacon_checkpoints(self, checkpoints: Dict[UUID, int]) -> None:
+        self._beacon_checkpoints = checkpoints
+        self.local_file_fs.local_db.set(
+            self._get_beacon_checkpoints_access(),
+            beacon_checkpoints_serializer.dumps({"checkpoints": checkpoints}),
+            deletable=False,
+        )
 
-    def _get_group_check_local_entries(self):
-        entries = []
+    def _build_entries_beacons(self) -> Dict[UUID, UUID]:
+        root_access = self.device.user_manifest_access
+        entries_beacons = {root_access.id: root_access.id}
 
+        def _recursive_add(access, beacon_id):
+            entries_beacons[access.id] = beacon_id
+            try:
+                manifest = self.local_folder_fs.get_manifest(access)
+            except FSManifestLocalMiss:
+                return
+            if is_folderish_manifest(manifest):
+                for child_access in manifest.children.values():
+                    _recursive_add(child_access, beacon_id)
+
+        # Workspaces are the user manifest's children
+        root_manifest = self.local_folder_fs.get_manifest(root_access)
+        for child_access in root_manifest.children.values():
+            _recursive_add(child_access, child_access.id)
+        return entries_beacons
+
+    def _invalidate_beacon_checkpoint(self, beacon_id: UUID) -> None:
+        self._beacon_generations[beacon_id] += 1
+        if beacon_id in self._beacon_checkpoints:
+            checkpoints = dict(self._beacon_checkpoints)
+            del checkpoints[beacon_id]
+            self._save_beacon_checkpoints(checkpoints)
+
+    def _on_entry_updated(self, event, id):
+        # Local changes are not tracked by the beacons, so the checkpoint of
+        # the workspace containing the entry is dropped
+        if self._entries_beacons is None:
+            self._entries_beacons = self._build_entries_beacons()
+        try:
+            beacon_id = self._entries_beacons[id]
+        except KeyError:
+            # Entry created since the index was built, its creation has been
+            # notified on its parent (so the workspace checkpoint is already
+            # dropped) unless it comes from a sync conflict: resolve it later
+            self._unresolved_updates.add(id)
+        else:
+            self._invalidate_beacon_checkpoint(beacon_id)
+
+    def _resolve_updates(self) -> None:
+        if not self._unresolved_updates:
+            return
+        ids, self._unresolved_updates = self._unresolved_updates, set()
+        # Resolve all the paths with a single walk of the local tree
+        paths = self.local_folder_fs.get_entries_paths(ids)
+        for path in set(paths.values()):
+            if path.is_root():
+                self._invalidate_beacon_checkpoint(self.device.user_manifest_access.id)
+            else:
+                workspace_access, _ = self.local_folder_fs.get_entry(FsPath(f"/{path.parts[1]}"))
+                self._invalidate_beacon_checkpoint(workspace_access.id)
+
+    def _get_block_size(self, path: FsPath, manifest: LocalFileManifest) -> int:
+        _, workspace_name, *_ = path.parts
+        _, workspace_manifest = self.local_folder_fs.get_entry(FsPath(f"/{workspace_name}"))
+        if workspace_manifest.block_size:
+            return workspace_manifest.block_size
+        elif self.block_size:
+            return self.block_size
+        elif manifest.blocks:
+            # Switching to another tier as the file grows would misalign all
+            # the already synced blocks, hence re-uploading the whole file
+            return manifest.block_size
+        else:
+            return get_adaptive_block_size(manifest.size)
+
+    def _iter_group_check_local_entries(self, unchanged_beacons=()):
         def _recursive_get_local_entries_ids(access):
             try:
 
@@ -57,24 +207,90 @@ class BaseSyncer:
 
             if is_folderish_manifest(manifest):
                 for child_access in manifest.children.values():
-                    _recursive_get_local_entries_ids(child_access)
+                    # Workspace hasn't changed since the last full sync
+                    if child_access.id in unchanged_beacons:
+                        continue
+                    yield from _recursive_get_local_entries_ids(child_access)
+
+            # User manifest's beacon only covers the user manifest itself
+            if access.id not in unchanged_beacons:
+                yield {"id": access.id, "rts": access.rts, "version": manifest.base_version}
+
+        return _recursive_get_local_entries_ids(self.device.user_manifest_access)
+
+    def _iter_group_check_local_entries_chunks(self, unchanged_beacons=()):
+        # Local tree is walked lazily, one chunk at a time
+        entries = self._iter_group_check_local_entries(unchanged_beacons)
+        while True:
+            chunk = list(islice(entries, GROUP_CHECK_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
 
-            entries.append({"id": access.id, "rts": access.rts, "version": manifest.base_version})
+    async def _get_beacons_state(self) -> Tuple[Dict[UUID, int], Set[UUID]]:
+        heads = {}
+        unchanged = set()
+        limiter = trio.CapacityLimiter(GROUP_CHECK_CONCURRENCY)
 
-        _recursive_get_local_entries_ids(self.device.user_manifest_access)
-        return entries
+        async def _read_beacon(beacon_id):
+            async with limiter:
+                checkpoint = self._beacon_checkpoints.get(beacon_id)
+                if checkpoint is None:
+                    heads[beacon_id] = await self._backend_beacon_get_head(beacon_id)
+                    return
+                heads[beacon_id], items = await self._backend_beacon_read(beacon_id, checkpoint)
+                if not items:
+                    unchanged.add(beacon_id)
 
-    async def full_sync(self) -> None:
-        local_entries = self._get_group_check_local_entries()
+        async with trio.open_nursery() as nursery:
+            for beacon_id in self.local_folder_fs.get_local_beacons():
+                nursery.start_soon(_read_beacon, beacon_id)
+
+        return heads, unchanged
 
-        if not local_entries:
+    async def full_sync(self) -> None:
+        self._resolve_updates()
+        generations = dict(self._beacon_generations)
+        heads, unchanged_beacons = await self._get_beacons_state()
+        await self._full_sync_entries(unchanged_beacons)
+        # Every remote change up to the beacons' heads is now merged, but
+        # beacons with local changes in the meantime must be checked again
+        self._resolve_updates()
+        checkpoints = {
+            beacon_id: head
+            for beacon_id, head in heads.items()
+            if self._beacon_generations[beacon_id] == generations.get(beacon_id, 0)
+        }
+        self._save_beacon_checkpoints(checkpoints)
+        self._entries_beacons = None
+
+    async def _full_sync_entries(self, unchanged_beacons) -> None:
+        chunks = self._iter_group_check_local_entries_chunks(unchanged_beacons)
+        first_chunk = next(chunks, None)
+
+        if not first_chunk:
             # Nothing in local, so everything is synced ! ;-)
             self.event_bus.send("fs.entry.synced", path="/", id=self.device.user_manifest_access.id)
             return
 
-        need_sync_entries = await self._backend_vlob_group_check(local_entries)
-        for need_sync_entry_id in need_sync_entries:
-            await self.sync_by_id(need_sync_entry_id)
+        # Checkers share the chunks iterator, and changed entries are synced
+        # as soon as they are reported without waiting for the whole check
+        chunks = chain([first_chunk], chunks)
+        changed_send, changed_recv = trio.open_memory_channel(inf)
+
+        async def _check_chunks(changed_send):
+            async with changed_send:
+                for chunk in chunks:
+                    for need_sync_entry_id in await self._backend_vlob_group_check(chunk):
+                        await changed_send.send(need_sync_entry_id)
+
+        async with trio.open_nursery() as nursery:
+            async with changed_send:
+                for _ in range(GROUP_CHECK_CONCURRENCY):
+                    nursery.start_soon(_check_chunks, changed_send.clone())
+            async with changed_recv:
+                async for need_sync_entry_id in changed_recv:
+                    await self.sync_by_id(need_sync_entry_id)
 
     async def sync_by_id(self, entry_id: UUID) -> None:
         # TODO: we won't stricly sync this id, but the corresponding path
@@ -199,8 +415,17 @@ class BaseSyncer:
     ) -> None:
         raise NotImplementedError()
 
+    def _get_memory_slots(self, block_size: int) -> int:
+        # Number of blocks that can be held in memory without exceeding the budget
+        return max(1, self.sync_memory_budget // block_size)
+
     async def _backend_block_create(self, access, blob):
-        ciphered = encrypt_raw_with_secret_key(access.key, bytes(blob))
+        ciphered = await trio.run_sync_in_worker_thread(
+            encrypt_raw_with_secret_key, access.key, bytes(blob)
+        )
+        await self._backend_block_upload(access, ciphered)
+
+    async def _backend_block_upload(self, access, ciphered):
         try:
             await self.backend_cmds.blockstore_create(access.id, ciphered)
         except BackendCmdsBadResponse as exc:
@@ -208,20 +433,32 @@ class BaseSyncer:
             # the backend but we lost the connection before receiving the response
             # Note we neglect the possibility of another id collision with another
             # unrelated block because we trust probability and uuid4, who doesn't ?
-            if exc.args[0].status != "already_exists":
+            # Convergent blocks also end up here when the same data has already
+            # been uploaded, which is exactly what we want.
+            if exc.status != "already_exists":
                 raise
 
     async def _backend_block_read(self, access):
         ciphered = await self.backend_cmds.blockstore_read(access.id)
-        return decrypt_raw_with_secret_key(access.key, ciphered)
+        return await trio.run_sync_in_worker_thread(
+            decrypt_raw_with_secret_key, access.key, ciphered
+        )
+
+    async def _backend_beacon_read(self, beacon_id, offset):
+        return await self.backend_cmds.beacon_read(beacon_id, offset)
+
+    async def _backend_beacon_get_head(self, beacon_id):
+        return await self.backend_cmds.beacon_get_head(beacon_id)
 
     async def _backend_vlob_group_check(self, to_check):
         changed = await self.backend_cmds.vlob_group_check(to_check)
         return [entry["id"] for entry in changed]
 
     async def _backend_vlob_read(self, access, version=None):
-        _, blob = await self.backend_cmds.vlob_read(access.id, access.rts, version)
-        raw = await self.encryption_manager.decrypt_with_secret_key(access.key, blob)
+        version, blob = await self.backend_cmds.vlob_read(access.id, access.rts, version)
+        raw = await self.encryption_manager.decrypt_vlob_with_secret_key(
+            access.key, access.id, version, blob
+        )
         return remote_manifest_serializer.loads(raw)
 
     async def _backend_vlob_create(self, access, manifest, notify_beacon):
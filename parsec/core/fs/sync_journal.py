@@ -0,0 +1,75 @@
+import attr
+from uuid import UUID
+from hashlib import sha256
+from typing import Tuple, List, Dict, Optional
+
+from parsec.serde import UnknownCheckedSchema, fields, validate, post_load
+from parsec.crypto import SymetricKey
+from parsec.core.types import ManifestAccess, BlockAccess
+from parsec.core.types.access import BlockAccessSchema
+from parsec.core.types.base import AccessID, serializer_factory
+
+
+# Journal is persisted every time this number of blocks has been uploaded
+SYNC_JOURNAL_FLUSH_BLOCKS = 32
+
+
+@attr.s(slots=True, auto_attribs=True)
+class SyncJournal:
+    """
+    Blocks already uploaded while syncing a file on top of `base_version`.
+
+    An interrupted sync (typically because the backend went offline) can
+    then reuse those blocks instead of uploading them again.
+
+    The journal is persisted as a header (base version and number of
+    segments) and append-only segments, each one holding the blocks added
+    since the previous flush, so a flush never rewrites the whole journal.
+    """
+
+    base_version: int
+    segments: int = 0
+    # (offset, size, digest) -> BlockAccess
+    index: Dict[Tuple[int, int, str], BlockAccess] = attr.ib(factory=dict)
+    # Blocks not persisted yet
+    pending: List[BlockAccess] = attr.ib(factory=list)
+
+    @property
+    def blocks(self) -> List[BlockAccess]:
+        return list(self.index.values())
+
+    def find_block(self, offset: int, size: int, digest: str) -> Optional[BlockAccess]:
+        return self.index.get((offset, size, digest))
+
+    def add_block(self, block: BlockAccess, pending: bool = True) -> None:
+        self.index[(block.offset, block.size, block.digest)] = block
+        if pending:
+            self.pending.append(block)
+
+
+class SyncJournalSchema(UnknownCheckedSchema):
+    base_version = fields.Integer(required=True, validate=validate.Range(min=0))
+    segments = fields.Integer(required=True, validate=validate.Range(min=0))
+
+    @post_load
+    def make_obj(self, data):
+        return SyncJournal(**data)
+
+
+class SyncJournalSegmentSchema(UnknownCheckedSchema):
+    blocks = fields.List(fields.Nested(BlockAccessSchema), required=True)
+
+
+sync_journal_serializer = serializer_factory(SyncJournalSchema)
+sync_journal_segment_serializer = serializer_factory(SyncJournalSegmentSchema)
+
+
+def build_sync_journal_access(
+    file_id: AccessID, local_symkey: SymetricKey, segment: int = None
+) -> ManifestAccess:
+    # Journal is only a local thing, so its id is derived from the file's one
+    seed = b"sync-journal" + file_id.bytes
+    if segment is not None:
+        seed += b"segment-%d" % segment
+    journal_id = sha256(seed).digest()[:16]
+    return ManifestAccess(id=UUID(bytes=journal_id), key=local_symkey)
@@ -1,6 +1,10 @@
 import os
+import trio
+import queue
+import threading
 from pathlib import Path
 from shutil import rmtree
+from structlog import get_logger
 
 from parsec.crypto import encrypt_raw_with_secret_key, decrypt_raw_with_secret_key
 
@@ -9,8 +13,16 @@ from parsec.crypto import encrypt_raw_with_secret_key, decrypt_raw_with_secret_k
 Access = None  # TODO: hack to fix recursive import
 
 
+logger = get_logger()
+
+
 # TODO: should be in config.py
 DEFAULT_MAX_CACHE_SIZE = 128 * 1024 * 1024
+DEFAULT_IO_THREADS = 4
+# Writes queued while the previous group was on disk are committed together
+MAX_WRITE_GROUP = 256
+# The writer thread is stopped once idle, then started again on next write
+WRITER_IDLE_TIMEOUT = 1
 
 
 class LocalDBError(Exception):
@@ -22,8 +34,46 @@ class LocalDBMissingEntry(LocalDBError):
         self.access = access
 
 
+class _Write:
+    __slots__ = ("path", "raw", "ciphered", "durable")
+
+    def __init__(self, path, raw, ciphered, durable):
+        self.path = path
+        self.raw = raw
+        self.ciphered = ciphered
+        self.durable = durable
+
+
+class _Remove:
+    __slots__ = ("path",)
+
+    def __init__(self, path):
+        self.path = path
+
+
+class _ResetCache:
+    __slots__ = ()
+
+
 class LocalDB:
-    def __init__(self, path: Path, max_cache_size: int = DEFAULT_MAX_CACHE_SIZE):
+    """
+    Entries are stored encrypted, one file per entry, in the `cache`
+    directory when they can be garbage collected and in `placeholders`
+    otherwise.
+
+    Which entries exist (and the cache size) is tracked in memory, while
+    the modifications are written to disk in order by a dedicated writer
+    thread. The entries waiting to be written are served from memory, and
+    `flush` waits for them to be durable: placeholders writes are grouped
+    and fsync'ed together before being atomically renamed into place.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_cache_size: int = DEFAULT_MAX_CACHE_SIZE,
+        io_threads: int = DEFAULT_IO_THREADS,
+    ):
         self._path = Path(path)
         self.max_cache_size = max_cache_size
         self._path.mkdir(parents=True, exist_ok=True)
@@ -32,60 +82,238 @@ class LocalDB:
         self._placeholders = self._path / "placeholders"
         self._placeholders.mkdir(parents=True, exist_ok=True)
 
+        # Entry id -> (deletable, size)
+        self._index = {}
+        self._cache_size = 0
+        for entry in os.scandir(self._cache):
+            if entry.is_file():
+                size = entry.stat().st_size
+                self._index[entry.name] = (True, size)
+                self._cache_size += size
+        for entry in os.scandir(self._placeholders):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                self._index[entry.name] = (False, entry.stat().st_size)
+
+        self._io_limiter = trio.CapacityLimiter(io_threads)
+        self._lock = threading.Lock()
+        self._durable_cond = threading.Condition(self._lock)
+        # Entry id -> write not done yet
+        self._pending = {}
+        self._ops = queue.Queue()
+        self._writer = None
+        self._queued_seq = 0
+        self._written_seq = 0
+
     @property
     def path(self):
         return str(self._path)
 
     def get_cache_size(self):
-        cache = str(self._cache)
-        return sum(
-            os.path.getsize(os.path.join(cache, f))
-            for f in os.listdir(cache)
-            if os.path.isfile(os.path.join(cache, f))
-        )
+        return self._cache_size
 
-    def _find(self, access):
-        try:
-            return next(
-                (
-                    directory / str(access.id)
-                    for directory in [self._cache, self._placeholders]
-                    if (directory / str(access.id)).exists()
-                )
-            )
-        except StopIteration:
-            pass
+    def _entry_path(self, id: str, deletable: bool) -> Path:
+        return (self._cache if deletable else self._placeholders) / id
 
-    def get(self, access: Access):
-        file = self._find(access)
-        if not file:
+    def _lookup(self, access):
+        """
+        Returns: the raw data if the entry is still waiting to be written,
+        its path otherwise.
+        """
+        id = str(access.id)
+        with self._lock:
+            try:
+                deletable, _ = self._index[id]
+            except KeyError:
+                raise LocalDBMissingEntry(access)
+            write = self._pending.get(id)
+        if write:
+            return write.raw, None
+        return None, self._entry_path(id, deletable)
+
+    def _read(self, access, path):
+        try:
+            ciphered = path.read_bytes()
+        except FileNotFoundError:
+            # Entry removed since the lookup
             raise LocalDBMissingEntry(access)
-        ciphered = file.read_bytes()
         return decrypt_raw_with_secret_key(access.key, ciphered)
 
+    def get(self, access: Access):
+        raw, path = self._lookup(access)
+        if raw is not None:
+            return raw
+        return self._read(access, path)
+
+    async def get_async(self, access: Access):
+        """
+        Same as `get`, but the disk is read from the I/O threads.
+        """
+        raw, path = self._lookup(access)
+        if raw is not None:
+            return raw
+        return await trio.run_sync_in_worker_thread(
+            self._read, access, path, limiter=self._io_limiter
+        )
+
     def set(self, access: Access, raw: bytes, deletable: bool = True):
         assert isinstance(raw, (bytes, bytearray))
-
         ciphered = encrypt_raw_with_secret_key(access.key, raw)
+        self._set_ciphered(access, bytes(raw), ciphered, deletable)
 
+    async def set_async(self, access: Access, raw: bytes, deletable: bool = True):
+        """
+        Same as `set`, but the data is encrypted from the I/O threads.
+        """
+        assert isinstance(raw, (bytes, bytearray))
+        ciphered = await trio.run_sync_in_worker_thread(
+            encrypt_raw_with_secret_key, access.key, raw, limiter=self._io_limiter
+        )
+        self._set_ciphered(access, bytes(raw), ciphered, deletable)
+
+    def _set_ciphered(self, access, raw, ciphered, deletable):
         if deletable:
-            if self.get_cache_size() + len(ciphered) > self.max_cache_size:
+            if self._cache_size + len(ciphered) > self.max_cache_size:
                 self.run_garbage_collector()
 
-        try:
-            self.clear(access)
-        except LocalDBMissingEntry:
-            pass
-        file = self._cache / str(access.id) if deletable else self._placeholders / str(access.id)
-        file.write_bytes(ciphered)
+        id = str(access.id)
+        path = self._entry_path(id, deletable)
+        write = _Write(path, raw, ciphered, durable=not deletable)
+        with self._lock:
+            previous = self._index.get(id)
+            if previous:
+                previous_deletable, previous_size = previous
+                if previous_deletable:
+                    self._cache_size -= previous_size
+                if previous_deletable != deletable:
+                    self._queue(_Remove(self._entry_path(id, previous_deletable)))
+            self._index[id] = (deletable, len(ciphered))
+            if deletable:
+                self._cache_size += len(ciphered)
+            self._pending[id] = write
+            self._queue(write)
 
     def clear(self, access: Access):
-        file = self._find(access)
-        if not file:
-            raise LocalDBMissingEntry(access)
-        file.unlink()
+        id = str(access.id)
+        with self._lock:
+            try:
+                deletable, size = self._index.pop(id)
+            except KeyError:
+                raise LocalDBMissingEntry(access)
+            if deletable:
+                self._cache_size -= size
+            self._pending.pop(id, None)
+            self._queue(_Remove(self._entry_path(id, deletable)))
 
     def run_garbage_collector(self):
         # TODO: really quick'n dirty GC...
-        rmtree(str(self._cache))
-        self._cache.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            for id, (deletable, _) in list(self._index.items()):
+                if deletable:
+                    del self._index[id]
+                    self._pending.pop(id, None)
+            self._cache_size = 0
+            self._queue(_ResetCache())
+
+    async def flush(self):
+        """
+        Wait for the modifications done so far to be written, placeholders
+        being durable on disk.
+        """
+        with self._lock:
+            seq = self._queued_seq
+        await trio.run_sync_in_worker_thread(self._wait_written, seq, limiter=self._io_limiter)
+
+    def _wait_written(self, seq):
+        with self._durable_cond:
+            self._durable_cond.wait_for(lambda: self._written_seq >= seq)
+
+    # Writer thread
+
+    def _queue(self, op):
+        # Must be called with the lock held
+        self._queued_seq += 1
+        self._ops.put(op)
+        if not self._writer:
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="LocalDB writer", daemon=True
+            )
+            self._writer.start()
+
+    def _writer_loop(self):
+        while True:
+            try:
+                group = [self._ops.get(timeout=WRITER_IDLE_TIMEOUT)]
+            except queue.Empty:
+                with self._lock:
+                    if self._ops.empty():
+                        self._writer = None
+                        return
+                continue
+            while len(group) < MAX_WRITE_GROUP:
+                try:
+                    group.append(self._ops.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit_group(group)
+            except OSError:
+                # Entries are still served from memory until overwritten
+                logger.exception("Cannot write local data")
+                with self._lock:
+                    self._written_seq += len(group)
+                    self._durable_cond.notify_all()
+                continue
+
+            with self._lock:
+                for op in group:
+                    if isinstance(op, _Write) and self._pending.get(op.path.name) is op:
+                        del self._pending[op.path.name]
+                self._written_seq += len(group)
+                self._durable_cond.notify_all()
+
+    def _commit_group(self, group):
+        # Operations are applied in order, but durable writes first go to
+        # temporary files that are fsync'ed and renamed together (before
+        # any removal that could concern them), so a crash leaves each
+        # placeholder either in its previous or in its new version.
+        # Path -> temporary path, an entry written twice is renamed once
+        renames = {}
+        for op in group:
+            if isinstance(op, _Write):
+                if op.durable:
+                    tmp_path = op.path.with_name(op.path.name + ".tmp")
+                    tmp_path.write_bytes(op.ciphered)
+                    renames[op.path] = tmp_path
+                else:
+                    op.path.write_bytes(op.ciphered)
+            else:
+                self._apply_renames(renames)
+                if isinstance(op, _Remove):
+                    try:
+                        op.path.unlink()
+                    except FileNotFoundError:
+                        pass
+                else:
+                    rmtree(str(self._cache))
+                    self._cache.mkdir(parents=True, exist_ok=True)
+        self._apply_renames(renames)
+
+    def _apply_renames(self, renames):
+        if not renames:
+            return
+        for tmp_path in renames.values():
+            fd = os.open(str(tmp_path), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for path, tmp_path in renames.items():
+            os.replace(str(tmp_path), str(path))
+        renames.clear()
+        # Make the renames themselves durable
+        fd = os.open(str(self._placeholders), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -14,6 +14,7 @@ from parsec.core.backend_connection import (
     backend_listen_events,
     monitor_backend_connection,
 )
+from parsec.core.metrics import CoreMetrics
 from parsec.core.encryption_manager import EncryptionManager
 from parsec.core.mountpoint import mountpoint_manager_factory
 from parsec.core.beacons_monitor import monitor_beacons
@@ -36,6 +37,7 @@ class LoggedCore:
     mountpoint_manager = attr.ib()
     backend_cmds = attr.ib()
     fs = attr.ib()
+    metrics = attr.ib()
 
     @property
     def mountpoint(self):
@@ -67,13 +69,30 @@ async def logged_core_factory(
             device.organization_addr,
             device.device_id,
             device.signing_key,
-            config.backend_max_connections,
+            max_pool=config.backend_max_connections,
+            min_pool=config.backend_min_connections,
+            keepalive=config.backend_keepalive,
+            idle_timeout=config.backend_idle_timeout,
         ) as backend_cmds_pool:
 
+            metrics = CoreMetrics()
+            metrics.collect_transport_pool(backend_cmds_pool.transport_pool)
             local_db = LocalDB(config.data_base_dir / device.device_id)
 
-            encryption_manager = EncryptionManager(device, local_db, backend_cmds_pool)
-            fs = FS(device, local_db, backend_cmds_pool, encryption_manager, event_bus)
+            encryption_manager = EncryptionManager(
+                device, local_db, backend_cmds_pool, metrics=metrics
+            )
+            fs = FS(
+                device,
+                local_db,
+                backend_cmds_pool,
+                encryption_manager,
+                event_bus,
+                content_defined_chunking=config.content_defined_chunking,
+                sync_concurrency=config.sync_concurrency,
+                sync_memory_budget=config.sync_memory_budget,
+                manifest_write_back_delay=config.manifest_write_back_delay,
+            )
 
             async with trio.open_nursery() as monitor_nursery:
                 # Finally start monitors
@@ -84,6 +103,8 @@ async def logged_core_factory(
                 await monitor_nursery.start(monitor_beacons, device, fs, event_bus)
                 await monitor_nursery.start(monitor_messages, backend_online, fs, event_bus)
                 await monitor_nursery.start(monitor_sync, backend_online, fs, event_bus)
+                if config.manifest_write_back_delay:
+                    await monitor_nursery.start(fs.run_write_back)
 
                 # TODO: rework mountpoint manager to avoid init/teardown
                 mountpoint_manager = mountpoint_manager_factory(fs, event_bus)
@@ -103,9 +124,13 @@ async def logged_core_factory(
                         mountpoint_manager=mountpoint_manager,
                         backend_cmds=backend_cmds_pool,
                         fs=fs,
+                        metrics=metrics,
                     )
                     root_nursery.cancel_scope.cancel()
 
                 finally:
                     if config.mountpoint_enabled:
                         await mountpoint_manager.teardown()
+                    # Don't lose the local changes still waiting to be written
+                    with trio.open_cancel_scope(shield=True):
+                        await fs.flush()
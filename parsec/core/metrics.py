@@ -0,0 +1,98 @@
+from parsec.metrics import MetricsRegistry
+
+
+VERIFY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# Transport pool stats field -> (metric name, help)
+TRANSPORT_POOL_COUNTERS = {
+    "connections": (
+        "parsec_core_backend_connections_total",
+        "Number of connections opened to the backend",
+    ),
+    "connect_latency": (
+        "parsec_core_backend_connect_seconds_total",
+        "Time spent opening connections to the backend (handshake included)",
+    ),
+    "ssl_sessions_reused": (
+        "parsec_core_backend_ssl_sessions_reused_total",
+        "Number of connections resuming a previous SSL session",
+    ),
+    "closed": (
+        "parsec_core_backend_connections_closed_total",
+        "Number of connections to the backend closed",
+    ),
+    "acquisitions": (
+        "parsec_core_backend_acquisitions_total",
+        "Number of connections acquired from the pool",
+    ),
+    "wait_latency": (
+        "parsec_core_backend_acquire_wait_seconds_total",
+        "Time spent waiting for a connection to be available in the pool",
+    ),
+    "stale": (
+        "parsec_core_backend_stale_connections_total",
+        "Number of idle connections found dead when acquired",
+    ),
+    "retries": (
+        "parsec_core_backend_retries_total",
+        "Number of commands retried on a fresh connection",
+    ),
+    "evicted": (
+        "parsec_core_backend_evicted_connections_total",
+        "Number of connections closed after being idle for too long",
+    ),
+    "keepalive_pings": (
+        "parsec_core_backend_keepalive_pings_total",
+        "Number of pings sent to keep idle connections alive",
+    ),
+    "keepalive_failures": (
+        "parsec_core_backend_keepalive_failures_total",
+        "Number of keepalive pings that failed",
+    ),
+}
+
+
+class CoreMetrics:
+    """
+    Metrics collected by the core, shared by its components.
+    """
+
+    def __init__(self):
+        self.registry = registry = MetricsRegistry()
+        self.verify_duration = registry.histogram(
+            "parsec_core_verify_duration_seconds",
+            "Time spent decrypting and verifying the signature of vlobs",
+            buckets=VERIFY_BUCKETS,
+        )
+        self.verified_cache = registry.counter(
+            "parsec_core_verified_cache_total",
+            "Number of vlobs looked up in the verified cache",
+            ("result",),
+        )
+        self.transport_pool_counters = {
+            field: registry.counter(name, help)
+            for field, (name, help) in TRANSPORT_POOL_COUNTERS.items()
+        }
+        self.connections_in_use = registry.gauge(
+            "parsec_core_backend_connections_in_use", "Number of connections currently in use"
+        )
+        self.connections_idle = registry.gauge(
+            "parsec_core_backend_connections_idle", "Number of idle connections in the pool"
+        )
+
+    def collect_transport_pool(self, transport_pool) -> None:
+        """
+        Report the stats kept by `transport_pool` on each rendering.
+        """
+
+        def _collect():
+            stats = transport_pool.stats
+            for field, counter in self.transport_pool_counters.items():
+                counter.set_total(getattr(stats, field))
+            self.connections_in_use.set(stats.in_use)
+            self.connections_idle.set(len(transport_pool.transports))
+
+        self.registry.add_collector(_collect)
+
+    def render(self) -> str:
+        return self.registry.render()
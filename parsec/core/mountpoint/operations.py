@@ -139,7 +139,7 @@ class FuseOperations(LoggingMixIn, Operations):
 
     def fsync(self, path, datasync, fh):
         with translate_error():
-            self.fs_access.file_fd_flush(fh)
+            self.fs_access.file_fd_fsync(fh)
 
         return 0
 
@@ -282,3 +282,6 @@ class ProcessFSAccessClient:
 
     def file_fd_flush(self, fh):
         return self._send_req("file_fd_flush", fh)
+
+    def file_fd_fsync(self, fh):
+        return self._send_req("file_fd_fsync", fh)
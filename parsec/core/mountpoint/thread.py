@@ -188,3 +188,6 @@ class ThreadFSAccess:
 
     def file_fd_flush(self, fh):
         return self._portal.run(self.fs.file_fd_flush, fh)
+
+    def file_fd_fsync(self, fh):
+        return self._portal.run(self.fs.file_fd_fsync, fh)
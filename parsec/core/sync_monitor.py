@@ -1,8 +1,14 @@
+import math
 import trio
+from uuid import UUID
+from heapq import heappush, heappop
+from typing import Optional, List, Tuple
 from trio.hazmat import current_clock
 
 from parsec.core.base import BaseAsyncComponent
+from parsec.core.types import FsPath
 from parsec.core.backend_connection import BackendNotAvailable
+from parsec.core.fs import FSEntryNotFound
 
 
 MIN_WAIT = 1
@@ -14,6 +20,65 @@ def timestamp():
     return current_clock().current_time()
 
 
+class SyncScheduler:
+    """
+    Keep track of the updated entries and the time they should be synced at.
+
+    An entry is due once it hasn't been modified for `MIN_WAIT` seconds, or
+    at most `MAX_WAIT` seconds after its first modification if it keeps being
+    modified. Deadlines are stored in a heap, hence retrieving the due
+    entries doesn't require to go through all the updated ones.
+    """
+
+    def __init__(self):
+        # id -> (first updated, last updated)
+        self._entries = {}
+        # Heap of (deadline, id), outdated items are skipped when popped
+        self._heap = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, id):
+        return id in self._entries
+
+    @staticmethod
+    def _get_deadline(first_updated, last_updated):
+        return min(first_updated + MAX_WAIT, last_updated + MIN_WAIT)
+
+    def schedule(self, id: UUID, now: float) -> None:
+        try:
+            first_updated, _ = self._entries[id]
+        except KeyError:
+            first_updated = now
+        self._entries[id] = (first_updated, now)
+        heappush(self._heap, (self._get_deadline(first_updated, now), id))
+
+    def next_deadline(self) -> Optional[float]:
+        while self._heap:
+            deadline, id = self._heap[0]
+            try:
+                if self._get_deadline(*self._entries[id]) == deadline:
+                    return deadline
+            except KeyError:
+                pass
+            heappop(self._heap)
+        return None
+
+    def pop_due(self, now: float) -> List[Tuple[UUID, float]]:
+        """
+        Returns: list of (<id>, <first updated>) for the entries to sync
+        """
+        due = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return due
+            _, id = heappop(self._heap)
+            first_updated, _ = self._entries.pop(id)
+            due.append((id, first_updated))
+
+
 # TODO: replace by a function
 # TODO: BaseAsyncComponent seems not needed
 class SyncMonitor(BaseAsyncComponent):
@@ -70,62 +135,65 @@ class SyncMonitor(BaseAsyncComponent):
 
             await self._monitoring_loop()
 
+    async def _coalesce_entries(
+        self, entries: List[Tuple[UUID, float]]
+    ) -> List[Tuple[UUID, FsPath, float]]:
+        """
+        Syncing an entry also syncs its children, so there is no need to
+        sync entries whose parent is also going to be synced.
+
+        Returns: list of (<id>, <path>, <first updated>) for the entries to sync
+        """
+        # Resolve all the paths with a single walk of the local tree
+        entries_paths = await self.fs.get_entries_paths([id for id, _ in entries])
+        paths = {}
+        for id, first_updated in entries:
+            try:
+                paths[entries_paths[id]] = (id, first_updated)
+            except KeyError:
+                # Entry has been removed in the meantime, nothing to sync
+                continue
+
+        coalesced = []
+        for path, (id, first_updated) in paths.items():
+            if not any(parent in paths for parent in path.parents):
+                coalesced.append((id, path, first_updated))
+        return coalesced
+
     async def _monitoring_loop(self):
-        updated_entries = {}
+        scheduler = SyncScheduler()
         new_event = trio.Event()
 
         def _on_entry_updated(sender, id):
-            try:
-                first_updated, _ = updated_entries[id]
-                last_updated = timestamp()
-            except KeyError:
-                first_updated = last_updated = timestamp()
-            updated_entries[id] = (first_updated, last_updated)
+            scheduler.schedule(id, timestamp())
             new_event.set()
 
         self.event_bus.connect("fs.entry.updated", _on_entry_updated, weak=True)
 
-        async with trio.open_nursery() as nursery:
-            while True:
-                self.event_bus.send("sync_monitor.ready")
+        while True:
+            self.event_bus.send("sync_monitor.ready")
 
+            next_deadline = scheduler.next_deadline()
+            with trio.move_on_at(math.inf if next_deadline is None else next_deadline):
                 await new_event.wait()
-                new_event.clear()
-
-                await self._monitoring_tick(updated_entries)
-
-                if updated_entries:
-
-                    async def _wait():
-                        await trio.sleep(MIN_WAIT)
-                        new_event.set()
-
-                    nursery.start_soon(_wait)
-
-    async def _monitoring_tick(self, updated_entries):
-        now = timestamp()
-
-        for id, (first_updated, last_updated) in updated_entries.items():
-            if now - first_updated > MAX_WAIT:
-                await self.fs.sync_by_id(id)
-                break
-
-        else:
-            for id, (_, last_updated) in updated_entries.items():
-                if now - last_updated > MIN_WAIT:
-                    await self.fs.sync_by_id(id)
-                    break
-
-            else:
-                id = None
-
-        if id:
-            _, new_last_updated = updated_entries[id]
-            # This entry has been modified again during the sync
-            if new_last_updated != last_updated:
-                updated_entries[id] = (last_updated, new_last_updated)
-            else:
-                del updated_entries[id]
+            new_event.clear()
+
+            due = scheduler.pop_due(timestamp())
+            self.event_bus.send("sync_monitor.queue_stats", waiting=len(scheduler), due=len(due))
+            if not due:
+                continue
+
+            # Entries are synced one after another given the syncer only
+            # allows a single sync operation at a time anyway
+            for id, path, first_updated in await self._coalesce_entries(due):
+                try:
+                    await self.fs.sync(str(path))
+                except FSEntryNotFound:
+                    # Entry has been removed in the meantime, nothing to sync
+                    continue
+                self.event_bus.send(
+                    "sync_monitor.entry_synced", id=id, latency=timestamp() - first_updated
+                )
 
 
 async def monitor_sync(backend_online, fs, event_bus, *, task_status=trio.TASK_STATUS_IGNORED):
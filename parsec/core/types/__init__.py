@@ -1,7 +1,14 @@
 from typing import Union
 
 from parsec.core.types.base import TrustSeed, AccessID, EntryName, FileDescriptor, FsPath
-from parsec.core.types.access import Access, ManifestAccess, BlockAccess, DirtyBlockAccess
+from parsec.core.types.access import (
+    DEFAULT_BLOCK_SIZE,
+    MAX_BLOCK_SIZE,
+    Access,
+    ManifestAccess,
+    BlockAccess,
+    DirtyBlockAccess,
+)
 from parsec.core.types.local_device import LocalDevice, local_device_serializer
 from parsec.core.types.local_manifests import (
     LocalFileManifest,
@@ -31,6 +38,8 @@ __all__ = (
     "EntryName",
     "FileDescriptor",
     "FsPath",
+    "DEFAULT_BLOCK_SIZE",
+    "MAX_BLOCK_SIZE",
     "Access",
     "ManifestAccess",
     "BlockAccess",
@@ -1,13 +1,22 @@
 import attr
-from uuid import uuid4
-from hashlib import sha256
+from uuid import UUID, uuid4
+from hashlib import sha256, blake2b
 from typing import Union
 
-from parsec.crypto import SymetricKey, HashDigest, generate_secret_key
+from parsec.crypto import (
+    SymetricKey,
+    HashDigest,
+    generate_secret_key,
+    derivate_convergent_secret_key,
+)
 from parsec.serde import UnknownCheckedSchema, fields, validate, post_load
 from parsec.core.types.base import TrustSeed, AccessID, TrustSeedField, serializer_factory
 
 
+DEFAULT_BLOCK_SIZE = 2 ** 16  # 64Kio
+MAX_BLOCK_SIZE = 2 ** 22  # 4Mio
+
+
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class ManifestAccess:
     id: AccessID = attr.ib(factory=uuid4)
@@ -48,6 +57,26 @@ class BlockAccess:
             digest=sha256(block).hexdigest(),
         )
 
+    @classmethod
+    def from_convergent_block(
+        cls, block: bytes, offset: int, convergence_key: SymetricKey
+    ) -> "BlockAccess":
+        """
+        Unlike :meth:`from_block`, id and key are derived from the block's
+        digest so identical blocks sharing a convergence key (i.e. within a
+        workspace) end up with the same access and are stored only once.
+        """
+        digest = sha256(block).hexdigest()
+        raw_digest = bytes.fromhex(digest)
+        id = blake2b(raw_digest, key=convergence_key, digest_size=16, person=b"convergent-id")
+        return cls(
+            id=UUID(bytes=id.digest()),
+            key=derivate_convergent_secret_key(convergence_key, raw_digest),
+            offset=offset,
+            size=len(block),
+            digest=digest,
+        )
+
 
 class BlockAccessSchema(UnknownCheckedSchema):
     id = fields.UUID(required=True)
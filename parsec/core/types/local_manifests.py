@@ -1,12 +1,14 @@
 import attr
 import pendulum
-from typing import Tuple, Dict, Union
+from typing import Tuple, Dict, Union, Optional
 
 from parsec.types import DeviceID, UserID, FrozenDict
 from parsec.serde import UnknownCheckedSchema, OneOfSchema, fields, validate, post_load
 from parsec.core.types import remote_manifests
 from parsec.core.types.base import EntryName, EntryNameField, serializer_factory
 from parsec.core.types.access import (
+    DEFAULT_BLOCK_SIZE,
+    MAX_BLOCK_SIZE,
     BlockAccess,
     ManifestAccess,
     BlockAccessSchema,
@@ -40,6 +42,7 @@ class LocalFileManifest:
     size: int = 0
     blocks: Tuple[BlockAccess] = attr.ib(converter=tuple, default=())
     dirty_blocks: Tuple[DirtyBlockAccess] = attr.ib(converter=tuple, default=())
+    block_size: int = DEFAULT_BLOCK_SIZE
 
     def __attrs_post_init__(self):
         if not self.created:
@@ -64,6 +67,7 @@ class LocalFileManifest:
             updated=self.updated,
             size=self.size,
             blocks=self.blocks,
+            block_size=self.block_size,
             **data,
         )
 
@@ -80,6 +84,9 @@ class LocalFileManifestSchema(UnknownCheckedSchema):
     size = fields.Integer(required=True, validate=validate.Range(min=0))
     blocks = fields.List(fields.Nested(BlockAccessSchema), required=True)
     dirty_blocks = fields.List(fields.Nested(DirtyBlockAccessSchema), required=True)
+    block_size = fields.Integer(
+        missing=DEFAULT_BLOCK_SIZE, validate=validate.Range(min=1, max=MAX_BLOCK_SIZE)
+    )
 
     @post_load
     def make_obj(self, data):
@@ -172,6 +179,8 @@ local_folder_manifest_serializer = serializer_factory(LocalFolderManifestSchema)
 class LocalWorkspaceManifest(LocalFolderManifest):
     creator: UserID = None
     participants: Tuple[UserID] = attr.ib(converter=tuple, default=())
+    # None means block size is chosen according to each file's size
+    block_size: Optional[int] = None
 
     def __attrs_post_init__(self):
         super().__attrs_post_init__()
@@ -189,6 +198,7 @@ class LocalWorkspaceManifest(LocalFolderManifest):
             children=self.children,
             creator=self.creator,
             participants=self.participants,
+            block_size=self.block_size,
             **data,
         )
 
@@ -197,6 +207,9 @@ class LocalWorkspaceManifestSchema(LocalFolderManifestSchema):
     type = fields.CheckedConstant("local_workspace_manifest", required=True)
     creator = fields.UserID(required=True)
     participants = fields.List(fields.UserID(), required=True)
+    block_size = fields.Integer(
+        missing=None, allow_none=True, validate=validate.Range(min=1, max=MAX_BLOCK_SIZE)
+    )
 
     @post_load
     def make_obj(self, data):
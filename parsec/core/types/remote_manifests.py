@@ -1,12 +1,14 @@
 import attr
 import pendulum
-from typing import Tuple, Dict, Union
+from typing import Tuple, Dict, Union, Optional
 
 from parsec.types import DeviceID, UserID, FrozenDict
 from parsec.serde import UnknownCheckedSchema, OneOfSchema, fields, validate, post_load
 from parsec.core.types import local_manifests
 from parsec.core.types.base import EntryName, EntryNameField, serializer_factory
 from parsec.core.types.access import (
+    DEFAULT_BLOCK_SIZE,
+    MAX_BLOCK_SIZE,
     BlockAccess,
     ManifestAccess,
     BlockAccessSchema,
@@ -36,6 +38,7 @@ class FileManifest:
     updated: pendulum.Pendulum
     size: int
     blocks: Tuple[BlockAccess] = attr.ib(converter=tuple)
+    block_size: int = DEFAULT_BLOCK_SIZE
 
     def evolve(self, **data) -> "FileManifest":
         return attr.evolve(self, **data)
@@ -48,6 +51,7 @@ class FileManifest:
             updated=self.updated,
             size=self.size,
             blocks=self.blocks,
+            block_size=self.block_size,
             is_placeholder=False,
             need_sync=False,
         )
@@ -62,6 +66,9 @@ class FileManifestSchema(UnknownCheckedSchema):
     updated = fields.DateTime(required=True)
     size = fields.Integer(required=True, validate=validate.Range(min=0))
     blocks = fields.List(fields.Nested(BlockAccessSchema), required=True)
+    block_size = fields.Integer(
+        missing=DEFAULT_BLOCK_SIZE, validate=validate.Range(min=1, max=MAX_BLOCK_SIZE)
+    )
 
     @post_load
     def make_obj(self, data):
@@ -129,6 +136,8 @@ folder_manifest_serializer = serializer_factory(FolderManifestSchema)
 class WorkspaceManifest(FolderManifest):
     creator: UserID
     participants: Tuple[UserID]
+    # None means block size is chosen according to each file's size
+    block_size: Optional[int] = None
 
     def to_local(self) -> "local_manifests.LocalFolderManifest":
         return local_manifests.LocalWorkspaceManifest(
@@ -139,6 +148,7 @@ class WorkspaceManifest(FolderManifest):
             children=self.children,
             creator=self.creator,
             participants=self.participants,
+            block_size=self.block_size,
             is_placeholder=False,
             need_sync=False,
         )
@@ -148,6 +158,9 @@ class WorkspaceManifestSchema(FolderManifestSchema):
     type = fields.CheckedConstant("workspace_manifest", required=True)
     creator = fields.UserID(required=True)
     participants = fields.List(fields.UserID(), required=True)
+    block_size = fields.Integer(
+        missing=None, allow_none=True, validate=validate.Range(min=1, max=MAX_BLOCK_SIZE)
+    )
 
     @post_load
     def make_obj(self, data):
@@ -1,8 +1,10 @@
-from typing import Tuple, NewType, Optional
-import pendulum
+import time
+import struct
+from typing import Tuple, NewType, Optional, Sequence, List
+from hashlib import blake2b
 from secrets import token_hex
 from nacl.public import SealedBox
-from nacl.bindings import crypto_sign_BYTES
+from nacl.bindings import crypto_sign_BYTES, crypto_secretbox, crypto_secretbox_open
 from nacl.secret import SecretBox
 from nacl.utils import random
 from nacl.pwhash import argon2i
@@ -46,6 +48,16 @@ CRYPTO_OPSLIMIT = argon2i.OPSLIMIT_INTERACTIVE
 CRYPTO_MEMLIMIT = argon2i.MEMLIMIT_INTERACTIVE
 
 
+# Signed metadata are stored in a fixed binary layout: this version byte,
+# the timestamp (as a double), the length of the author's device id (0 if
+# signed by the root key), the device id and finally the signed content.
+# Unlike the legacy msgpack layout below, this version byte is never found
+# at the start of a msgpack map.
+SIGNED_METADATA_VERSION = b"\x01"
+_signed_metadata_header = struct.Struct("!cdB")
+
+
+# Legacy layout, still accepted when decoding
 class SignedMetadataSchema(UnknownCheckedSchema):
     # No device_id means it has been signed by the root key
     device_id = fields.DeviceID(missing=None)
@@ -71,6 +83,19 @@ def generate_secret_key():
     return random(SecretBox.KEY_SIZE)
 
 
+def derivate_convergent_secret_key(convergence_key: bytes, digest: bytes) -> bytes:
+    """
+    Derivate a secret key from the digest of the data to encrypt.
+
+    Data with the same digest encrypted with the same convergence key end up
+    with the same secret key, which allows deduplication without sharing
+    anything but the convergence key.
+    """
+    return blake2b(
+        digest, key=convergence_key, digest_size=SecretBox.KEY_SIZE, person=b"convergent-key"
+    ).digest()
+
+
 def derivate_secret_key_from_password(password: str, salt: bytes = None) -> Tuple[bytes, bytes]:
     salt = salt or random(argon2i.SALTBYTES)
     key = argon2i.kdf(
@@ -83,13 +108,17 @@ def derivate_secret_key_from_password(password: str, salt: bytes = None) -> Tupl
     return key, salt
 
 
+# Same layout than `SecretBox.encrypt`'s: nonce followed by the ciphertext,
+# but libsodium is called directly to skip the box creation.
+
+
 def encrypt_raw_with_secret_key(key: bytes, data: bytes) -> bytes:
     """
     Raises:
         CryptoError: if key is invalid.
     """
-    box = SecretBox(key)
-    return box.encrypt(data)
+    nonce = random(SecretBox.NONCE_SIZE)
+    return nonce + crypto_secretbox(data, nonce, key)
 
 
 def decrypt_raw_with_secret_key(key: bytes, ciphered: bytes) -> bytes:
@@ -97,8 +126,37 @@ def decrypt_raw_with_secret_key(key: bytes, ciphered: bytes) -> bytes:
     Raises:
         CryptoError: if key is invalid.
     """
-    box = SecretBox(key)
-    return box.decrypt(ciphered)
+    if len(ciphered) < SecretBox.NONCE_SIZE:
+        raise CryptoError("Ciphered data is too short")
+    return crypto_secretbox_open(
+        ciphered[SecretBox.NONCE_SIZE :], ciphered[: SecretBox.NONCE_SIZE], key
+    )
+
+
+def encrypt_raw_with_secret_key_batch(items: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+    """
+    Encrypt each (key, data) pair, libsodium releases the GIL so this is
+    meant to be run in a worker thread for bulk operations.
+
+    Raises:
+        CryptoError: if a key is invalid.
+    """
+    nonces = random(SecretBox.NONCE_SIZE * len(items))
+    ciphered = []
+    for i, (key, data) in enumerate(items):
+        nonce = nonces[i * SecretBox.NONCE_SIZE : (i + 1) * SecretBox.NONCE_SIZE]
+        ciphered.append(nonce + crypto_secretbox(data, nonce, key))
+    return ciphered
+
+
+def decrypt_raw_with_secret_key_batch(items: Sequence[Tuple[bytes, bytes]]) -> List[bytes]:
+    """
+    Decrypt each (key, ciphered) pair, see `encrypt_raw_with_secret_key_batch`.
+
+    Raises:
+        CryptoError: if a key is invalid or a data has been tampered.
+    """
+    return [decrypt_raw_with_secret_key(key, ciphered) for key, ciphered in items]
 
 
 def sign_and_add_meta(
@@ -108,13 +166,9 @@ def sign_and_add_meta(
     Raises:
         CryptoError: if the signature operation fails.
     """
-    return signed_metadata_serializer.dumps(
-        {
-            "device_id": device_id,
-            "timestamp": pendulum.now(),
-            "content": device_signkey.sign(signedmeta),
-        }
-    )
+    raw_device_id = device_id.encode("utf8") if device_id else b""
+    header = _signed_metadata_header.pack(SIGNED_METADATA_VERSION, time.time(), len(raw_device_id))
+    return header + raw_device_id + device_signkey.sign(signedmeta)
 
 
 def decode_signedmeta(signedmeta: bytes) -> Tuple[Optional[DeviceID], bytes]:
@@ -122,6 +176,24 @@ def decode_signedmeta(signedmeta: bytes) -> Tuple[Optional[DeviceID], bytes]:
     Raises:
         CryptoMetadataError: if the metadata cannot be extracted
     """
+    if signedmeta[:1] == SIGNED_METADATA_VERSION:
+        try:
+            _, _, device_id_size = _signed_metadata_header.unpack_from(signedmeta)
+            content_start = _signed_metadata_header.size + device_id_size
+            if len(signedmeta) < content_start:
+                raise ValueError("Truncated device id")
+            if device_id_size:
+                raw_device_id = signedmeta[_signed_metadata_header.size : content_start]
+                device_id = DeviceID(raw_device_id.decode("utf8"))
+            else:
+                device_id = None
+            return device_id, signedmeta[content_start:]
+
+        except (struct.error, ValueError) as exc:
+            raise CryptoMetadataError(
+                "Message doesn't contain author metadata along with signed message"
+            ) from exc
+
     try:
         meta = signed_metadata_serializer.loads(signedmeta)
         if meta["device_id"]:
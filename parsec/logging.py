@@ -1,10 +1,36 @@
 import re
+import random
 import structlog
 import logging
-from raven.handlers.logging import SentryHandler
 
 
-def configure_logging(log_level="WARNING", log_format="CONSOLE", log_file=None, log_filter=None):
+# Ratio of the messages whose payload is logged, see `payload_logging_enabled`
+_payload_sample_rate = 0
+
+
+def payload_logging_enabled() -> bool:
+    """
+    Payloads can be huge, so they are only logged (at DEBUG level) for a sample
+    of the messages. This must be checked before building anything to log.
+    """
+    rate = _payload_sample_rate
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _shorten_binary_fields(event_dict):
+    return {
+        k: v if not isinstance(v, bytes) else f"<{len(v)} bytes>" for k, v in event_dict.items()
+    }
+
+
+def configure_logging(
+    log_level="WARNING", log_format="CONSOLE", log_file=None, log_filter=None, log_payloads=0
+):
+    global _payload_sample_rate
+    if not 0 <= log_payloads <= 1:
+        raise ValueError("Payloads logging ratio must be between 0 and 1")
+    # Payloads are logged at DEBUG level, don't bother building them otherwise
+    _payload_sample_rate = log_payloads if log_level.upper() == "DEBUG" else 0
 
     shared_processors = [
         structlog.stdlib.add_logger_name,
@@ -17,7 +43,7 @@ def configure_logging(log_level="WARNING", log_format="CONSOLE", log_file=None,
         log_filter = re.compile(log_filter)
 
         def dropper(logger, method_name, event_dict):
-            if not log_filter.match(str(event_dict)):
+            if not log_filter.match(str(_shorten_binary_fields(event_dict))):
                 raise structlog.DropEvent
             return event_dict
 
@@ -58,6 +84,8 @@ def configure_logging(log_level="WARNING", log_format="CONSOLE", log_file=None,
 
 
 def configure_sentry_logging(sentry_url):
+    from raven.handlers.logging import SentryHandler
+
     sentry_handler = SentryHandler(sentry_url, level="WARNING")
     root_logger = logging.getLogger()
     root_logger.addHandler(sentry_handler)
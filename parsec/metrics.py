@@ -0,0 +1,193 @@
+import trio
+from bisect import bisect_left
+from typing import Tuple, Dict, List, Callable
+from contextlib import contextmanager
+
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DEFAULT_SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262_144, 1_048_576, 4_194_304)
+DEFAULT_DEPTH_BUCKETS = (0, 1, 5, 10, 25, 50, 75, 100)
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    formatted = ",".join(
+        '%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{%s}" % formatted
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _key(self, labels: dict) -> Tuple[Tuple[str, str], ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric `{self.name}` expects labels {self.labelnames}")
+        return tuple((k, labels[k]) for k in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.type}"
+        for labels, value in sorted(self._values.items()):
+            yield from self._render_sample(labels, value)
+
+    def _render_sample(self, labels, value):
+        yield f"{self.name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("Counter can only be incremented")
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """
+        Set the count directly, for counts maintained elsewhere (see
+        `MetricsRegistry.add_collector`).
+        """
+        self._values[self._key(labels)] = value
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size):
+        # Not cumulative, summed up when rendering
+        self.buckets = [0] * size
+        self.sum = 0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        try:
+            hv = self._values[key]
+        except KeyError:
+            hv = self._values[key] = _HistogramValue(len(self.buckets))
+        hv.buckets[bisect_left(self.buckets, value)] += 1
+        hv.sum += value
+        hv.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = trio.current_time()
+        try:
+            yield
+        finally:
+            self.observe(trio.current_time() - start, **labels)
+
+    def get(self, **labels) -> Tuple[int, float]:
+        """
+        Returns: number of observations and their sum
+        """
+        hv = self._values.get(self._key(labels))
+        return (hv.count, hv.sum) if hv else (0, 0)
+
+    def _render_sample(self, labels, hv):
+        cumulated = 0
+        for bound, count in zip(self.buckets, hv.buckets):
+            cumulated += count
+            bucket_labels = labels + (("le", _format_value(bound)),)
+            yield f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulated}"
+        yield f"{self.name}_sum{_format_labels(labels)} {_format_value(hv.sum)}"
+        yield f"{self.name}_count{_format_labels(labels)} {hv.count}"
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, rendered with the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric `{metric.name}` already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def __getitem__(self, name: str) -> _Metric:
+        return self._metrics[name]
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        `collector` is called before each rendering, to update the metrics
+        from stats kept by the components themselves.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for name in sorted(self._metrics):
+            lines += self._metrics[name].render()
+        return "\n".join(lines) + "\n"
@@ -46,7 +46,10 @@ def unpackb(raw_data: bytes, exc_cls=SerdePackingError) -> dict:
         return ExtType(code, data)
 
     try:
-        return msgpack_unpackb(raw_data, ext_hook=_ext_hook, raw=False)
+        # msgpack limits bin fields to 1Mo by default, which is too small for
+        # big blocks. Given the whole payload is already in memory, we can
+        # safely use its size as limit.
+        return msgpack_unpackb(raw_data, ext_hook=_ext_hook, raw=False, max_bin_len=len(raw_data))
 
     except (ExtraData, ValueError, FormatError, StackError) as exc:
         raise exc_cls(f"Invalid msgpack data: {exc}") from exc
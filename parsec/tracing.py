@@ -0,0 +1,223 @@
+import json
+import time
+import random
+from uuid import uuid4
+from functools import wraps
+from contextvars import ContextVar
+from structlog import get_logger
+
+
+__all__ = ("configure_tracing", "disable_tracing", "span", "traced", "MemorySink", "JSONLSink")
+
+
+logger = get_logger()
+
+
+class MemorySink:
+    """
+    Keep the finished spans in memory, mostly useful for tests.
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def emit(self, record: dict) -> None:
+        self.spans.append(record)
+
+    def close(self) -> None:
+        pass
+
+
+class JSONLSink:
+    """
+    Append the finished spans to a file, one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = open(path, "a", buffering=1, encoding="utf8")
+
+    def emit(self, record: dict) -> None:
+        self._fd.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        self._fd.close()
+
+
+class Tracer:
+    def __init__(self, sink, sample_rate: float = 1.0):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("Sample rate must be between 0 and 1")
+        self.sink = sink
+        self.sample_rate = sample_rate
+
+
+# Tracing is disabled as long as no tracer is configured
+_tracer = None
+# Span the current task is into, propagated to the child tasks by trio
+_current_span = ContextVar("current_span", default=None)
+# Marks the traces that have not been sampled, so their children are not sampled either
+_UNSAMPLED = object()
+
+
+def configure_tracing(sink, sample_rate: float = 1.0) -> None:
+    """
+    Start recording spans into `sink` (a `MemorySink` or `JSONLSink`), only
+    `sample_rate` of the traces are recorded.
+
+    Raises:
+        ValueError
+    """
+    global _tracer
+    disable_tracing()
+    _tracer = Tracer(sink, sample_rate)
+
+
+def disable_tracing() -> None:
+    global _tracer
+    if _tracer:
+        _tracer.sink.close()
+    _tracer = None
+
+
+def _new_id() -> str:
+    return uuid4().hex[:16]
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    sampled = False
+    request_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def set_tag(self, key, value) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    __slots__ = ("_token",)
+
+    def __enter__(self):
+        self._token = _current_span.set(_UNSAMPLED)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_span.reset(self._token)
+
+
+class Span:
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "tags",
+        "_start",
+        "_start_time",
+        "_token",
+    )
+
+    sampled = True
+
+    def __init__(self, tracer, name, trace_id, parent_id, tags):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.tags = tags
+
+    @property
+    def request_id(self) -> str:
+        """
+        Identify this span to the peer, which then attaches its own spans to it.
+        """
+        return f"{self.trace_id}-{self.span_id}"
+
+    def set_tag(self, key, value) -> None:
+        self.tags[key] = value
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self._start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self._start_time,
+            "duration": duration,
+            "tags": {k: str(v) for k, v in self.tags.items()},
+        }
+        if exc_type:
+            record["error"] = exc_type.__name__
+        try:
+            self.tracer.sink.emit(record)
+        except Exception:
+            # Tracing must never break the traced code
+            logger.exception("Cannot emit tracing span")
+
+
+def span(name: str, request_id: str = None, **tags):
+    """
+    Context manager recording a span, nested into the current one if any.
+
+    `request_id` is the peer's `Span.request_id`, the span is then nested
+    into the peer's one instead (the peer has sampled it already).
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP_SPAN
+
+    if request_id:
+        try:
+            trace_id, parent_id = request_id.split("-")
+        except (AttributeError, ValueError):
+            logger.warning("Invalid tracing request id", request_id=request_id)
+        else:
+            return Span(tracer, name, trace_id, parent_id, tags)
+
+    parent = _current_span.get()
+    if parent is _UNSAMPLED:
+        return _NOOP_SPAN
+
+    if parent is not None:
+        return Span(tracer, name, parent.trace_id, parent.span_id, tags)
+
+    if random.random() >= tracer.sample_rate:
+        return _UnsampledSpan()
+    return Span(tracer, name, _new_id(), None, tags)
+
+
+def traced(name: str):
+    """
+    Decorator recording a span around each call of a coroutine function.
+    """
+
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return await fn(*args, **kwargs)
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,10 @@
+import os
 import pytest
+import logging
+import structlog
+from time import perf_counter
 
+from parsec.logging import configure_logging
 from parsec.api.protocole import packb, unpackb
 
 
@@ -22,3 +27,45 @@ async def test_bad_cmd(alice_backend_sock):
 #     await alice_backend_sock.stream.send_all(b"\x00\x00\x00\x04fooo")
 #     rep = await alice_backend_sock.recv()
 #     assert unpackb(rep) == {"status": "invalid_msg_format", "reason": "Invalid message format"}
+
+
+@pytest.mark.trio
+async def test_payloads_not_built_by_default(monkeypatch, alice_backend_sock):
+    def _not_expected(data):
+        raise AssertionError("Payload should not be logged")
+
+    monkeypatch.setattr("parsec.backend.app._filter_binary_fields", _not_expected)
+    await alice_backend_sock.send(packb({"cmd": "ping", "ping": "42"}))
+    rep = await alice_backend_sock.recv()
+    assert unpackb(rep) == {"status": "ok", "pong": "42"}
+
+
+@pytest.fixture
+def warning_logging(monkeypatch):
+    root_logger = logging.getLogger()
+    handlers = root_logger.handlers.copy()
+    level = root_logger.level
+    configure_logging("WARNING", log_file=os.devnull)
+    yield
+    structlog.reset_defaults()
+    root_logger.handlers = handlers
+    root_logger.setLevel(level)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_ping_throughput_with_warning_logging_bench(
+    monkeypatch, warning_logging, alice_backend_sock
+):
+    async def _bench():
+        start = perf_counter()
+        for _ in range(2000):
+            await alice_backend_sock.send(packb({"cmd": "ping", "ping": "x" * 1000}))
+            await alice_backend_sock.recv()
+        return 2000 / (perf_counter() - start)
+
+    guarded = await _bench()
+    # Previous behavior: payloads were built whatever the log level
+    monkeypatch.setattr("parsec.logging._payload_sample_rate", 1)
+    unguarded = await _bench()
+    print(f"ping with WARNING logging: {guarded:.0f} req/s (payloads built: {unguarded:.0f} req/s)")
@@ -1,8 +1,9 @@
 import pytest
 from uuid import UUID
 import trio
+import trio.testing
 
-from parsec.api.protocole import beacon_read_serializer
+from parsec.api.protocole import beacon_read_serializer, beacon_get_head_serializer
 
 from tests.backend.test_events import events_subscribe, events_listen_nowait
 
@@ -35,10 +36,18 @@ async def beacon_read(sock, id, offset):
     return beacon_read_serializer.rep_loads(raw_rep)
 
 
+async def beacon_get_head(sock, id):
+    raw_rep = await sock.send(
+        beacon_get_head_serializer.req_dumps({"cmd": "beacon_get_head", "id": id})
+    )
+    raw_rep = await sock.recv()
+    return beacon_get_head_serializer.rep_loads(raw_rep)
+
+
 @pytest.mark.trio
 async def test_beacon_read_any(alice_backend_sock):
     rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 0)
-    assert rep == {"status": "ok", "items": []}
+    assert rep == {"status": "ok", "index": 0, "items": []}
 
 
 @pytest.mark.trio
@@ -56,6 +65,7 @@ async def test_beacon_multimessages(backend, alice_backend_sock, alice, vlob_ids
     rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 0)
     assert rep == {
         "status": "ok",
+        "index": 3,
         "items": [
             {"src_id": vlob_ids[0], "src_version": 1},
             {"src_id": vlob_ids[1], "src_version": 2},
@@ -65,7 +75,20 @@ async def test_beacon_multimessages(backend, alice_backend_sock, alice, vlob_ids
 
     # Also test offset
     rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 2)
-    assert rep == {"status": "ok", "items": [{"src_id": vlob_ids[2], "src_version": 3}]}
+    assert rep == {"status": "ok", "index": 3, "items": [{"src_id": vlob_ids[2], "src_version": 3}]}
+
+
+@pytest.mark.trio
+async def test_beacon_get_head(backend, alice_backend_sock, alice, vlob_ids):
+    rep = await beacon_get_head(alice_backend_sock, BEACON_ID_1)
+    assert rep == {"status": "ok", "index": 0}
+
+    for version, vlob_id in enumerate(vlob_ids, 1):
+        await backend.beacon.update(
+            alice.organization_id, BEACON_ID_1, src_id=vlob_id, src_version=version, author="alice"
+        )
+    rep = await beacon_get_head(alice_backend_sock, BEACON_ID_1)
+    assert rep == {"status": "ok", "index": 3}
 
 
 @pytest.mark.trio
@@ -84,7 +107,7 @@ async def test_beacon_in_vlob_update(backend, alice_backend_sock, alice):
     )
 
     rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 0)
-    assert rep == {"status": "ok", "items": [{"src_id": VLOB_ID, "src_version": 2}]}
+    assert rep == {"status": "ok", "index": 1, "items": [{"src_id": VLOB_ID, "src_version": 2}]}
 
 
 @pytest.mark.trio
@@ -100,7 +123,7 @@ async def test_beacon_in_vlob_create(backend, alice_backend_sock, alice):
     )
 
     rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 0)
-    assert rep == {"status": "ok", "items": [{"src_id": VLOB_ID, "src_version": 1}]}
+    assert rep == {"status": "ok", "index": 1, "items": [{"src_id": VLOB_ID, "src_version": 1}]}
 
 
 @pytest.mark.trio
@@ -175,3 +198,71 @@ async def test_beacon_updated_event(backend, alice_backend_sock, vlob_ids, alice
     )
     rep = await events_listen_nowait(alice_backend_sock)
     assert rep == {"status": "no_events"}
+
+
+@pytest.mark.trio
+async def test_beacon_compaction(backend, alice_backend_sock, alice, vlob_ids):
+    for src_id, src_version in [
+        (vlob_ids[0], 1),
+        (vlob_ids[1], 1),
+        (vlob_ids[0], 2),
+        (vlob_ids[2], 1),
+        (vlob_ids[0], 3),
+    ]:
+        await backend.beacon.update(
+            alice.organization_id, BEACON_ID_1, src_id, src_version, author="bob"
+        )
+    await backend.beacon.update(alice.organization_id, BEACON_ID_2, vlob_ids[0], 1, author="bob")
+
+    assert await backend.beacon.compact() == 2
+
+    # Only the latest version of each src remains, in the original order
+    rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 0)
+    assert rep == {
+        "status": "ok",
+        "index": 5,
+        "items": [
+            {"src_id": vlob_ids[1], "src_version": 1},
+            {"src_id": vlob_ids[2], "src_version": 1},
+            {"src_id": vlob_ids[0], "src_version": 3},
+        ],
+    }
+    rep = await beacon_read(alice_backend_sock, BEACON_ID_2, 0)
+    assert rep == {"status": "ok", "index": 1, "items": [{"src_id": vlob_ids[0], "src_version": 1}]}
+
+    # Offsets are still beacon indexes
+    rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 2)
+    assert rep == {
+        "status": "ok",
+        "index": 5,
+        "items": [
+            {"src_id": vlob_ids[2], "src_version": 1},
+            {"src_id": vlob_ids[0], "src_version": 3},
+        ],
+    }
+    await backend.beacon.update(alice.organization_id, BEACON_ID_1, vlob_ids[1], 2, author="bob")
+    rep = await beacon_read(alice_backend_sock, BEACON_ID_1, 5)
+    assert rep == {"status": "ok", "index": 6, "items": [{"src_id": vlob_ids[1], "src_version": 2}]}
+
+    assert await backend.beacon.compact() == 1
+
+
+@pytest.mark.trio
+async def test_beacon_compaction_job(mock_clock, backend_factory):
+    async with backend_factory(config={"BEACON_COMPACTION_PERIOD": "10"}) as backend:
+        compactions = 0
+        vanilla_compact = backend.beacon.compact
+
+        async def _spied_compact():
+            nonlocal compactions
+            compactions += 1
+            return await vanilla_compact()
+
+        backend.beacon.compact = _spied_compact
+
+        mock_clock.jump(9)
+        await trio.testing.wait_all_tasks_blocked()
+        assert compactions == 0
+        mock_clock.jump(2)
+        await trio.testing.wait_all_tasks_blocked()
+        assert compactions == 1
@@ -0,0 +1,177 @@
+import pytest
+
+from parsec.api.protocole import HandshakeRevokedDevice
+from parsec.backend.user import UserNotFoundError
+from parsec.backend.organization import OrganizationNotFoundError
+
+
+def _spy_calls(component, method_name):
+    calls = []
+    vanilla = getattr(component, method_name)
+
+    async def _spied(*args):
+        calls.append(args)
+        return await vanilla(*args)
+
+    setattr(component, method_name, _spied)
+    return calls
+
+
+@pytest.mark.trio
+async def test_cache_read_through(backend, alice, bob):
+    get_user_calls = _spy_calls(backend.user, "get_user")
+    get_org_calls = _spy_calls(backend.organization, "get")
+
+    for _ in range(3):
+        user = await backend.cache.get_user(alice.organization_id, alice.user_id)
+        assert user.user_id == alice.user_id
+        organization = await backend.cache.get_organization(alice.organization_id)
+        assert organization.root_verify_key == alice.root_verify_key
+    await backend.cache.get_user(bob.organization_id, bob.user_id)
+
+    assert len(get_user_calls) == 2
+    assert len(get_org_calls) == 1
+    assert backend.cache.stats.hits == 4
+    assert backend.cache.stats.misses == 3
+    assert backend.cache.stats.hit_ratio == pytest.approx(4 / 7)
+
+
+@pytest.mark.trio
+async def test_cache_not_found(backend, alice):
+    get_user_calls = _spy_calls(backend.user, "get_user")
+
+    for _ in range(2):
+        with pytest.raises(UserNotFoundError):
+            await backend.cache.get_user(alice.organization_id, "zack")
+        with pytest.raises(OrganizationNotFoundError):
+            await backend.cache.get_organization("DummyOrg")
+    assert len(get_user_calls) == 1
+
+
+@pytest.mark.trio
+async def test_cache_ttl(mock_clock, backend_factory, alice):
+    async with backend_factory(config={"CACHE_TTL": "10"}) as backend:
+        get_user_calls = _spy_calls(backend.user, "get_user")
+
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        mock_clock.jump(9)
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        assert len(get_user_calls) == 1
+
+        mock_clock.jump(2)
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        assert len(get_user_calls) == 2
+
+
+@pytest.mark.trio
+async def test_cache_bounded(mock_clock, backend_factory, alice):
+    async with backend_factory(config={"CACHE_TTL": "10", "CACHE_SIZE": "3"}) as backend:
+        # Clients with random identities must not make the cache grow forever
+        for i in range(10):
+            with pytest.raises(UserNotFoundError):
+                await backend.cache.get_user(alice.organization_id, f"zack{i}")
+        assert len(backend.cache._users) == 3
+
+        # Expired entries are swept even if never accessed again
+        mock_clock.jump(11)
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        assert len(backend.cache._users) == 1
+
+
+@pytest.mark.trio
+async def test_cache_lookup_event(backend, alice):
+    with backend.event_bus.listen() as spy:
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+
+    spy.assert_events_occured(
+        [
+            ("backend.cache.lookup", {"store": "user", "hit": False, "latency": spy.ANY}),
+            ("backend.cache.lookup", {"store": "user", "hit": True, "latency": spy.ANY}),
+        ]
+    )
+
+
+@pytest.mark.trio
+async def test_cache_lookup_metrics(backend_factory, alice):
+    async with backend_factory(config={"METRICS_PORT": "0"}) as backend:
+        for _ in range(3):
+            await backend.cache.get_user(alice.organization_id, alice.user_id)
+
+        metrics = backend.metrics
+        assert metrics.cache_lookups.get(store="user", result="miss") == 1
+        assert metrics.cache_lookups.get(store="user", result="hit") == 2
+        assert metrics.cache_lookup_duration.get(store="user", result="hit")[0] == 2
+        assert metrics.cache_hit_ratio.get() == pytest.approx(2 / 3)
+        assert 'parsec_backend_cache_lookups_total{store="user",result="hit"} 2' in (
+            metrics.render()
+        )
+
+
+@pytest.mark.trio
+async def test_cache_disabled(backend_factory, alice):
+    async with backend_factory(config={"CACHE_TTL": "0"}) as backend:
+        get_user_calls = _spy_calls(backend.user, "get_user")
+
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        await backend.cache.get_user(alice.organization_id, alice.user_id)
+        assert len(get_user_calls) == 2
+
+
+@pytest.mark.trio
+async def test_cache_invalidation(backend, backend_data_binder, local_device_factory, alice, bob):
+    await backend.cache.get_user(alice.organization_id, alice.user_id)
+    _, trustchain = await backend.cache.get_user_with_trustchain(bob.organization_id, bob.user_id)
+    assert not trustchain[alice.device_id].revocated_on
+
+    # New user
+    zack = local_device_factory("zack@dev1")
+    with pytest.raises(UserNotFoundError):
+        await backend.cache.get_user(zack.organization_id, zack.user_id)
+    with backend.event_bus.listen() as spy:
+        await backend_data_binder.bind_device(zack)
+        await spy.wait(
+            "user.created",
+            kwargs={"organization_id": zack.organization_id, "user_id": zack.user_id},
+        )
+    user = await backend.cache.get_user(zack.organization_id, zack.user_id)
+    assert user.user_id == zack.user_id
+
+    # New device
+    alice3 = local_device_factory("alice@dev3")
+    with backend.event_bus.listen() as spy:
+        await backend_data_binder.bind_device(alice3)
+        await spy.wait("device.created", kwargs=spy.ANY)
+    user = await backend.cache.get_user(alice.organization_id, alice.user_id)
+    assert alice3.device_name in user.devices
+
+    # Revoked device is in bob's trustchain
+    with backend.event_bus.listen() as spy:
+        await backend_data_binder.bind_revocation(alice3, certifier=alice)
+        await backend_data_binder.bind_revocation(alice, certifier=alice3)
+        await spy.wait(
+            "device.revoked",
+            kwargs={"organization_id": alice.organization_id, "device_id": alice.device_id},
+        )
+    user = await backend.cache.get_user(alice.organization_id, alice.user_id)
+    assert user.devices[alice.device_name].revocated_on
+    _, trustchain = await backend.cache.get_user_with_trustchain(bob.organization_id, bob.user_id)
+    assert trustchain[alice.device_id].revocated_on
+
+
+@pytest.mark.trio
+async def test_handshake_uses_cache(backend, backend_data_binder, backend_sock_factory, alice, bob):
+    get_user_calls = _spy_calls(backend.user, "get_user")
+
+    for _ in range(3):
+        async with backend_sock_factory(backend, alice):
+            pass
+    assert len(get_user_calls) == 1
+
+    # Revoked device can no longer connect
+    with backend.event_bus.listen() as spy:
+        await backend_data_binder.bind_revocation(alice, certifier=bob)
+        await spy.wait("device.revoked", kwargs=spy.ANY)
+    with pytest.raises(HandshakeRevokedDevice):
+        async with backend_sock_factory(backend, alice):
+            pass
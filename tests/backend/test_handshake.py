@@ -1,7 +1,10 @@
 import pytest
+import trio
+import trio.testing
+from time import perf_counter
 
 from parsec.api.protocole import packb, unpackb
-from parsec.api.transport import Transport
+from parsec.api.transport import Transport, TransportError
 from parsec.api.protocole.handshake import (
     ClientHandshake,
     AnonymousClientHandshake,
@@ -84,3 +87,88 @@ async def test_handshake_mismatch_rvc(
         result_req = await transport.recv()
         with pytest.raises(HandshakeRVKMismatch):
             ch.process_result_req(result_req)
+
+
+@pytest.mark.trio
+async def test_handshake_bad_signature(backend, server_factory, alice, bob):
+    # Answer signed by bob's key while pretending to be alice
+    ch = ClientHandshake(
+        alice.organization_id, alice.device_id, bob.signing_key, alice.root_verify_key
+    )
+    async with server_factory(backend.handle_client) as server:
+        stream = server.connection_factory()
+        transport = await Transport.init_for_client(stream, server.addr)
+
+        challenge_req = await transport.recv()
+        await transport.send(ch.process_challenge_req(challenge_req))
+        result_req = await transport.recv()
+        assert unpackb(result_req) == {"handshake": "result", "result": "bad_format"}
+
+
+async def _handshake(server, device):
+    ch = ClientHandshake(
+        device.organization_id, device.device_id, device.signing_key, device.root_verify_key
+    )
+    stream = server.connection_factory()
+    transport = await Transport.init_for_client(stream, server.addr)
+    challenge_req = await transport.recv()
+    await transport.send(ch.process_challenge_req(challenge_req))
+    ch.process_result_req(await transport.recv())
+    return transport
+
+
+@pytest.mark.trio
+async def test_handshake_silent_client_dont_block_others(backend_factory, server_factory, bob):
+    config = {"HANDSHAKE_MAX_CONCURRENCY": "1", "HANDSHAKE_TIMEOUT": "0.5"}
+    async with backend_factory(config=config) as backend:
+        async with server_factory(backend.handle_client) as server:
+            # First client got its challenge but never answers
+            stream = server.connection_factory()
+            silent_transport = await Transport.init_for_client(stream, server.addr)
+            await silent_transport.recv()
+
+            # Waiting for an answer doesn't hold the admission limiter
+            with trio.fail_after(0.4):
+                transport = await _handshake(server, bob)
+            await transport.aclose()
+
+            # Until the silent client is disconnected
+            with trio.fail_after(1):
+                with pytest.raises(TransportError):
+                    await silent_transport.recv()
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_handshake_reconnect_storm_bench(backend, server_factory, alice, bob):
+    latencies = []
+    connected = []
+    async with server_factory(backend.handle_client) as server:
+        transport = await _handshake(server, alice)
+
+        async def _reconnect():
+            connected.append(await _handshake(server, bob))
+
+        async def _reconnect_storm():
+            async with trio.open_nursery() as nursery:
+                for _ in range(1000):
+                    nursery.start_soon(_reconnect)
+
+        storm_done = False
+        async with trio.open_nursery() as nursery:
+
+            async def _storm():
+                nonlocal storm_done
+                await _reconnect_storm()
+                storm_done = True
+
+            nursery.start_soon(_storm)
+            while not storm_done:
+                start = perf_counter()
+                await transport.send(packb({"cmd": "ping", "ping": "foo"}))
+                assert unpackb(await transport.recv())["status"] == "ok"
+                latencies.append(perf_counter() - start)
+
+    # Every client got in, and the already connected one kept being served
+    assert len(connected) == 1000
+    assert len(latencies) > 1
@@ -53,6 +53,25 @@ async def test_message_get_with_offset(alice, bob, alice_backend_sock, bob_backe
     }
 
 
+@pytest.mark.trio
+async def test_message_index_is_per_recipient(alice, bob, alice_backend_sock, bob_backend_sock):
+    await events_subscribe(alice_backend_sock, message_received=True)
+    for i in range(3):
+        # Messages to other recipients don't take up alice's indexes
+        await message_send(alice_backend_sock, bob.user_id, b"to bob")
+        async with events_listen(alice_backend_sock) as listen:
+            await message_send(bob_backend_sock, alice.user_id, f"{i}".encode())
+        assert listen.rep == {"status": "ok", "event": "message.received", "index": i + 1}
+
+    rep = await message_get(alice_backend_sock, 2)
+    assert rep == {
+        "status": "ok",
+        "messages": [{"body": b"2", "sender": bob.device_id, "count": 3}],
+    }
+    rep = await message_get(alice_backend_sock, 3)
+    assert rep == {"status": "ok", "messages": []}
+
+
 @pytest.mark.trio
 @pytest.mark.postgresql
 async def test_message_from_bob_to_alice_multi_backends(
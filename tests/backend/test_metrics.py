@@ -0,0 +1,131 @@
+import pytest
+import trio
+from uuid import uuid4
+
+from parsec.api.protocole import packb
+from parsec.backend.metrics import MetricsRegistry
+
+from tests.backend.test_events import ping, events_subscribe
+
+
+def test_metrics_exposition_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Number of requests", ("cmd",))
+    connections = registry.gauge("connections", "Number of connections")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+
+    requests.inc(cmd="ping")
+    requests.inc(2, cmd='we"ird')
+    connections.inc()
+    connections.inc()
+    connections.dec()
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(5)
+
+    assert registry.render() == (
+        "# HELP connections Number of connections\n"
+        "# TYPE connections gauge\n"
+        "connections 1\n"
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 5.55\n"
+        "latency_seconds_count 3\n"
+        "# HELP requests_total Number of requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{cmd="ping"} 1\n'
+        'requests_total{cmd="we\\"ird"} 2\n'
+    )
+
+    with pytest.raises(ValueError):
+        requests.inc()
+    with pytest.raises(ValueError):
+        requests.inc(-1, cmd="ping")
+    with pytest.raises(ValueError):
+        registry.counter("requests_total", "Duplicated")
+
+
+def test_metrics_collector():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Number of requests")
+    stats = {"requests": 0}
+    registry.add_collector(lambda: requests.set_total(stats["requests"]))
+
+    stats["requests"] = 42
+    assert "requests_total 42\n" in registry.render()
+    stats["requests"] = 43
+    assert "requests_total 43\n" in registry.render()
+
+
+@pytest.mark.trio
+async def test_metrics_disabled_by_default(backend):
+    assert backend.metrics is None
+    assert backend.events.metrics is None
+
+
+async def _http_get(listener, path):
+    # `trio.open_tcp_stream` is mocked by the tests
+    sock = trio.socket.socket()
+    await sock.connect(listener.socket.getsockname())
+    stream = trio.SocketStream(sock)
+    async with stream:
+        await stream.send_all(b"GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n" % path)
+        rep = b""
+        with trio.fail_after(1):
+            while True:
+                data = await stream.receive_some(4096)
+                if not data:
+                    break
+                rep += data
+    headers, _, body = rep.partition(b"\r\n\r\n")
+    return headers.split(b"\r\n", 1)[0], body.decode("utf8")
+
+
+@pytest.mark.trio
+async def test_metrics_exposed(backend_factory, backend_sock_factory, alice, bob):
+    async with backend_factory(config={"METRICS_PORT": "0"}) as backend:
+        metrics = backend.metrics
+        async with backend_sock_factory(backend, alice) as sock:
+            await ping(sock)
+            await ping(sock)
+            await sock.send(packb({"cmd": "dummy"}))
+            await sock.recv()
+            assert metrics.connections.get() == 1
+
+            await events_subscribe(sock, pinged=["foo"])
+            # Client doesn't listen, so its events queue ends up full
+            for _ in range(101):
+                backend.event_bus.send(
+                    "pinged", organization_id=bob.organization_id, author=bob.device_id, ping="foo"
+                )
+
+        assert metrics.cmd_duration.get(cmd="ping")[0] == 2
+        assert metrics.cmd_request_size.get(cmd="ping")[0] == 2
+        assert metrics.cmd_errors.get(cmd="<unknown>", status="unknown_command") == 1
+        assert metrics.event_queue_full.get(event="pinged") == 1
+        assert metrics.event_queue_depth.get()[0] == 100
+
+        status, body = await _http_get(backend.metrics_listeners[0], b"/metrics")
+        assert status == b"HTTP/1.1 200 OK"
+        assert body == metrics.render()
+        assert 'parsec_backend_cmd_duration_seconds_count{cmd="ping"} 2\n' in body
+        assert 'parsec_backend_event_queue_full_total{event="pinged"} 1\n' in body
+
+        status, _ = await _http_get(backend.metrics_listeners[0], b"/dummy")
+        assert status == b"HTTP/1.1 404 Not Found"
+
+
+@pytest.mark.trio
+async def test_blockstore_metrics(backend_factory, alice):
+    async with backend_factory(config={"METRICS_PORT": "0"}) as backend:
+        driver = backend.config.blockstore_config.type
+        block_id = uuid4()
+        await backend.blockstore.create(alice.organization_id, block_id, b"foo", alice.device_id)
+        await backend.blockstore.read(alice.organization_id, block_id)
+
+        histogram = backend.metrics.blockstore_duration
+        assert histogram.get(driver=driver, operation="create")[0] == 1
+        assert histogram.get(driver=driver, operation="read")[0] == 1
@@ -273,6 +273,54 @@ async def test_group_check(alice_backend_sock, vlobs):
     }
 
 
+@pytest.mark.trio
+@pytest.mark.postgresql
+async def test_group_check_with_temp_table(monkeypatch, backend, alice_backend_sock, alice):
+    from parsec.backend.drivers.postgresql.vlob import (
+        PGVlobComponent,
+        GROUP_CHECK_TEMP_TABLE_THRESHOLD,
+    )
+
+    temp_table_checks = []
+    vanilla_group_check_with_temp_table = PGVlobComponent._group_check_with_temp_table
+
+    async def _spied_group_check_with_temp_table(conn, organization_id, ids):
+        temp_table_checks.append(len(ids))
+        return await vanilla_group_check_with_temp_table(conn, organization_id, ids)
+
+    monkeypatch.setattr(
+        PGVlobComponent,
+        "_group_check_with_temp_table",
+        staticmethod(_spied_group_check_with_temp_table),
+    )
+
+    # Unknown id is ignored
+    to_check = [{"id": VLOB_ID, "rts": VLOB_RTS, "version": 1}]
+    expected_changed = []
+    for i in range(GROUP_CHECK_TEMP_TABLE_THRESHOLD + 10):
+        id = uuid4()
+        await backend.vlob.create(
+            alice.organization_id, id, VLOB_RTS, VLOB_WTS, b"v1", author=alice.device_id
+        )
+        if i % 3:
+            # Bad rts is ignored
+            rts = VLOB_RTS if i % 2 else "<bad rts>"
+        else:
+            await backend.vlob.update(
+                alice.organization_id, id, VLOB_WTS, 2, b"v2", author=alice.device_id
+            )
+            rts = VLOB_RTS
+            expected_changed.append({"id": id, "version": 2})
+        to_check.append({"id": id, "rts": rts, "version": 1})
+
+    rep = await vlob_group_check(alice_backend_sock, to_check)
+    assert rep["status"] == "ok"
+    assert sorted(rep["changed"], key=lambda x: x["id"]) == sorted(
+        expected_changed, key=lambda x: x["id"]
+    )
+    assert temp_table_checks == [len(to_check)]
+
+
 @pytest.mark.trio
 async def test_vlob_group_check_other_organization(
     backend, sock_from_other_organization_factory, vlobs
@@ -1,8 +1,11 @@
 import pytest
 from unittest.mock import ANY
 from pendulum import Pendulum
+from time import perf_counter
 
+from parsec.types import UserID
 from parsec.api.protocole import packb, user_get_serializer, user_find_serializer
+from parsec.backend.user import User
 
 from tests.common import freeze_time
 
@@ -255,3 +258,89 @@ async def test_api_user_find(access_testbed, organization_factory, local_device_
         raw_rep = await sock.recv()
         rep = user_find_serializer.rep_loads(raw_rep)
         assert rep["status"] == "bad_message"
+
+
+async def _create_users(backend, org, user_ids):
+    # Users are not certified, only their ids matter to `user_find`
+    for user_id in user_ids:
+        user = User(user_id=UserID(user_id), certified_user=b"", user_certifier=None)
+        await backend.user.create_user(org.organization_id, user)
+
+
+@pytest.mark.trio
+async def test_api_user_find_pagination(access_testbed):
+    binder, org, godfrey1, sock = access_testbed
+    user_ids = [f"{prefix}{i:03}" for prefix in ("alice", "Bob", "bobby") for i in range(50)]
+    await _create_users(binder.backend, org, user_ids)
+
+    # Pages split the case insensitive ordering without holes nor duplicates
+    found = []
+    for page in range(1, 5):
+        rep = await user_find(sock, query="bob", page=page, per_page=15)
+        assert rep["total"] == 50
+        found += rep["results"]
+    assert found == [f"bobby{i:03}" for i in range(50)]
+
+    rep = await user_find(sock, page=2, per_page=100)
+    assert rep["total"] == 151
+    assert rep["results"] == sorted(["Godfrey", *user_ids], key=str.lower)[100:]
+
+    rep = await user_find(sock, query="bob", page=5, per_page=15)
+    assert rep == {"status": "ok", "results": [], "per_page": 15, "page": 5, "total": 50}
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_api_user_find_bench(access_testbed):
+    binder, org, godfrey1, sock = access_testbed
+    await _create_users(binder.backend, org, (f"user{i:06}" for i in range(100_000)))
+
+    for query in (None, "user05", "user0999"):
+        start = perf_counter()
+        rep = await user_find(sock, query=query, page=10, per_page=100)
+        elapsed = perf_counter() - start
+        assert rep["status"] == "ok"
+        print(f"user_find {query!r} among 100k users: {elapsed * 1000:.2f}ms")
+
+
+async def _bind_long_trustchain(access_testbed, local_device_factory, chain_length):
+    binder, org, godfrey1, sock = access_testbed
+
+    # <root> --> godfrey@dev1 --> admin0@dev1 --> ... --> adminN@dev1 --> roger@dev1
+    certifier = godfrey1
+    for i in range(chain_length):
+        admin = local_device_factory(f"admin{i}@dev1", org)
+        await binder.bind_device(admin, certifier=certifier)
+        certifier = admin
+    roger1 = local_device_factory("roger@dev1", org)
+    await binder.bind_device(roger1, certifier=certifier)
+    return roger1
+
+
+@pytest.mark.trio
+async def test_api_user_get_long_trustchain(access_testbed, local_device_factory):
+    _, _, godfrey1, sock = access_testbed
+    roger1 = await _bind_long_trustchain(access_testbed, local_device_factory, 10)
+
+    rep = await user_get(sock, roger1.user_id)
+    assert rep["status"] == "ok"
+    assert rep["trustchain"].keys() == {godfrey1.device_id, *(f"admin{i}@dev1" for i in range(10))}
+    assert rep["trustchain"][godfrey1.device_id]["device_certifier"] is None
+    for i in range(10):
+        expected_certifier = f"admin{i - 1}@dev1" if i else godfrey1.device_id
+        assert rep["trustchain"][f"admin{i}@dev1"]["device_certifier"] == expected_certifier
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_api_user_get_long_trustchain_bench(access_testbed, local_device_factory):
+    _, _, godfrey1, sock = access_testbed
+    roger1 = await _bind_long_trustchain(access_testbed, local_device_factory, 200)
+
+    start = perf_counter()
+    rep = await user_get(sock, roger1.user_id)
+    elapsed = perf_counter() - start
+
+    assert rep["status"] == "ok"
+    assert len(rep["trustchain"]) == 201
+    print(f"user_get with a 200 long trustchain: {elapsed * 1000:.2f}ms")
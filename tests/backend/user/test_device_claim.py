@@ -84,8 +84,10 @@ async def test_device_claim_ok(backend, anonymous_backend_sock, alice, alice_nd_
             encrypted_claim=b"<foo>",
         ) as prep:
 
+            # `device.created` is also listened by the backend cache, so wait
+            # for the other event connected along with it by the claim command
             await backend.event_bus.spy.wait(
-                "event.connected", kwargs={"event_name": "device.created"}
+                "event.connected", kwargs={"event_name": "device.invitation.cancelled"}
             )
             backend.event_bus.send(
                 "device.created",
@@ -113,8 +115,10 @@ async def test_device_claim_timeout(
             encrypted_claim=b"<foo>",
         ) as prep:
 
+            # `device.created` is also listened by the backend cache, so wait
+            # for the other event connected along with it by the claim command
             await backend.event_bus.spy.wait(
-                "event.connected", kwargs={"event_name": "device.created"}
+                "event.connected", kwargs={"event_name": "device.invitation.cancelled"}
             )
             mock_clock.jump(PEER_EVENT_MAX_WAIT + 1)
 
@@ -79,8 +79,10 @@ async def test_user_claim_ok(backend, anonymous_backend_sock, coolorg, mallory_i
             encrypted_claim=b"<foo>",
         ) as prep:
 
+            # `user.created` is also listened by the backend cache, so wait
+            # for the other event connected along with it by the claim command
             await backend.event_bus.spy.wait(
-                "event.connected", kwargs={"event_name": "user.created"}
+                "event.connected", kwargs={"event_name": "user.invitation.cancelled"}
             )
             backend.event_bus.send(
                 "user.created", organization_id=coolorg.organization_id, user_id="dummy"
@@ -103,8 +105,10 @@ async def test_user_claim_timeout(mock_clock, backend, anonymous_backend_sock, m
             encrypted_claim=b"<foo>",
         ) as prep:
 
+            # `user.created` is also listened by the backend cache, so wait
+            # for the other event connected along with it by the claim command
             await backend.event_bus.spy.wait(
-                "event.connected", kwargs={"event_name": "user.created"}
+                "event.connected", kwargs={"event_name": "user.invitation.cancelled"}
             )
             mock_clock.jump(PEER_EVENT_MAX_WAIT + 1)
 
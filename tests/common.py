@@ -26,7 +26,19 @@ class InMemoryLocalDB(LocalDB):
         self._data[access.id] = raw
 
     def clear(self, access):
-        del self._data[access.id]
+        try:
+            del self._data[access.id]
+        except KeyError:
+            raise LocalDBMissingEntry(access)
+
+    async def get_async(self, access):
+        return self.get(access)
+
+    async def set_async(self, access, raw: bytes, deletable=False):
+        self.set(access, raw, deletable)
+
+    async def flush(self):
+        pass
 
 
 def freeze_time(time):
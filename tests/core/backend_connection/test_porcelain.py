@@ -1,7 +1,12 @@
 import pytest
 import trio
+import trio.testing
 
 from parsec.core.backend_connection import BackendNotAvailable, backend_cmds_factory
+from parsec.core.config import config_factory
+from parsec.core.metrics import CoreMetrics
+from parsec.core.backend_connection import transport as transport_module
+from parsec.core.backend_connection.transport import _get_ssl_config
 
 from tests.open_tcp_stream_mock_wrapper import offline
 
@@ -81,3 +86,174 @@ async def test_concurrency_sends(running_backend, alice):
 
         with trio.fail_after(1):
             await work_all_done.wait()
+
+
+@pytest.mark.trio
+async def test_keepalive(mock_clock, running_backend, alice, tcp_stream_spy):
+    async with backend_cmds_factory(
+        alice.organization_addr, alice.device_id, alice.signing_key, keepalive=10
+    ) as cmds:
+        stats = cmds.transport_pool.stats
+        await cmds.ping("Hello World !")
+        assert stats.connections == 1
+
+        mock_clock.jump(9)
+        await trio.testing.wait_all_tasks_blocked()
+        assert stats.keepalive_pings == 0
+
+        # Idle connection is kept open by the ping
+        mock_clock.jump(1)
+        await trio.testing.wait_all_tasks_blocked()
+        assert stats.keepalive_pings == 1
+        assert stats.keepalive_failures == 0
+        await cmds.ping("Hello World !")
+        assert stats.connections == 1
+
+        # Dead connection is dropped instead
+        async def _broken_send_stream():
+            raise trio.BrokenResourceError("Huho!")
+
+        tcp_stream_spy.get_socks(alice.organization_addr)[
+            -1
+        ].send_stream.send_all_hook = _broken_send_stream
+        mock_clock.jump(10)
+        await trio.testing.wait_all_tasks_blocked()
+        assert stats.keepalive_pings == 2
+        assert stats.keepalive_failures == 1
+        assert not cmds.transport_pool.transports
+
+        await cmds.ping("Hello World !")
+        assert stats.connections == 2
+
+
+def test_ssl_config_is_cached(monkeypatch):
+    monkeypatch.delenv("SSL_KEYFILE", raising=False)
+    monkeypatch.delenv("SSL_CERTFILE", raising=False)
+    ssl_config = _get_ssl_config("parsec.example.com", 443)
+    assert _get_ssl_config("parsec.example.com", 443) is ssl_config
+    assert _get_ssl_config("parsec.example.com", 8443) is not ssl_config
+
+
+def _break_last_sock(tcp_stream_spy, addr):
+    async def _broken_send_stream():
+        raise trio.BrokenResourceError("Huho!")
+
+    tcp_stream_spy.get_socks(addr)[-1].send_stream.send_all_hook = _broken_send_stream
+
+
+@pytest.mark.trio
+async def test_stale_connection_is_checked_before_reuse(
+    mock_clock, running_backend, alice, tcp_stream_spy
+):
+    async with backend_cmds_factory(
+        alice.organization_addr, alice.device_id, alice.signing_key
+    ) as cmds:
+        stats = cmds.transport_pool.stats
+        await cmds.ping("Hello World !")
+
+        # Connection closed while idle is detected and replaced, even for
+        # commands that cannot be retried
+        _break_last_sock(tcp_stream_spy, alice.organization_addr)
+        mock_clock.jump(6)
+        await cmds.message_send(alice.user_id, b"hello")
+        assert stats.stale == 1
+        assert stats.retries == 0
+        assert stats.connections == 2
+
+        # Recently used connection is not checked, so only idempotent
+        # commands are retried
+        _break_last_sock(tcp_stream_spy, alice.organization_addr)
+        with pytest.raises(BackendNotAvailable):
+            await cmds.message_send(alice.user_id, b"hello")
+        await cmds.ping("Hello World !")
+        _break_last_sock(tcp_stream_spy, alice.organization_addr)
+        await cmds.ping("Hello World !")
+        assert stats.retries == 1
+        assert stats.in_use == 0
+
+        metrics = CoreMetrics()
+        metrics.collect_transport_pool(cmds.transport_pool)
+        rendered = metrics.render()
+        assert "parsec_core_backend_stale_connections_total 1\n" in rendered
+        assert "parsec_core_backend_retries_total 1\n" in rendered
+        assert "parsec_core_backend_connections_idle 1\n" in rendered
+
+
+@pytest.mark.trio
+async def test_pool_sizing(mock_clock, running_backend, alice):
+    async with backend_cmds_factory(
+        alice.organization_addr,
+        alice.device_id,
+        alice.signing_key,
+        max_pool=4,
+        min_pool=2,
+        idle_timeout=20,
+    ) as cmds:
+        pool = cmds.transport_pool
+        # Min connections are opened in background
+        await trio.testing.wait_all_tasks_blocked()
+        assert len(pool.transports) == 2
+
+        release = trio.Event()
+
+        async def _ping(task_status=trio.TASK_STATUS_IGNORED):
+            async with pool.acquire() as transport:
+                task_status.started()
+                await transport.ping()
+                await release.wait()
+
+        async with trio.open_nursery() as nursery:
+            for _ in range(4):
+                await nursery.start(_ping)
+            assert pool.stats.in_use == 4
+            release.set()
+        assert len(pool.transports) == 4
+        assert pool.stats.connections == 4
+
+        # Idle connections are closed down to the min size
+        mock_clock.jump(21)
+        await trio.testing.wait_all_tasks_blocked()
+        assert len(pool.transports) == 2
+        assert pool.stats.evicted == 2
+
+    with pytest.raises(ValueError):
+        async with backend_cmds_factory(
+            alice.organization_addr, alice.device_id, alice.signing_key, max_pool=1, min_pool=2
+        ):
+            pass
+    with pytest.raises(ValueError):
+        config_factory(backend_min_connections=5, backend_max_connections=4)
+
+
+@pytest.mark.trio
+async def test_pool_fill_dont_block_requests(monkeypatch, running_backend, alice):
+    vanilla_connect = transport_module._connect
+    connect_calls = 0
+    fill_can_connect = trio.Event()
+
+    async def _slow_first_connect(*args, **kwargs):
+        nonlocal connect_calls
+        connect_calls += 1
+        if connect_calls == 1:
+            await fill_can_connect.wait()
+        return await vanilla_connect(*args, **kwargs)
+
+    monkeypatch.setattr(transport_module, "_connect", _slow_first_connect)
+    async with backend_cmds_factory(
+        alice.organization_addr, alice.device_id, alice.signing_key, max_pool=1, min_pool=1
+    ) as cmds:
+        pool = cmds.transport_pool
+        await trio.testing.wait_all_tasks_blocked()
+        assert connect_calls == 1
+
+        # Request is served while the background connection is pending
+        with trio.fail_after(1):
+            await cmds.ping("Hello World !")
+        assert len(pool.transports) == 1
+
+        # Pool is already full once the background connection is established
+        fill_can_connect.set()
+        await trio.testing.wait_all_tasks_blocked()
+        assert pool.stats.connections == 2
+        assert pool.stats.closed == 1
+        assert len(pool.transports) == 1
@@ -77,13 +77,13 @@ async def encryption_manager(running_backend, encryption_manager_factory, alice)
 @pytest.fixture
 def fs_factory(encryption_manager_factory, local_db_factory, event_bus_factory):
     @asynccontextmanager
-    async def _fs_factory(device, local_db=None, event_bus=None):
+    async def _fs_factory(device, local_db=None, event_bus=None, **kwargs):
         if not event_bus:
             event_bus = event_bus_factory()
         local_db = local_db or local_db_factory(device)
 
         async with encryption_manager_factory(device, local_db) as em:
-            fs = FS(device, local_db, em.backend_cmds, em, event_bus)
+            fs = FS(device, local_db, em.backend_cmds, em, event_bus, **kwargs)
             yield fs
 
     return _fs_factory
@@ -0,0 +1,134 @@
+import os
+import pytest
+import trio
+
+from parsec.core.types import FsPath, DEFAULT_BLOCK_SIZE, MAX_BLOCK_SIZE
+from parsec.core.fs import sync_base
+from parsec.core.fs.sync_base import get_adaptive_block_size
+
+
+@pytest.mark.parametrize(
+    "file_size,block_size",
+    [
+        (0, DEFAULT_BLOCK_SIZE),
+        (2 ** 24, DEFAULT_BLOCK_SIZE),
+        (2 ** 24 + 1, 2 ** 18),
+        (2 ** 30, 2 ** 20),
+        (2 ** 40, MAX_BLOCK_SIZE),
+    ],
+)
+def test_adaptive_block_size(file_size, block_size):
+    assert get_adaptive_block_size(file_size) == block_size
+
+
+def _get_file_manifest(fs, path):
+    access = fs._local_folder_fs.get_access(FsPath(path))
+    return fs._local_folder_fs.get_manifest(access)
+
+
+@pytest.mark.trio
+async def test_workspace_block_size(running_backend, alice_fs):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.workspace_set_block_size("/w", 4096)
+    await alice_fs.touch("/w/foo.txt")
+    await alice_fs.file_write("/w/foo.txt", b"a" * 10000)
+    await alice_fs.sync("/w")
+
+    manifest = _get_file_manifest(alice_fs, "/w/foo.txt")
+    assert manifest.block_size == 4096
+    assert [(x.offset, x.size) for x in manifest.blocks] == [(0, 4096), (4096, 4096), (8192, 1808)]
+
+    # Back to adaptive block size
+    await alice_fs.workspace_set_block_size("/w", None)
+    await alice_fs.sync("/w")
+    stat = await alice_fs.stat("/w")
+    assert not stat["need_sync"]
+
+
+@pytest.mark.trio
+async def test_invalid_workspace_block_size(running_backend, alice_fs):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.mkdir("/w/foo")
+    with pytest.raises(ValueError):
+        await alice_fs.workspace_set_block_size("/w", 0)
+    with pytest.raises(ValueError):
+        await alice_fs.workspace_set_block_size("/w", MAX_BLOCK_SIZE + 1)
+    with pytest.raises(PermissionError):
+        await alice_fs.workspace_set_block_size("/w/foo", 4096)
+
+
+@pytest.mark.trio
+async def test_unchanged_blocks_not_reuploaded(running_backend, alice_fs):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.workspace_set_block_size("/w", 4096)
+    await alice_fs.touch("/w/foo.txt")
+    await alice_fs.file_write("/w/foo.txt", b"a" * 10000)
+    await alice_fs.sync("/w")
+    original_blocks = _get_file_manifest(alice_fs, "/w/foo.txt").blocks
+
+    await alice_fs.file_write("/w/foo.txt", b"b" * 10, offset=5000)
+    await alice_fs.sync("/w")
+    blocks = _get_file_manifest(alice_fs, "/w/foo.txt").blocks
+    assert blocks[0] == original_blocks[0]
+    assert blocks[1] != original_blocks[1]
+    assert blocks[2] == original_blocks[2]
+
+
+@pytest.mark.trio
+async def test_synced_file_keeps_its_block_size(running_backend, alice_fs, monkeypatch):
+    monkeypatch.setattr(sync_base, "BLOCK_SIZE_TIERS", ((8192, 4096),))
+    await alice_fs.workspace_create("/w")
+    await alice_fs.touch("/w/foo.txt")
+    await alice_fs.file_write("/w/foo.txt", b"a" * 8000)
+    await alice_fs.sync("/w")
+    original_blocks = _get_file_manifest(alice_fs, "/w/foo.txt").blocks
+
+    # File growing past its tier is not re-aligned on a bigger block size
+    await alice_fs.file_write("/w/foo.txt", b"b" * 20000, offset=8000)
+    await alice_fs.sync("/w")
+    manifest = _get_file_manifest(alice_fs, "/w/foo.txt")
+    assert manifest.block_size == 4096
+    assert manifest.blocks[0] == original_blocks[0]
+    assert [(x.offset, x.size) for x in manifest.blocks] == [
+        (i * 4096, min(4096, 28000 - i * 4096)) for i in range(7)
+    ]
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_adaptive_block_size_bench(running_backend, alice_fs):
+    # Run with `--postgresql` to bench against the PostgreSQL blockstore
+    # Random data given identical blocks would only be uploaded once
+    data = os.urandom(2 ** 24 + 2 ** 20)
+    await alice_fs.workspace_create("/fixed")
+    await alice_fs.workspace_set_block_size("/fixed", DEFAULT_BLOCK_SIZE)
+    await alice_fs.workspace_create("/adaptive")
+
+    uploads = []
+    vanilla_block_upload = alice_fs._syncer._backend_block_upload
+
+    async def _spied_block_upload(access, ciphered):
+        uploads.append(len(ciphered))
+        return await vanilla_block_upload(access, ciphered)
+
+    alice_fs._syncer._backend_block_upload = _spied_block_upload
+
+    async def _sync_file(workspace):
+        path = f"/{workspace}/foo.txt"
+        await alice_fs.touch(path)
+        await alice_fs.file_write(path, data)
+        uploads.clear()
+        await alice_fs.sync(f"/{workspace}")
+        # Synced blocks are not in the local cache yet, so they are fetched from the backend
+        with trio.fail_after(60):
+            assert await alice_fs.file_read(path) == data
+        return len(uploads), sum(uploads)
+
+    fixed_blocks, fixed_bytes = await _sync_file("fixed")
+    adaptive_blocks, adaptive_bytes = await _sync_file("adaptive")
+
+    assert fixed_blocks == len(data) // DEFAULT_BLOCK_SIZE
+    assert adaptive_blocks == len(data) // get_adaptive_block_size(len(data))
+    assert adaptive_blocks * 4 == fixed_blocks
+    # Fewer blocks also means less per-block encryption overhead
+    assert len(data) < adaptive_bytes < fixed_bytes
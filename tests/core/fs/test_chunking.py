@@ -0,0 +1,122 @@
+import pytest
+from random import Random
+
+from parsec.core.fs.chunking import iter_chunks, CDC_MIN_SIZE, CDC_MAX_SIZE
+
+
+def _random_data(size, seed=0):
+    r = Random(seed)
+    return bytes(r.getrandbits(8) for _ in range(size))
+
+
+@pytest.fixture(scope="module")
+def data():
+    return _random_data(2 ** 20)
+
+
+def test_chunks_bounds(data):
+    chunks = list(iter_chunks(data))
+    assert b"".join(chunks) == data
+    for chunk in chunks[:-1]:
+        assert CDC_MIN_SIZE < len(chunk) <= CDC_MAX_SIZE
+
+
+def test_chunks_resync_after_insertion(data):
+    chunks = [bytes(x) for x in iter_chunks(data)]
+    edited = data[:300_000] + b"<inserted>" + data[300_000:]
+    edited_chunks = [bytes(x) for x in iter_chunks(edited)]
+    # Only the chunk containing the insertion should be different
+    assert len(set(edited_chunks) - set(chunks)) == 1
+
+
+async def _sync_with_uploaded_size(fs, path):
+    uploaded = 0
+    vanilla_blockstore_create = fs.backend_cmds.blockstore_create
+
+    async def _spied_blockstore_create(id, block):
+        nonlocal uploaded
+        uploaded += len(block)
+        return await vanilla_blockstore_create(id, block)
+
+    fs.backend_cmds.blockstore_create = _spied_blockstore_create
+    try:
+        await fs.sync(path)
+    finally:
+        fs.backend_cmds.blockstore_create = vanilla_blockstore_create
+    return uploaded
+
+
+@pytest.mark.trio
+async def test_cdc_sync_deduplicate_blocks(running_backend, fs_factory, alice, data):
+    async with fs_factory(alice, content_defined_chunking=True) as fs:
+        await fs.workspace_create("/w")
+        await fs.touch("/w/foo.txt")
+        await fs.file_write("/w/foo.txt", data)
+        first_uploaded = await _sync_with_uploaded_size(fs, "/w/foo.txt")
+        assert first_uploaded > len(data)
+
+        # Copy has the same content, hence the same blocks
+        await fs.touch("/w/bar.txt")
+        await fs.file_write("/w/bar.txt", data)
+        assert await _sync_with_uploaded_size(fs, "/w/bar.txt") == 0
+
+        # Insert data in the middle of the file
+        edited = data[:300_000] + b"<inserted>" + data[300_000:]
+        await fs.file_write("/w/foo.txt", edited)
+        assert await _sync_with_uploaded_size(fs, "/w/foo.txt") < CDC_MAX_SIZE * 2
+
+        stat = await fs.stat("/w/foo.txt")
+        assert not stat["need_sync"]
+        assert await fs.file_read("/w/foo.txt") == edited
+
+
+@pytest.mark.trio
+async def test_cdc_sync_fetch_remote_blocks_once(running_backend, fs_factory, alice, data):
+    async with fs_factory(alice, content_defined_chunking=True) as fs:
+        await fs.workspace_create("/w")
+        await fs.touch("/w/foo.txt")
+        await fs.file_write("/w/foo.txt", data)
+        await fs.sync("/w/foo.txt")
+
+        # Remote blocks are bigger than the read window on average
+        await fs.workspace_set_block_size("/w", 2 ** 12)
+        read_ids = []
+        vanilla_block_read = fs._syncer._backend_block_read
+
+        async def _spied_block_read(access):
+            read_ids.append(access.id)
+            return await vanilla_block_read(access)
+
+        fs._syncer._backend_block_read = _spied_block_read
+        await fs.file_write("/w/foo.txt", b"<edited>", offset=300_000)
+        await fs.sync("/w/foo.txt")
+
+        assert read_ids
+        assert len(read_ids) == len(set(read_ids))
+        assert await fs.file_read("/w/foo.txt") == data[:300_000] + b"<edited>" + data[300_008:]
+
+
+async def _edit_in_the_middle_uploaded_size(fs_factory, device, content_defined_chunking):
+    data = _random_data(4 * 2 ** 20)
+    async with fs_factory(device, content_defined_chunking=content_defined_chunking) as fs:
+        await fs.workspace_create("/w")
+        await fs.touch("/w/foo.txt")
+        await fs.file_write("/w/foo.txt", data)
+        await fs.sync("/w/foo.txt")
+
+        uploaded = 0
+        for i in range(1, 5):
+            offset = i * 2 ** 20 - 12345
+            data = data[:offset] + b"<inserted>" + data[offset:]
+            await fs.file_write("/w/foo.txt", data)
+            uploaded += await _sync_with_uploaded_size(fs, "/w/foo.txt")
+        return uploaded
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_edit_in_the_middle_upload_bench(running_backend, fs_factory, alice, bob):
+    fixed_uploaded = await _edit_in_the_middle_uploaded_size(fs_factory, alice, False)
+    cdc_uploaded = await _edit_in_the_middle_uploaded_size(fs_factory, bob, True)
+    # Insertion shifts all the following fixed-size blocks
+    assert cdc_uploaded * 4 < fixed_uploaded
@@ -3,6 +3,7 @@ from pendulum import Pendulum
 
 from parsec.core.types import FsPath
 from parsec.core.backend_connection import BackendNotAvailable
+from parsec.core.fs import sync_base
 
 from tests.common import freeze_time, create_shared_workspace
 
@@ -110,6 +111,116 @@ async def test_new_empty_entry(type, running_backend, alice_fs, alice2_fs):
     assert stat == stat2
 
 
+@pytest.mark.trio
+async def test_full_sync_checks_entries_by_chunks(
+    monkeypatch, running_backend, alice_fs, alice2_fs
+):
+    monkeypatch.setattr(sync_base, "GROUP_CHECK_CHUNK_SIZE", 2)
+    await create_shared_workspace("/w", alice_fs, alice2_fs)
+    for name in ("a", "b", "c", "d"):
+        await alice_fs.file_create(f"/w/{name}.txt")
+    await alice_fs.sync("/w")
+    await alice2_fs.sync("/w")
+    for name in ("a", "b", "c", "d"):
+        assert await alice2_fs.file_read(f"/w/{name}.txt") == b""
+
+    await alice_fs.file_write("/w/c.txt", b"updated")
+    await alice_fs.sync("/w")
+
+    checked = []
+    vanilla_group_check = alice2_fs._syncer._backend_vlob_group_check
+
+    async def _spied_group_check(to_check):
+        checked.append({entry["id"] for entry in to_check})
+        return await vanilla_group_check(to_check)
+
+    alice2_fs._syncer._backend_vlob_group_check = _spied_group_check
+    await alice2_fs.full_sync()
+
+    # Root, workspace and the 4 files
+    assert [len(ids) for ids in checked] == [2, 2, 2]
+    assert len(set.union(*checked)) == 6
+    assert await alice2_fs.file_read("/w/c.txt") == b"updated"
+
+
+@pytest.mark.trio
+async def test_full_sync_skips_unchanged_workspaces(
+    running_backend, fs_factory, alice2, alice2_local_db, alice_fs, alice2_fs
+):
+    await create_shared_workspace("/w", alice_fs, alice2_fs)
+    await alice_fs.file_create("/w/foo.txt")
+    await alice_fs.sync("/w")
+    await alice2_fs.sync("/w")
+    await alice2_fs.stat("/w/foo.txt")
+    await create_shared_workspace("/w2", alice_fs, alice2_fs)
+    await alice_fs.file_create("/w2/spam.txt")
+    await alice_fs.sync("/w2")
+    await alice2_fs.sync("/w2")
+    await alice2_fs.stat("/w2/spam.txt")
+
+    def _spy_group_check(fs):
+        checked = set()
+        vanilla_group_check = fs._syncer._backend_vlob_group_check
+
+        async def _spied_group_check(to_check):
+            checked.update(entry["id"] for entry in to_check)
+            return await vanilla_group_check(to_check)
+
+        fs._syncer._backend_vlob_group_check = _spied_group_check
+        return checked
+
+    checked = _spy_group_check(alice2_fs)
+    root_id = alice2.user_manifest_access.id
+    workspace_id = alice2_fs._local_folder_fs.get_access(FsPath("/w")).id
+    foo_id = alice2_fs._local_folder_fs.get_access(FsPath("/w/foo.txt")).id
+    workspace2_id = alice2_fs._local_folder_fs.get_access(FsPath("/w2")).id
+    spam_id = alice2_fs._local_folder_fs.get_access(FsPath("/w2/spam.txt")).id
+
+    # First full sync has no checkpoint to rely on
+    await alice2_fs.full_sync()
+    assert checked == {root_id, workspace_id, foo_id, workspace2_id, spam_id}
+
+    # Nothing changed
+    checked.clear()
+    await alice2_fs.full_sync()
+    assert checked == set()
+
+    # Remote change
+    await alice_fs.file_write("/w/foo.txt", b"updated")
+    await alice_fs.sync("/w")
+    checked.clear()
+    await alice2_fs.full_sync()
+    assert checked == {workspace_id, foo_id}
+    assert await alice2_fs.file_read("/w/foo.txt") == b"updated"
+
+    # Checkpoints are persisted
+    async with fs_factory(alice2, alice2_local_db) as alice2_fs_restarted:
+        checked = _spy_group_check(alice2_fs_restarted)
+        await alice2_fs_restarted.full_sync()
+        assert checked == set()
+
+        # Local changes only invalidate their workspace's checkpoint
+        await alice2_fs_restarted.file_create("/w/bar.txt")
+        bar_id = alice2_fs_restarted._local_folder_fs.get_access(FsPath("/w/bar.txt")).id
+        await alice2_fs_restarted.full_sync()
+        assert checked == {workspace_id, foo_id, bar_id}
+        assert not (await alice2_fs_restarted.stat("/w/bar.txt"))["is_placeholder"]
+
+        # Our own upload moved the beacon past the checkpoint, so the
+        # workspace is checked once more before being skipped again
+        checked.clear()
+        await alice2_fs_restarted.full_sync()
+        assert checked == {workspace_id, foo_id, bar_id}
+        checked.clear()
+        await alice2_fs_restarted.full_sync()
+        assert checked == set()
+
+        # Other workspace's checkpoint is now the one to be invalidated
+        await alice2_fs_restarted.file_write("/w2/spam.txt", b"local")
+        await alice2_fs_restarted.full_sync()
+        assert checked == {workspace2_id, spam_id}
+
+
 @pytest.mark.trio
 async def test_simple_sync(running_backend, alice_fs, alice2_fs):
     await create_shared_workspace("/w", alice_fs, alice2_fs)
@@ -358,6 +469,11 @@ async def test_concurrent_update(running_backend, alice_fs, alice2_fs):
             ("fs.entry.minimal_synced", {"path": "/w/bar/spam", "id": spy.ANY}, date_sync),
             ("fs.entry.synced", {"path": "/w/bar", "id": spy.ANY}, date_sync),
             ("fs.entry.synced", {"path": "/w/bar/spam", "id": spy.ANY}, date_sync),
+            (
+                "fs.entry.blocks_uploaded",
+                {"path": "/w/foo.txt", "id": spy.ANY, "blocks": 1, "size": 10, "timings": spy.ANY},
+                date_sync,
+            ),
             ("fs.entry.synced", {"path": "/w/foo.txt", "id": spy.ANY}, date_sync),
             ("fs.entry.minimal_synced", {"path": "/z", "id": spy.ANY}, date_sync),
             ("fs.entry.synced", {"path": "/", "id": spy.ANY}, date_sync),
@@ -401,6 +517,11 @@ async def test_concurrent_update(running_backend, alice_fs, alice2_fs):
             ("fs.entry.synced", {"path": "/w/bar", "id": spy.ANY}, date_sync),
             ("fs.entry.synced", {"path": "/w/bar/from_alice2", "id": spy.ANY}, date_sync),
             ("fs.entry.synced", {"path": "/w/bar", "id": spy.ANY}, date_sync),
+            (
+                "fs.entry.blocks_uploaded",
+                {"path": "/w/foo.txt", "id": spy.ANY, "blocks": 1, "size": 11, "timings": spy.ANY},
+                date_sync,
+            ),
             (
                 "fs.entry.file_update_conflicted",
                 {
@@ -606,13 +727,13 @@ async def test_create_already_existing_block(running_backend, alice_fs, alice2_f
 
     # Now hack a bit the fs to simulate poor connection with backend
 
-    vanilla_backend_block_create = alice_fs._syncer._backend_block_create
+    vanilla_backend_block_upload = alice_fs._syncer._backend_block_upload
 
-    async def mocked_backend_block_create(*args, **kwargs):
-        await vanilla_backend_block_create(*args, **kwargs)
+    async def mocked_backend_block_upload(*args, **kwargs):
+        await vanilla_backend_block_upload(*args, **kwargs)
         raise BackendNotAvailable()
 
-    alice_fs._syncer._backend_block_create = mocked_backend_block_create
+    alice_fs._syncer._backend_block_upload = mocked_backend_block_upload
 
     # Write into the file locally and try to sync this.
     # We should end up with a block synced in the backend but still considered
@@ -626,7 +747,7 @@ async def test_create_already_existing_block(running_backend, alice_fs, alice2_f
     # Now retry the sync with a good connection, we should be able to reach
     # eventual consistency.
 
-    alice_fs._syncer._backend_block_create = vanilla_backend_block_create
+    alice_fs._syncer._backend_block_upload = vanilla_backend_block_upload
     await alice_fs.sync("/w/foo.txt")
 
     # Finally test this so-called consistency ;-)
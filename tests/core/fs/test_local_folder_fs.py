@@ -1,5 +1,6 @@
 import os
 import attr
+import trio
 import pytest
 from pendulum import Pendulum
 import pathlib
@@ -15,7 +16,8 @@ from hypothesis.stateful import (
 from hypothesis import strategies as st
 
 from parsec.core.types import ManifestAccess, LocalFileManifest, FsPath
-from parsec.core.fs.local_folder_fs import FSManifestLocalMiss, is_folder_manifest
+from parsec.core.local_db import LocalDBMissingEntry
+from parsec.core.fs.local_folder_fs import LocalFolderFS, FSManifestLocalMiss, is_folder_manifest
 
 from tests.common import freeze_time
 
@@ -217,6 +219,20 @@ def test_access_unknown_entry(local_folder_fs):
         local_folder_fs.stat(FsPath("/dummy"))
 
 
+def test_get_entries_paths(local_folder_fs):
+    local_folder_fs.workspace_create(FsPath("/w"))
+    local_folder_fs.mkdir(FsPath("/w/foo"))
+    local_folder_fs.touch(FsPath("/w/foo/bar.txt"))
+    local_folder_fs.touch(FsPath("/w/spam.txt"))
+
+    paths = [FsPath(path) for path in ("/", "/w", "/w/foo/bar.txt", "/w/spam.txt")]
+    ids = [local_folder_fs.get_access(path).id for path in paths]
+    unknown_id = ManifestAccess().id
+
+    assert local_folder_fs.get_entries_paths([*ids, unknown_id]) == dict(zip(ids, paths))
+    assert local_folder_fs.get_entries_paths([]) == {}
+
+
 class expect_raises:
     def __init__(self, expected_exc):
         self.expected_exc = expected_exc
@@ -398,3 +414,73 @@ def test_folder_operations(
             self.last_step_id_to_path = new_id_to_path
 
     run_state_machine_as_test(FileOperationsStateMachine, settings=hypothesis_settings)
+
+
+def _updated_ids(spy):
+    return [event.kwargs["id"] for event in spy.events if event.event == "fs.entry.updated"]
+
+
+@pytest.mark.trio
+async def test_write_back_batches_manifests_and_events(event_bus, alice, alice_local_db):
+    local_folder_fs = LocalFolderFS(alice, alice_local_db, event_bus, write_back_delay=1)
+    with event_bus.listen() as spy:
+        local_folder_fs.workspace_create(FsPath("/w"))
+        for name in ("a", "b", "c"):
+            local_folder_fs.touch(FsPath(f"/w/{name}"))
+        local_folder_fs.mkdir(FsPath("/w/d"))
+
+        workspace_access = local_folder_fs.get_access(FsPath("/w"))
+        assert local_folder_fs.stat(FsPath("/w"))["children"] == ["a", "b", "c", "d"]
+        assert not _updated_ids(spy)
+        with pytest.raises(LocalDBMissingEntry):
+            alice_local_db.get(workspace_access)
+
+        await local_folder_fs.flush()
+
+    # One event per modified entry: root, workspace and its 4 children
+    updated = _updated_ids(spy)
+    assert len(updated) == len(set(updated)) == 6
+    assert workspace_access.id in updated
+    reloaded = LocalFolderFS(alice, alice_local_db, event_bus)
+    assert reloaded.stat(FsPath("/w"))["children"] == ["a", "b", "c", "d"]
+
+
+@pytest.mark.trio
+async def test_write_back_replays_interrupted_flush(event_bus, alice, alice_local_db):
+    local_folder_fs = LocalFolderFS(alice, alice_local_db, event_bus, write_back_delay=1)
+    local_folder_fs.workspace_create(FsPath("/w"))
+    local_folder_fs.touch(FsPath("/w/foo"))
+
+    class Crash(Exception):
+        pass
+
+    async def _crash():
+        raise Crash()
+
+    # Crash once the journal is written, before the manifests are
+    alice_local_db.flush = _crash
+    with pytest.raises(Crash):
+        await local_folder_fs.flush()
+    del alice_local_db.flush
+    with pytest.raises(LocalDBMissingEntry):
+        alice_local_db.get(local_folder_fs.get_access(FsPath("/w")))
+
+    reloaded = LocalFolderFS(alice, alice_local_db, event_bus)
+    assert reloaded.stat(FsPath("/w"))["children"] == ["foo"]
+    assert reloaded.stat(FsPath("/w/foo"))["type"] == "file"
+    with pytest.raises(LocalDBMissingEntry):
+        alice_local_db.get(reloaded._journal_access)
+
+
+@pytest.mark.trio
+async def test_write_back_task_flushes_after_delay(event_bus, alice, alice_local_db):
+    local_folder_fs = LocalFolderFS(alice, alice_local_db, event_bus, write_back_delay=0.01)
+    async with trio.open_nursery() as nursery:
+        await nursery.start(local_folder_fs.run_write_back)
+        with event_bus.listen() as spy:
+            local_folder_fs.workspace_create(FsPath("/w"))
+            access = local_folder_fs.get_access(FsPath("/w"))
+            with trio.fail_after(1):
+                await spy.wait("fs.entry.updated", kwargs={"id": access.id})
+        assert alice_local_db.get(access)
+        nursery.cancel_scope.cancel()
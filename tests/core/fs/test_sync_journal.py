@@ -0,0 +1,139 @@
+import pytest
+from random import Random
+
+from parsec.core.types import FsPath, BlockAccess
+from parsec.core.backend_connection import BackendNotAvailable
+from parsec.core.fs.sync_journal import (
+    SyncJournal,
+    sync_journal_segment_serializer,
+    build_sync_journal_access,
+)
+
+
+BLOCK_SIZE = 4096
+
+
+def _random_data(size):
+    r = Random(0)
+    return bytes(r.getrandbits(8) for _ in range(size))
+
+
+def _spy_uploads(fs, fail_after=None):
+    uploaded = []
+    vanilla_block_upload = fs._syncer._backend_block_upload
+
+    async def _spied_block_upload(access, ciphered):
+        if fail_after is not None and len(uploaded) >= fail_after:
+            raise BackendNotAvailable()
+        await vanilla_block_upload(access, ciphered)
+        uploaded.append(access)
+
+    fs._syncer._backend_block_upload = _spied_block_upload
+    return uploaded
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("content_defined_chunking", [False, True])
+async def test_interrupted_sync_is_resumed(
+    running_backend, fs_factory, alice, alice_local_db, content_defined_chunking
+):
+    data = _random_data(64 * BLOCK_SIZE)
+    async with fs_factory(
+        alice,
+        local_db=alice_local_db,
+        sync_concurrency=1,
+        content_defined_chunking=content_defined_chunking,
+    ) as fs:
+        await fs.workspace_create("/w")
+        await fs.workspace_set_block_size("/w", BLOCK_SIZE)
+        await fs.sync("/w")
+        await fs.file_create("/w/foo.txt")
+        await fs.file_write("/w/foo.txt", data)
+
+        first_uploaded = _spy_uploads(fs, fail_after=3)
+        with pytest.raises(BackendNotAvailable):
+            await fs.sync("/w/foo.txt")
+        assert len(first_uploaded) == 3
+
+    # Restart the fs, sync should go on from where it stopped
+    async with fs_factory(
+        alice, local_db=alice_local_db, content_defined_chunking=content_defined_chunking
+    ) as fs:
+        second_uploaded = _spy_uploads(fs)
+        await fs.sync("/w/foo.txt")
+
+        assert not set(first_uploaded) & set(second_uploaded)
+        foo_access = fs._local_folder_fs.get_access(FsPath("/w/foo.txt"))
+        manifest = fs._local_folder_fs.get_manifest(foo_access)
+        assert set(first_uploaded) <= set(manifest.blocks)
+        assert set(manifest.blocks) == set(first_uploaded) | set(second_uploaded)
+        assert await fs.file_read("/w/foo.txt") == data
+
+        # Journal is no longer needed once the file is synced
+        journal_access = build_sync_journal_access(foo_access.id, alice.local_symkey)
+        with pytest.raises(KeyError):
+            alice_local_db._data[journal_access.id]
+
+
+@pytest.mark.trio
+async def test_outdated_sync_journal_is_discarded(running_backend, alice_fs, alice):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.file_create("/w/foo.txt")
+    await alice_fs.file_write("/w/foo.txt", b"v1")
+    await alice_fs.sync("/w")
+    await alice_fs.file_write("/w/foo.txt", b"v2")
+
+    foo_access = alice_fs._local_folder_fs.get_access(FsPath("/w/foo.txt"))
+    manifest = alice_fs._local_folder_fs.get_manifest(foo_access)
+    orphaned = BlockAccess.from_block(b"v2", 0)
+    outdated = SyncJournal(base_version=manifest.base_version - 1)
+    outdated.add_block(orphaned)
+    alice_fs._syncer._save_sync_journal(foo_access, outdated)
+
+    journal = alice_fs._syncer._load_sync_journal(foo_access, manifest)
+    assert journal == SyncJournal(base_version=manifest.base_version)
+
+    uploaded = _spy_uploads(alice_fs)
+    await alice_fs.sync("/w")
+    assert len(uploaded) == 1
+    assert uploaded[0] != orphaned
+
+
+@pytest.mark.trio
+async def test_sync_journal_is_appended(alice_fs, alice, alice_local_db):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.file_create("/w/foo.txt")
+    foo_access = alice_fs._local_folder_fs.get_access(FsPath("/w/foo.txt"))
+    manifest = alice_fs._local_folder_fs.get_manifest(foo_access)
+    syncer = alice_fs._syncer
+
+    blocks = [BlockAccess.from_block(bytes([i]) * 10, i * 10) for i in range(5)]
+    journal = SyncJournal(base_version=manifest.base_version)
+    for block in blocks[:3]:
+        journal.add_block(block)
+    syncer._save_sync_journal(foo_access, journal)
+    for block in blocks[3:]:
+        journal.add_block(block)
+    syncer._save_sync_journal(foo_access, journal)
+    assert journal.segments == 2
+    assert not journal.pending
+
+    # Each save only writes the blocks added since the previous one
+    for segment, expected in enumerate((blocks[:3], blocks[3:])):
+        segment_access = build_sync_journal_access(foo_access.id, alice.local_symkey, segment)
+        raw = alice_local_db.get(segment_access)
+        assert sync_journal_segment_serializer.loads(raw)["blocks"] == expected
+
+    loaded = syncer._load_sync_journal(foo_access, manifest)
+    assert loaded.blocks == blocks
+    assert not loaded.pending
+    for block in blocks:
+        assert loaded.find_block(block.offset, block.size, block.digest) == block
+    assert loaded.find_block(0, 10, blocks[1].digest) is None
+
+    # All the segments are cleared with the journal
+    syncer._clear_sync_journal(foo_access)
+    for segment in (None, 0, 1):
+        journal_access = build_sync_journal_access(foo_access.id, alice.local_symkey, segment)
+        with pytest.raises(KeyError):
+            alice_local_db._data[journal_access.id]
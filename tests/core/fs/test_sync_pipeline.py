@@ -0,0 +1,150 @@
+import pytest
+import trio
+
+from parsec.core.types import FsPath
+from parsec.core.config import config_factory
+
+
+BLOCK_SIZE = 4096
+FILE_SIZE = 16 * BLOCK_SIZE
+
+
+async def _setup_file(fs):
+    await fs.workspace_create("/w")
+    await fs.workspace_set_block_size("/w", BLOCK_SIZE)
+    await fs.file_create("/w/foo.txt")
+    await fs.file_write("/w/foo.txt", b"x" * FILE_SIZE)
+
+
+def _spy_in_memory_blocks(fs):
+    stats = {"in_memory": 0, "max_in_memory": 0, "uploading": 0, "max_uploading": 0}
+    vanilla_build_data = fs._syncer._build_data_from_contiguous_space
+    vanilla_block_upload = fs._syncer._backend_block_upload
+
+    async def _spied_build_data(cs):
+        stats["in_memory"] += 1
+        stats["max_in_memory"] = max(stats["in_memory"], stats["max_in_memory"])
+        return await vanilla_build_data(cs)
+
+    async def _spied_block_upload(access, ciphered):
+        stats["uploading"] += 1
+        stats["max_uploading"] = max(stats["uploading"], stats["max_uploading"])
+        await trio.sleep(0.001)
+        await vanilla_block_upload(access, ciphered)
+        stats["uploading"] -= 1
+        stats["in_memory"] -= 1
+
+    fs._syncer._build_data_from_contiguous_space = _spied_build_data
+    fs._syncer._backend_block_upload = _spied_block_upload
+    return stats
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("budget_blocks", [1, 3])
+async def test_sync_memory_budget(running_backend, fs_factory, alice, budget_blocks):
+    async with fs_factory(
+        alice, sync_concurrency=8, sync_memory_budget=budget_blocks * BLOCK_SIZE
+    ) as fs:
+        await _setup_file(fs)
+        stats = _spy_in_memory_blocks(fs)
+        await fs.sync("/w")
+
+        assert stats["max_in_memory"] == budget_blocks
+        assert await fs.file_read("/w/foo.txt") == b"x" * FILE_SIZE
+
+
+@pytest.mark.trio
+async def test_sync_memory_budget_counts_remote_blocks(running_backend, fs_factory, alice):
+    async with fs_factory(alice, sync_concurrency=8, sync_memory_budget=2 * BLOCK_SIZE) as fs:
+        await _setup_file(fs)
+        await fs.sync("/w")
+        # Each block to upload now needs its remote counterpart to be downloaded
+        for offset in range(0, FILE_SIZE, BLOCK_SIZE):
+            await fs.file_write("/w/foo.txt", b"y", offset=offset)
+        stats = _spy_in_memory_blocks(fs)
+        await fs.sync("/w")
+
+        assert stats["max_in_memory"] == 1
+        expected = (b"y" + b"x" * (BLOCK_SIZE - 1)) * (FILE_SIZE // BLOCK_SIZE)
+        assert await fs.file_read("/w/foo.txt") == expected
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("settings", [{"sync_concurrency": 0}, {"sync_memory_budget": 0}])
+async def test_sync_invalid_settings(fs_factory, alice, settings):
+    with pytest.raises(ValueError):
+        config_factory(**settings)
+    with pytest.raises(ValueError):
+        async with fs_factory(alice, **settings):
+            pass
+
+
+@pytest.mark.trio
+@pytest.mark.parametrize("concurrency", [1, 4])
+async def test_sync_concurrency(running_backend, fs_factory, alice, concurrency):
+    async with fs_factory(alice, sync_concurrency=concurrency) as fs:
+        await _setup_file(fs)
+        stats = _spy_in_memory_blocks(fs)
+        await fs.sync("/w")
+
+        assert stats["max_uploading"] == concurrency
+
+
+@pytest.mark.trio
+async def test_sync_pipeline_timings_event(running_backend, alice_fs):
+    await _setup_file(alice_fs)
+    foo_id = alice_fs._local_folder_fs.get_access(FsPath("/w/foo.txt")).id
+
+    with alice_fs.event_bus.listen() as spy:
+        await alice_fs.sync("/w")
+
+    spy.assert_event_occured(
+        "fs.entry.blocks_uploaded",
+        kwargs={
+            "path": "/w/foo.txt",
+            "id": foo_id,
+            "blocks": 16,
+            "size": FILE_SIZE,
+            "timings": spy.ANY,
+        },
+    )
+    event = next(e for e in spy.events if e.event == "fs.entry.blocks_uploaded")
+    assert event.kwargs["timings"].keys() == {"read", "encrypt", "upload"}
+
+    # Only the modified block is uploaded again
+    await alice_fs.file_write("/w/foo.txt", b"y", offset=FILE_SIZE - 1)
+    with alice_fs.event_bus.listen() as spy:
+        await alice_fs.sync("/w")
+    spy.assert_event_occured(
+        "fs.entry.blocks_uploaded",
+        kwargs={
+            "path": "/w/foo.txt",
+            "id": foo_id,
+            "blocks": 1,
+            "size": BLOCK_SIZE,
+            "timings": spy.ANY,
+        },
+    )
+
+
+@pytest.mark.trio
+async def test_cdc_sync_timings_event(running_backend, fs_factory, alice):
+    async with fs_factory(alice, content_defined_chunking=True) as fs:
+        await _setup_file(fs)
+        foo_id = fs._local_folder_fs.get_access(FsPath("/w/foo.txt")).id
+
+        with fs.event_bus.listen() as spy:
+            await fs.sync("/w")
+
+        spy.assert_event_occured(
+            "fs.entry.blocks_uploaded",
+            kwargs={
+                "path": "/w/foo.txt",
+                "id": foo_id,
+                "blocks": spy.ANY,
+                "size": spy.ANY,
+                "timings": spy.ANY,
+            },
+        )
+        event = next(e for e in spy.events if e.event == "fs.entry.blocks_uploaded")
+        assert event.kwargs["timings"].keys() == {"read", "chunk", "encrypt", "upload"}
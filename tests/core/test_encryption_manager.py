@@ -1,5 +1,9 @@
 import pytest
+from uuid import uuid4
 
+from parsec.crypto import generate_secret_key, CryptoError
+from parsec.core.metrics import CoreMetrics
+from parsec.core.encryption_manager import EncryptionManager
 from parsec.core.backend_connection import BackendNotAvailable
 
 from tests.open_tcp_stream_mock_wrapper import offline
@@ -55,5 +59,37 @@ async def test_encryption_manager_fetch_self_offline(encryption_manager, alice):
     assert remote_user.public_key == alice.public_key
 
 
+@pytest.mark.trio
+async def test_encryption_manager_verified_cache(alice):
+    metrics = CoreMetrics()
+    # Vlobs are signed by alice herself, so no need for the backend
+    encryption_manager = EncryptionManager(alice, None, None, metrics, verified_cache_size=2)
+    key = generate_secret_key()
+    id = uuid4()
+    blob_v1 = encryption_manager.encrypt_with_secret_key(key, b"v1")
+    blob_v2 = encryption_manager.encrypt_with_secret_key(key, b"v2")
+
+    for _ in range(2):
+        assert await encryption_manager.decrypt_vlob_with_secret_key(key, id, 1, blob_v1) == b"v1"
+    assert metrics.verified_cache.get(result="miss") == 1
+    assert metrics.verified_cache.get(result="hit") == 1
+    assert metrics.verify_duration.get()[0] == 1
+
+    # Other version, or same version with another content, is verified again
+    assert await encryption_manager.decrypt_vlob_with_secret_key(key, id, 2, blob_v2) == b"v2"
+    assert await encryption_manager.decrypt_vlob_with_secret_key(key, id, 1, blob_v2) == b"v2"
+    assert metrics.verified_cache.get(result="miss") == 3
+
+    # Neither can the cached content be obtained without the right key
+    with pytest.raises(CryptoError):
+        await encryption_manager.decrypt_vlob_with_secret_key(generate_secret_key(), id, 2, blob_v2)
+
+    # Oldest version has been evicted
+    assert await encryption_manager.decrypt_vlob_with_secret_key(key, id, 1, blob_v1) == b"v1"
+    assert metrics.verified_cache.get(result="miss") == 5
+    assert metrics.verify_duration.get()[0] == 4
+    assert "parsec_core_verify_duration_seconds_count 4" in metrics.render()
+
+
 # TODO: test bad trustchain
 # TODO: test try populate dummy user
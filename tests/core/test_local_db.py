@@ -58,12 +58,54 @@ async def test_local_db_on_disk(tmpdir):
     local_db = LocalDB(tmpdir, max_cache_size=128)
     access = ManifestAccess()
     local_db.set(access, b"data")
+    await local_db.flush()
 
     local_db_cpy = LocalDB(tmpdir, max_cache_size=128)
     data = local_db_cpy.get(access)
     assert data == b"data"
 
 
+@pytest.mark.trio
+async def test_local_db_async_api(tmpdir):
+    local_db = LocalDB(tmpdir, max_cache_size=1024)
+    precious = ManifestAccess()
+    deletable = ManifestAccess()
+    await local_db.set_async(precious, b"precious_data", False)
+    await local_db.set_async(deletable, b"deletable_data")
+    # Served from memory until written
+    assert await local_db.get_async(precious) == b"precious_data"
+
+    await local_db.flush()
+    assert not local_db._pending
+    assert await local_db.get_async(precious) == b"precious_data"
+    assert await local_db.get_async(deletable) == b"deletable_data"
+
+    local_db.clear(precious)
+    with pytest.raises(LocalDBMissingEntry):
+        await local_db.get_async(precious)
+
+
+@pytest.mark.trio
+async def test_local_db_ordered_writes(tmpdir):
+    local_db = LocalDB(tmpdir, max_cache_size=1024)
+    access = ManifestAccess()
+    # Overwrite, move between cache and placeholders and remove entries
+    # faster than they are written
+    for i in range(50):
+        local_db.set(access, f"v{i}".encode(), deletable=bool(i % 2))
+    removed = ManifestAccess()
+    local_db.set(removed, b"removed", False)
+    local_db.clear(removed)
+    local_db.set(removed, b"back", True)
+    await local_db.flush()
+
+    local_db_cpy = LocalDB(tmpdir, max_cache_size=1024)
+    assert local_db_cpy.get(access) == b"v49"
+    assert local_db_cpy.get(removed) == b"back"
+    assert local_db_cpy.get_cache_size() == local_db.get_cache_size()
+    assert not [path for path in tmpdir.visit() if path.ext == ".tmp"]
+
+
 @pytest.mark.trio
 async def test_local_manual_run_garbage_collector(tmpdir):
     local_db = LocalDB(tmpdir, max_cache_size=128)
@@ -1,4 +1,7 @@
 import pytest
+from uuid import uuid4
+
+from parsec.core.sync_monitor import SyncScheduler, MIN_WAIT, MAX_WAIT
 
 
 @pytest.mark.trio
@@ -17,3 +20,75 @@ async def test_autosync_on_modification(mock_clock, running_backend, alice_core,
     stat = await alice_core.fs.stat("/w/foo")
     stat2 = await alice2_fs.stat("/w/foo")
     assert stat == stat2
+
+
+@pytest.mark.trio
+async def test_coalesce_entries_with_same_parent(mock_clock, running_backend, alice_core):
+    mock_clock.autojump_threshold = 0.1
+
+    await alice_core.event_bus.spy.wait_for_backend_connection_ready()
+    with alice_core.event_bus.listen() as spy:
+        await alice_core.fs.workspace_create("/w")
+        await spy.wait("fs.entry.synced", kwargs={"path": "/w", "id": spy.ANY})
+
+    synced_paths = []
+    vanilla_sync = alice_core.fs.sync
+
+    async def _spied_sync(path, recursive=True):
+        synced_paths.append(path)
+        await vanilla_sync(path, recursive=recursive)
+
+    alice_core.fs.sync = _spied_sync
+
+    with alice_core.event_bus.listen() as spy:
+        await alice_core.fs.folder_create("/w/foo")
+        await alice_core.fs.file_create("/w/foo/bar.txt")
+        await alice_core.fs.file_create("/w/foo/spam.txt")
+        await spy.wait("fs.entry.synced", kwargs={"path": "/w/foo/spam.txt", "id": spy.ANY})
+        await spy.wait("sync_monitor.entry_synced", kwargs={"id": spy.ANY, "latency": spy.ANY})
+
+    # Syncing `/w` also syncs its children, which are therefore coalesced
+    assert synced_paths == ["/w"]
+    spy.assert_event_occured("sync_monitor.queue_stats", kwargs={"waiting": 0, "due": 4})
+    latency = next(
+        e.kwargs["latency"] for e in spy.events if e.event == "sync_monitor.entry_synced"
+    )
+    assert MIN_WAIT <= latency < MAX_WAIT
+
+
+def test_scheduler_deadlines():
+    scheduler = SyncScheduler()
+    assert scheduler.next_deadline() is None
+
+    a, b = uuid4(), uuid4()
+    scheduler.schedule(a, now=0)
+    scheduler.schedule(b, now=0.5)
+    assert scheduler.next_deadline() == MIN_WAIT
+    assert scheduler.pop_due(now=MIN_WAIT - 0.1) == []
+
+    # Modification pushes back the deadline...
+    scheduler.schedule(a, now=0.9)
+    assert scheduler.next_deadline() == 0.5 + MIN_WAIT
+    assert scheduler.pop_due(now=0.5 + MIN_WAIT) == [(b, 0.5)]
+    assert len(scheduler) == 1
+
+    # ...but no more than `MAX_WAIT` after the first modification
+    now = 0.9
+    while now < MAX_WAIT + 10:
+        now += MIN_WAIT / 2
+        scheduler.schedule(a, now=now)
+    assert scheduler.next_deadline() == MAX_WAIT
+    assert scheduler.pop_due(now=now) == [(a, 0)]
+    assert not len(scheduler)
+    assert scheduler.next_deadline() is None
+
+
+def test_scheduler_many_entries():
+    scheduler = SyncScheduler()
+    ids = [uuid4() for _ in range(10000)]
+    for i, id in enumerate(ids):
+        scheduler.schedule(id, now=i / 1000)
+
+    due = scheduler.pop_due(now=5 + MIN_WAIT)
+    assert [id for id, _ in due] == ids[:5001]
+    assert len(scheduler) == 10000 - 5001
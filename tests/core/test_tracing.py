@@ -0,0 +1,105 @@
+import pytest
+
+from parsec.tracing import configure_tracing, disable_tracing, span, MemorySink, JSONLSink
+
+
+@pytest.fixture
+def tracing_sink():
+    sink = MemorySink()
+    configure_tracing(sink)
+    yield sink
+    disable_tracing()
+
+
+def test_tracing_disabled():
+    with span("foo") as foo_span:
+        assert not foo_span.sampled
+        assert foo_span.request_id is None
+
+
+def test_nested_spans(tracing_sink):
+    with span("parent", answer=42) as parent:
+        with span("child") as child:
+            pass
+        with pytest.raises(RuntimeError):
+            with span("failing"):
+                raise RuntimeError()
+
+    child_record, failing_record, parent_record = tracing_sink.spans
+    assert parent_record["name"] == "parent"
+    assert parent_record["parent_id"] is None
+    assert parent_record["tags"] == {"answer": "42"}
+    assert child_record["trace_id"] == failing_record["trace_id"] == parent.trace_id
+    assert child_record["parent_id"] == failing_record["parent_id"] == parent.span_id
+    assert child_record["span_id"] == child.span_id
+    assert failing_record["error"] == "RuntimeError"
+
+    with span("remote", request_id=child.request_id):
+        pass
+    remote_record = tracing_sink.spans[-1]
+    assert remote_record["trace_id"] == parent.trace_id
+    assert remote_record["parent_id"] == child.span_id
+
+
+def test_sampling():
+    sink = MemorySink()
+    configure_tracing(sink, sample_rate=0)
+    try:
+        with span("parent"):
+            # Children of an unsampled span are never recorded
+            with span("child") as child:
+                assert not child.sampled
+        # Requests traced by the peer are always recorded
+        with span("remote", request_id="1234-5678"):
+            pass
+    finally:
+        disable_tracing()
+
+    assert [record["name"] for record in sink.spans] == ["remote"]
+
+    with pytest.raises(ValueError):
+        configure_tracing(sink, sample_rate=2)
+
+
+def test_jsonl_sink(tmpdir):
+    path = tmpdir / "spans.jsonl"
+    configure_tracing(JSONLSink(str(path)))
+    try:
+        with span("foo"):
+            pass
+        with span("bar"):
+            pass
+    finally:
+        disable_tracing()
+
+    lines = path.read_text("utf8").splitlines()
+    assert [line for line in lines if '"name": "foo"' in line]
+    assert [line for line in lines if '"name": "bar"' in line]
+
+
+@pytest.mark.trio
+async def test_client_and_backend_spans_join(tracing_sink, running_backend, alice_fs, alice2_fs):
+    await alice_fs.workspace_create("/w")
+    await alice_fs.file_create("/w/foo.txt")
+    await alice_fs.file_write("/w/foo.txt", b"hello")
+    await alice_fs.sync("/w")
+    await alice2_fs.sync("/")
+    tracing_sink.spans.clear()
+
+    assert await alice2_fs.file_read("/w/foo.txt") == b"hello"
+
+    records = {record["span_id"]: record for record in tracing_sink.spans}
+    names = [record["name"] for record in tracing_sink.spans]
+    assert "fs.load_manifest" in names
+    assert "fs.load_block" in names
+    for record in tracing_sink.spans:
+        if record["name"] == "backend.cmd":
+            # Backend span is nested into the client's command one...
+            client_cmd = records[record["parent_id"]]
+            assert client_cmd["name"] == "backend_cmd"
+            assert client_cmd["tags"]["cmd"] == record["tags"]["cmd"]
+            assert record["trace_id"] == client_cmd["trace_id"]
+            # ...itself nested into the fs operation
+            while client_cmd["parent_id"]:
+                client_cmd = records[client_cmd["parent_id"]]
+            assert client_cmd["name"] == "fs.load_and_retry"
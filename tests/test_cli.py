@@ -1,6 +1,8 @@
 import pytest
+import json
 import re
 import os
+import sys
 from pathlib import Path
 from contextlib import contextmanager
 from time import sleep
@@ -61,6 +63,56 @@ def test_share_workspace(alice, bob):
     share_mock.assert_called_once_with("/ws1", alice.user_id)
 
 
+# Run the cli in a fresh interpreter, then report which modules got imported
+# and how long importing the cli took (run on stderr given the cli uses stdout)
+_IMPORTED_MODULES_SCRIPT = """
+import sys, json
+from time import perf_counter
+start = perf_counter()
+from parsec.cli import cli
+import_time = perf_counter() - start
+code = 0
+try:
+    cli(sys.argv[1:])
+except SystemExit as exc:
+    code = exc.code
+print(json.dumps({"code": code, "import_time": import_time, "modules": sorted(sys.modules)}),
+      file=sys.stderr)
+"""
+
+
+def _get_imported_modules(cmd):
+    cooked_cmd = [sys.executable, "-c", _IMPORTED_MODULES_SCRIPT, *cmd.split()]
+    ret = subprocess.run(cooked_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=CWD)
+    assert ret.returncode == 0
+    report = json.loads(ret.stderr.decode().splitlines()[-1])
+    assert report["code"] == 0
+    return set(report["modules"]), report["import_time"]
+
+
+# Generous budget, the point is to catch a subcommand imported eagerly again
+CLI_HELP_IMPORT_BUDGET = 0.5  # seconds
+
+
+@pytest.mark.parametrize(
+    "cmd,not_imported",
+    [
+        ("--help", ("trio", "parsec.core", "parsec.backend", "parsec.api.protocole")),
+        ("core --help", ("parsec.backend", "parsec.core.gui", "PyQt5")),
+        ("core list_devices --help", ("parsec.backend", "parsec.core.gui", "PyQt5")),
+        ("backend --help", ("parsec.core", "PyQt5")),
+    ],
+)
+def test_cli_lazy_imports(cmd, not_imported):
+    modules, import_time = _get_imported_modules(cmd)
+    assert "parsec.cli_utils" in modules
+    for module in not_imported:
+        assert module not in modules
+
+    if cmd == "--help":
+        assert import_time < CLI_HELP_IMPORT_BUDGET
+
+
 def _run(cmd):
     print(f"========= RUN {cmd} ==============")
     env = {**os.environ.copy(), "DEBUG": "true"}
@@ -220,3 +272,44 @@ def test_full_run(alice, alice2, bob, unused_tcp_port, tmpdir):
             "core create_workspace wksp2 "
             f"--config-dir={tmpdir} --device={alice2_slug} --password={password}"
         )
+
+
+def test_bench_fs(tmpdir):
+    output = tmpdir / "report.json"
+    cooked_cmd = [
+        sys.executable,
+        "-m",
+        "parsec.cli",
+        *f"bench fs --clients 3 -w sharing_fan_out -o {output}".split(),
+    ]
+    ret = subprocess.run(cooked_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=CWD)
+    assert ret.returncode == 0, ret.stderr.decode()
+
+    report = json.loads(output.read_text("utf8"))
+    assert report["config"] == {"clients": 3, "db": "MOCKED", "blockstore": "MOCKED"}
+    operations = report["workloads"]["sharing_fan_out"]["operations"]
+    assert operations["share"]["count"] == 2
+    assert operations["share_received"]["count"] == 2
+    assert operations["share"]["p50_ms"] <= operations["share"]["p99_ms"]
+
+
+def test_bench_load(tmpdir):
+    output = tmpdir / "report.json"
+    cooked_cmd = [
+        sys.executable,
+        "-m",
+        "parsec.cli",
+        *(
+            "bench load --users 3 --processes 2 --tasks 2 --requests 10 --duration 0 "
+            f"--mix vlob_create=1,vlob_read=1,message_send=1 -o {output}"
+        ).split(),
+    ]
+    ret = subprocess.run(cooked_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=CWD)
+    assert ret.returncode == 0, ret.stderr.decode()
+
+    report = json.loads(output.read_text("utf8"))
+    assert report["provisioning"]["devices"] == 3
+    operations = report["operations"]
+    assert set(operations) <= {"vlob_create", "vlob_read", "message_send"}
+    assert sum(operation["count"] for operation in operations.values()) == 2 * 2 * 10
+    assert all(operation["errors"] == 0 for operation in operations.values())
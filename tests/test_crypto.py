@@ -1,7 +1,13 @@
+import os
+import trio
 import pytest
+import pendulum
+from time import perf_counter
+from nacl.secret import SecretBox
 
 from parsec.crypto import (
     CryptoError,
+    CryptoMetadataError,
     BadSignatureError,
     generate_secret_key,
     encrypt_for_self,
@@ -10,6 +16,13 @@ from parsec.crypto import (
     verify_signature_from,
     encrypt_with_secret_key,
     decrypt_with_secret_key,
+    encrypt_raw_with_secret_key,
+    decrypt_raw_with_secret_key,
+    encrypt_raw_with_secret_key_batch,
+    decrypt_raw_with_secret_key_batch,
+    sign_and_add_meta,
+    decode_signedmeta,
+    signed_metadata_serializer,
 )
 
 
@@ -80,3 +93,108 @@ def test_decrypt_for_other_bad_receiver(alice, bob, mallory):
     device_id, signed_msg = decrypt_for(bob.private_key, ciphered_msg)
     with pytest.raises(BadSignatureError):
         verify_signature_from(mallory.verify_key, signed_msg)
+
+
+def test_raw_secret_key_compatible_with_secret_box():
+    key = generate_secret_key()
+    assert decrypt_raw_with_secret_key(key, SecretBox(key).encrypt(b"foo")) == b"foo"
+    assert SecretBox(key).decrypt(encrypt_raw_with_secret_key(key, b"foo")) == b"foo"
+    with pytest.raises(CryptoError):
+        decrypt_raw_with_secret_key(key, b"short")
+
+
+def test_raw_secret_key_batch():
+    items = [(generate_secret_key(), os.urandom(size)) for size in (0, 1, 1024, 65536)]
+    ciphered = encrypt_raw_with_secret_key_batch(items)
+    assert len({c[: SecretBox.NONCE_SIZE] for c in ciphered}) == len(items)
+    for (key, data), c in zip(items, ciphered):
+        assert decrypt_raw_with_secret_key(key, c) == data
+    keys = [key for key, _ in items]
+    assert decrypt_raw_with_secret_key_batch(list(zip(keys, ciphered))) == [
+        data for _, data in items
+    ]
+
+    with pytest.raises(CryptoError):
+        decrypt_raw_with_secret_key_batch([(keys[1], ciphered[0])])
+    with pytest.raises(CryptoError):
+        encrypt_raw_with_secret_key_batch([(b"bad key", b"data")])
+
+
+@pytest.mark.parametrize("signed_by_root", (False, True))
+def test_signed_metadata_binary_layout(alice, signed_by_root):
+    device_id = None if signed_by_root else alice.device_id
+    signedmeta = sign_and_add_meta(device_id, alice.signing_key, b"data")
+    assert decode_signedmeta(signedmeta) == (device_id, alice.signing_key.sign(b"data"))
+
+    # Legacy msgpack layout is still accepted
+    legacy = signed_metadata_serializer.dumps(
+        {
+            "device_id": device_id,
+            "timestamp": pendulum.now(),
+            "content": alice.signing_key.sign(b"data"),
+        }
+    )
+    assert decode_signedmeta(legacy) == decode_signedmeta(signedmeta)
+
+
+@pytest.mark.parametrize("signedmeta", (b"", b"\x01", b"\x01" + b"\x00" * 8 + b"\x10abc"))
+def test_signed_metadata_invalid(signedmeta):
+    with pytest.raises(CryptoMetadataError):
+        decode_signedmeta(signedmeta)
+
+
+@pytest.mark.slow
+@pytest.mark.trio
+async def test_bulk_encryption_bench():
+    items = [(generate_secret_key(), os.urandom(size)) for size in [4096] * 2000 + [2 ** 19] * 50]
+    total_size = sum(len(data) for _, data in items)
+
+    async def _measure(fn):
+        # Also measure how long the trio loop is kept busy
+        max_tick = 0
+
+        async def _ticker(task_status=trio.TASK_STATUS_IGNORED):
+            nonlocal max_tick
+            task_status.started()
+            while True:
+                tick = perf_counter()
+                await trio.sleep(0)
+                max_tick = max(max_tick, perf_counter() - tick)
+
+        async with trio.open_nursery() as nursery:
+            await nursery.start(_ticker)
+            start = perf_counter()
+            result = await fn()
+            elapsed = perf_counter() - start
+            nursery.cancel_scope.cancel()
+        return result, elapsed, max_tick
+
+    async def _per_item_secret_box():
+        ciphered = []
+        for key, data in items:
+            ciphered.append(SecretBox(key).encrypt(data))
+            await trio.sleep(0)
+        return ciphered
+
+    async def _batches_in_worker_thread():
+        ciphered = []
+        for i in range(0, len(items), 16):
+            ciphered += await trio.run_sync_in_worker_thread(
+                encrypt_raw_with_secret_key_batch, items[i : i + 16]
+            )
+        return ciphered
+
+    for name, fn in (
+        ("per-item SecretBox", _per_item_secret_box),
+        ("batches in worker thread", _batches_in_worker_thread),
+    ):
+        ciphered, elapsed, max_tick = await _measure(fn)
+        print(
+            f"Encrypting {len(items)} items ({total_size / 2 ** 20:.1f}Mo) with {name}: "
+            f"{total_size / elapsed / 2 ** 20:.1f}Mo/s, loop blocked up to {max_tick * 1000:.2f}ms"
+        )
+
+    decrypted = decrypt_raw_with_secret_key_batch(
+        [(key, c) for (key, _), c in zip(items, ciphered)]
+    )
+    assert decrypted == [data for _, data in items]